@@ -0,0 +1,75 @@
+# benchmarks/artist_queue.py
+
+# /tracks/add_artist_songs_to_queue con canciones de varios artistas contra el stub con
+# latencia: antes se pedían las top-tracks de un artista detrás de otro y después se
+# hacía un POST a la cola por canción; ahora las búsquedas van a la vez y cada POST
+# sale en cuanto llega su artista, sin perder el orden de la cola.
+#
+#   python -m benchmarks.artist_queue [latencia_ms] [repeticiones]
+#
+# La sesión va sin rate limit ni cache de respuestas: se mide solo la latencia.
+
+import asyncio
+import statistics
+import sys
+import time
+from benchmarks.common import direct_session
+from benchmarks.spotify_stub import SpotifyStub
+
+from core.session import SpotifySession
+from routes.tracks.tracks_operations import add_artist_songs_to_queue
+
+ARTIST_COUNTS = (1, 3, 5, 8)
+
+
+async def sequential_add_artist_songs_to_queue(session: SpotifySession) -> list:
+    # el orden de llamadas de la versión anterior de la ruta
+    await session.get("me")
+    song = (await session.get("me/player")).json()
+    uris = []
+    for artist in song["item"]["artists"]:
+        tracks = (await session.get(f"artists/{artist['id']}/top-tracks")).json()["tracks"]
+        uris.append(tracks[0]["uri"])
+    for uri in uris:
+        await session.post("me/player/queue", params={"uri": uri})
+    return uris
+
+
+async def main(latency: float, repeat: int):
+    stub = SpotifyStub(latency)
+    state = {"artists": 1}
+    queued = []
+    stub.route("GET", "me", lambda request: (200, {"id": "user", "product": "premium"}))
+    stub.route("GET", "me/player", lambda request: (200, {
+        "is_playing": True,
+        "item": {"artists": [{"id": f"artist{index}"} for index in range(state["artists"])]}
+    }))
+    stub.route("GET", "artists", lambda request: (200, {"tracks": [{"uri": f"spotify:track:{request.path.split('/')[1]}"}]}))
+    stub.route("POST", "me/player/queue", lambda request: (queued.append(request.params["uri"]), (204, None))[1])
+    session, http = direct_session(stub.start())
+
+    print(f"latencia del stub {latency * 1000:.0f} ms, mediana de {repeat} repeticiones")
+    for artists in ARTIST_COUNTS:
+        state["artists"] = artists
+        expected = [f"spotify:track:artist{index}" for index in range(artists)]
+        timings = {}
+        for label, run in (("antes", sequential_add_artist_songs_to_queue), ("ahora", add_artist_songs_to_queue)):
+            times = []
+            for _ in range(repeat):
+                queued.clear()
+                started = time.perf_counter()
+                await run(session)
+                times.append((time.perf_counter() - started) * 1000)
+                assert queued == expected, queued
+            timings[label] = statistics.median(times)
+        print(f"{artists} artistas: antes {timings['antes']:7.1f} ms  ahora {timings['ahora']:7.1f} ms")
+
+    await http.aclose()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        (float(sys.argv[1]) if len(sys.argv) > 1 else 50) / 1000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    ))
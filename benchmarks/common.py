@@ -0,0 +1,103 @@
+# benchmarks/common.py
+
+# Utilidades compartidas por los benchmarks. Se lanzan desde la raíz del repo:
+#   python -m benchmarks.<nombre>
+# Por defecto la app arranca con SQLite en un directorio temporal y sin Redis; las
+# variables de entorno (STORAGE_BACKEND, REDIS_URL...) se respetan si ya están puestas.
+
+import contextlib
+import datetime
+import os
+import statistics
+import tempfile
+import time
+from cryptography.fernet import Fernet
+
+_data_dir = tempfile.mkdtemp(prefix="benchmarks-")
+os.environ.setdefault("MASTER_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(_data_dir, "storage.db"))
+os.environ.setdefault("HISTORY_PATH", os.path.join(_data_dir, "history"))
+
+
+def init_firebase(project: str = "demo-benchmark"):
+    # con el certificado si existe y no se usa el emulador; si no, credenciales anónimas
+    # (el emulador no las comprueba y los clientes no se conectan hasta la primera consulta)
+    import firebase_admin
+    from firebase_admin import credentials
+    from google.auth.credentials import AnonymousCredentials
+    from managers.BaseManager import CRED_PATH
+
+    class AnonymousCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    if firebase_admin._apps:
+        return
+    if os.path.exists(CRED_PATH) and not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        firebase_admin.initialize_app(credentials.Certificate(CRED_PATH))
+    else:
+        firebase_admin.initialize_app(AnonymousCredential(), {"projectId": project})
+
+
+class Unlimited:
+    # SpotifyScheduler sin rate limit: los benchmarks con sesión directa miden solo la latencia
+    async def send(self, call, user_id, priority):
+        return await call()
+
+
+def direct_session(api_base_url: str, user_id: str = "user"):
+    # SpotifySession contra api_base_url (p.ej. el stub) sin rate limit ni cache de
+    # respuestas, con el cliente HTTP de la app. Devuelve (sesión, cliente HTTP)
+    import core.session
+    from core.http import HttpMetrics, create_http_client
+
+    core.session.API_BASE_URL = api_base_url
+    http = create_http_client(HttpMetrics())
+    expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    return core.session.SpotifySession(user_id, f"token-{user_id}", expires_at, http, None, Unlimited()), http
+
+
+def add_users(client, user_ids: list, expires_in: int = 3600):
+    # usuarios logueados con token "token-{id}" y refresh token "refresh-{id}"
+    from models.User import User
+
+    storage = client.app.state.storage
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for user_id in user_ids:
+        user = User(
+            user_id,
+            now,
+            now + datetime.timedelta(seconds=expires_in),
+            storage.encripter._encript(f"token-{user_id}"),
+            storage.encripter._encript(f"refresh-{user_id}"),
+            "key"
+        )
+        client.portal.call(storage._add_user, user)
+
+
+@contextlib.contextmanager
+def app_client(user_ids: list = ()):
+    # la app completa (lifespan incluido) con los usuarios dados ya logueados
+    import main
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        add_users(client, list(user_ids))
+        yield client
+
+
+def measure(function, repeat: int) -> list:
+    # milisegundos de cada llamada
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def report(label: str, times: list):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<45} media {statistics.mean(times):8.3f} ms  p50 {statistics.median(times):8.3f} ms  p95 {p95:8.3f} ms")
@@ -0,0 +1,82 @@
+# benchmarks/compatibility.py
+
+# Compatibilidad musical de un servidor: compatibility_pairs con 500 y 2000 miembros
+# (las matrices se copian del Recommender como en la ruta) y POST /stats/compatibility
+# con 500 miembros, la primera vez (carga los snapshots de estadísticas) y con los
+# snapshots ya en la cache.
+#
+#   python -m benchmarks.compatibility
+#
+# La API de Spotify es un MockTransport y el rate limit de la app se sube para que la
+# carga inicial no espere al SpotifyScheduler.
+
+import os
+import time
+import httpx
+from benchmarks.common import app_client
+from benchmarks.recommender import SnapshotFactory
+
+os.environ.setdefault("SPOTIFY_APP_RATE", "100000")
+os.environ.setdefault("SPOTIFY_APP_BURST", "100000")
+
+from core.compatibility import compatibility_pairs
+from managers.Recommender import Recommender
+
+MEMBERS = 500
+
+
+def pairs_benchmark():
+    snapshot = SnapshotFactory()
+    recommender = Recommender(None)
+    for index in range(10000):
+        recommender.update(f"user{index}", snapshot())
+
+    for members in (MEMBERS, 2000):
+        user_ids = [f"user{index}" for index in range(members)]
+        for _ in range(2):
+            started = time.perf_counter()
+            artists = recommender.artists.matrix(user_ids)
+            genres = recommender.genres.matrix(user_ids)
+            names = list(recommender.artists.names)
+            copied = time.perf_counter()
+            pairs = compatibility_pairs(artists, genres, names, user_ids, 50)
+            print(
+                f"compatibility_pairs, {members} miembros: copia {(copied - started) * 1000:6.1f} ms"
+                f"  pares {(time.perf_counter() - copied) * 1000:7.1f} ms  (mejor score {pairs[0]['score']})"
+            )
+
+
+def route_benchmark():
+    snapshot = SnapshotFactory(seed=1)
+    tops = {}
+
+    def spotify(request: httpx.Request) -> httpx.Response:
+        user_id = request.headers["Authorization"].removeprefix("Bearer token-")
+        if request.url.path != "/v1/me/top/artists":
+            return httpx.Response(200, json={"items": [], "next": None})
+        time_range = request.url.params["time_range"]
+        if user_id not in tops:
+            tops[user_id] = snapshot()["ranges"]
+        artists = [
+            {"id": artist["id"], "name": artist["name"], "genres": snapshot.genres_of[int(artist["id"].removeprefix("artist"))]}
+            for artist in tops[user_id][time_range]["artists"]
+        ]
+        return httpx.Response(200, json={"items": artists, "next": None})
+
+    user_ids = [f"user{index}" for index in range(MEMBERS)]
+    with app_client(user_ids) as client:
+        state = client.app.state
+        state.http = httpx.AsyncClient(transport=httpx.MockTransport(spotify))
+        state.token_refresher.http = state.http
+
+        for label in ("primera vez (carga los snapshots)", "con los snapshots en la cache"):
+            started = time.perf_counter()
+            response = client.post("/stats/compatibility", params={"limit": 50}, json=user_ids)
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 200 and not response.json()["errors"], response.text
+            print(f"POST /stats/compatibility, {MEMBERS} miembros, {label}: {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    pairs_benchmark()
+    route_benchmark()
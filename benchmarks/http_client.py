@@ -0,0 +1,80 @@
+# benchmarks/http_client.py
+
+# Llamadas a la API de Spotify (un stub local con latencia) desde corrutinas, como las
+# hacen las rutas, con HTTP_MAX_KEEPALIVE en vuelo (con más, las conexiones que no
+# caben en el pool se cierran al terminar y la reutilización baja):
+#  - requests (antes): una llamada bloqueante y una conexión nueva por petición
+#  - httpx sin pool: async, pero un cliente (y una conexión) nuevo por petición
+#  - cliente compartido (ahora): create_http_client, con keep-alive y pool
+# Para cada una: llamadas por segundo, latencia media y conexiones abiertas.
+#
+#   python -m benchmarks.http_client [llamadas] [latencia_ms] [en_vuelo]
+
+import asyncio
+import statistics
+import sys
+import time
+import httpx
+import requests
+from benchmarks.spotify_stub import SpotifyStub
+
+from core.config import HTTP_MAX_KEEPALIVE
+from core.http import HttpMetrics, create_http_client
+
+
+async def run(label: str, stub: SpotifyStub, call, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    connections = stub.connections
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await call()
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<24} {calls / elapsed:8.0f} llamadas/s  latencia media {statistics.mean(latencies) * 1000:7.1f} ms"
+        f"  conexiones {stub.connections - connections}"
+    )
+
+
+async def main(calls: int, latency: float, concurrency: int):
+    stub = SpotifyStub(latency)
+    stub.route("GET", "me", lambda request: (200, {"id": "user", "product": "premium"}))
+    url = stub.start() + "me"
+    headers = {"Authorization": "Bearer token"}
+
+    async def with_requests():
+        return requests.get(url, headers=headers)
+
+    async def with_new_client():
+        async with httpx.AsyncClient() as client:
+            return await client.get(url, headers=headers)
+
+    metrics = HttpMetrics()
+    shared = create_http_client(metrics)
+
+    async def with_shared_client():
+        return await shared.get(url, headers=headers)
+
+    await run("requests (antes)", stub, with_requests, calls, concurrency)
+    await run("httpx sin pool", stub, with_new_client, calls, concurrency)
+    await run("cliente compartido (ahora)", stub, with_shared_client, calls, concurrency)
+    stats = metrics.stats()
+    print(f"cliente compartido: reutilización de conexiones {stats['connection_reuse_rate']:.1%}, {stats['connections_opened']} abiertas")
+
+    await shared.aclose()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000,
+        int(sys.argv[3]) if len(sys.argv) > 3 else HTTP_MAX_KEEPALIVE
+    ))
@@ -0,0 +1,98 @@
+# benchmarks/listening_history.py
+
+# ListeningHistory con un millón de reproducciones (1000 usuarios x 1000, 50000
+# canciones, 10000 artistas, 1000 géneros, popularidad con cola larga): tiempo de
+# ingesta en páginas de 50 como las de recently-played, volcado a disco, memoria de
+# las columnas y del proceso, recarga desde disco y tiempo de los top-N por ventana.
+#
+#   python -m benchmarks.listening_history [reproducciones]
+
+import asyncio
+import datetime
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+from managers.ListeningHistory import HISTORY_TYPES, RECENTLY_PLAYED_LIMIT, ListeningHistory
+
+USERS = 1000
+TRACKS = 50000
+ARTISTS = 10000
+GENRES = 1000
+YEAR_MS = 365 * 86400 * 1000
+
+
+def rss_mb() -> float:
+    # máximo de memoria residente del proceso (ru_maxrss va en KB en Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def pages(rng, plays: int, now_ms: int):
+    # páginas de recently-played de cada usuario, en orden cronológico
+    track_artists = rng.integers(0, ARTISTS, (TRACKS, 2))
+    per_user = plays // USERS
+    for user in range(USERS):
+        played_at = np.sort(rng.integers(now_ms - YEAR_MS, now_ms, per_user))
+        tracks = (rng.zipf(1.3, per_user) - 1) % TRACKS
+        items = [
+            {
+                "played_at": datetime.datetime.fromtimestamp(ms / 1000, datetime.timezone.utc).isoformat(),
+                "track": {
+                    "id": f"track{track}",
+                    "name": f"Track {track}",
+                    "artists": [{"id": f"artist{artist}", "name": f"Artist {artist}"} for artist in track_artists[track]]
+                }
+            }
+            for ms, track in zip(played_at.tolist(), tracks.tolist())
+        ]
+        for start in range(0, len(items), RECENTLY_PLAYED_LIMIT):
+            yield f"user{user}", items[start:start + RECENTLY_PLAYED_LIMIT]
+
+
+async def main(plays: int):
+    rng = np.random.default_rng(0)
+    path = tempfile.mkdtemp(prefix="benchmarks-history-")
+    now = time.time()
+    rss_before = rss_mb()
+
+    history = ListeningHistory(path)
+    started = time.perf_counter()
+    for user_id, items in pages(rng, plays, int(now * 1000)):
+        history.append(user_id, items)
+    for artist_id in history.unresolved_artists():
+        history.set_artist_genres(artist_id, [f"genre{genre}" for genre in rng.integers(0, GENRES, 3).tolist()])
+    print(f"ingesta de {history.stats()['plays']} reproducciones en páginas de 50: {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    await history.flush()
+    print(f"volcado a disco: {time.perf_counter() - started:.2f} s")
+
+    started = time.perf_counter()
+    history.top("user0", "tracks")
+    print(f"primera consulta (ordena las columnas): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    stats = history.stats()
+    print(f"columnas: {stats['column_bytes'] / 2**20:.1f} MB; memoria del proceso: +{rss_mb() - rss_before:.0f} MB (incluye los datos generados)")
+
+    started = time.perf_counter()
+    history = ListeningHistory(path)
+    history.top("user0", "tracks")
+    print(f"recarga desde disco: {time.perf_counter() - started:.2f} s")
+
+    windows = {"todo": (None, None), "último mes": (now - 30 * 86400, now), "última semana": (now - 7 * 86400, now)}
+    users = [f"user{user}" for user in rng.integers(0, USERS, 200).tolist()]
+    for top_type in HISTORY_TYPES:
+        for label, (start, end) in windows.items():
+            times = []
+            for user_id in users:
+                began = time.perf_counter()
+                history.top(user_id, top_type, start, end, 25)
+                times.append((time.perf_counter() - began) * 1000)
+            print(f"top 25 {top_type:<8} {label:<14} mediana {statistics.median(times):6.2f} ms  máx {max(times):6.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,61 @@
+# benchmarks/playlist_batches.py
+
+# Canciones por segundo al añadir una lista de URIs a una playlist contra el stub con
+# latencia: antes una petición por URI (un POST a Spotify por canción); ahora
+# add_tracks_in_batches, con lotes de 100 que se encadenan por snapshot_id.
+#
+#   python -m benchmarks.playlist_batches [canciones] [latencia_ms]
+#
+# La lista lleva un 5% de URIs repetidas, que la versión por lotes quita.
+
+import asyncio
+import sys
+import time
+from benchmarks.common import direct_session
+from benchmarks.spotify_stub import SpotifyStub
+
+from core.playlists import add_tracks_in_batches
+
+
+async def main(tracks: int, latency: float):
+    stub = SpotifyStub(latency)
+    playlist = []
+
+    def add(request):
+        body = request.json()
+        position = body.get("position", len(playlist))
+        playlist[position:position] = body["uris"]
+        return 201, {"snapshot_id": f"snapshot-{len(playlist)}"}
+
+    stub.route("POST", "playlists", add)
+    session, http = direct_session(stub.start())
+
+    uris = [f"spotify:track:{index}" for index in range(tracks)]
+    uris += uris[:tracks // 20]
+
+    started = time.perf_counter()
+    for uri in uris:
+        await session.post("playlists/playlist/tracks", json={"uris": [uri]})
+    elapsed = time.perf_counter() - started
+    print(f"una petición por URI (antes)  {len(uris) / elapsed:8.0f} canciones/s  {len(uris)} peticiones  {elapsed:6.2f} s")
+
+    playlist.clear()
+    hits = stub.hits
+    started = time.perf_counter()
+    result = await add_tracks_in_batches(session, "playlist", uris, position=0)
+    elapsed = time.perf_counter() - started
+    assert playlist == list(dict.fromkeys(uris)), "el orden de la playlist no coincide"
+    print(
+        f"lotes de 100 (ahora)          {result['added'] / elapsed:8.0f} canciones/s  {stub.hits - hits} peticiones  {elapsed:6.2f} s"
+        f"  ({result['duplicates']} duplicadas quitadas, snapshot {result['snapshot_id']})"
+    )
+
+    await http.aclose()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    ))
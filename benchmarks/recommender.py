@@ -0,0 +1,83 @@
+# benchmarks/recommender.py
+
+# Recommender con 10000 usuarios sintéticos (30000 artistas con 3 géneros de 1500,
+# top de 50 artistas por time_range con popularidad Zipf): tiempo de cargar las filas,
+# de construir los índices de vecinos, de una recomendación y de los refrescos
+# incrementales cuando cambian las estadísticas de 1 y de 50 usuarios.
+#
+#   python -m benchmarks.recommender [usuarios]
+
+import asyncio
+import statistics
+import sys
+import time
+import numpy as np
+
+from managers.Recommender import Recommender
+from managers.StatsEngine import TIME_RANGES
+
+ARTISTS = 30000
+GENRES = 1500
+
+
+class SnapshotFactory:
+    # snapshots de StatsEngine con solo lo que usa el Recommender (artistas y géneros)
+    def __init__(self, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.genres_of = [[f"genre{genre}" for genre in self.rng.integers(0, GENRES, 3).tolist()] for _ in range(ARTISTS)]
+
+    def __call__(self) -> dict:
+        ranges = {}
+        for time_range in TIME_RANGES:
+            artists = list(dict.fromkeys((self.rng.zipf(1.2, 80).clip(1, ARTISTS) - 1).tolist()))[:50]
+            counts = {}
+            for artist in artists:
+                for genre in self.genres_of[artist]:
+                    counts[genre] = counts.get(genre, 0) + 1
+            ranges[time_range] = {
+                "artists": [{"id": f"artist{artist}", "name": f"Artist {artist}"} for artist in artists],
+                "genres": [{"genre": genre, "count": count} for genre, count in sorted(counts.items(), key=lambda item: -item[1])]
+            }
+        return {"ranges": ranges}
+
+
+def timed(label: str, started: float):
+    print(f"{label:<40} {time.perf_counter() - started:8.2f} s")
+
+
+async def main(users: int):
+    snapshot = SnapshotFactory()
+    snapshots = [snapshot() for _ in range(users)]
+    recommender = Recommender(None)
+
+    started = time.perf_counter()
+    for index, user_snapshot in enumerate(snapshots):
+        recommender.update(f"user{index}", user_snapshot)
+    timed(f"filas de {users} usuarios", started)
+
+    started = time.perf_counter()
+    await recommender.artists.refresh()
+    timed(f"índice de artistas ({len(recommender.artists.ids)})", started)
+    started = time.perf_counter()
+    await recommender.genres.refresh()
+    timed(f"índice de géneros ({len(recommender.genres.ids)})", started)
+
+    for recommendation_type in ("artists", "genres"):
+        times = []
+        for index in range(min(users, 1000)):
+            began = time.perf_counter()
+            await recommender.recommend(f"user{index}", recommendation_type, 20)
+            times.append((time.perf_counter() - began) * 1000)
+        print(f"recomendación de {recommendation_type:<7} (top 20)            mediana {statistics.median(times):6.2f} ms  máx {max(times):6.2f} ms")
+
+    for changed in (1, 50):
+        for index in range(changed):
+            recommender.update(f"user{index}", snapshot())
+        started = time.perf_counter()
+        await recommender.artists.refresh()
+        await recommender.genres.refresh()
+        timed(f"refresco incremental de {changed} usuarios", started)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,64 @@
+# benchmarks/request_setup.py
+
+# Coste por petición de preparar el almacenamiento. Antes cada ruta creaba un
+# BaseManager (ruta del certificado, comprobar firebase_admin._apps, firestore.client())
+# y un Encripter/Fernet nuevos; ahora reciben el backend del proceso con
+# Depends(get_storage). Se mide la preparación sola y la misma ruta con las dos variantes.
+#
+#   python -m benchmarks.request_setup [peticiones]
+#
+# Sin el certificado de Firebase la app de firebase_admin se inicia con credenciales
+# anónimas (firestore.client() no se conecta hasta la primera consulta).
+
+import os
+import sys
+from benchmarks.common import app_client, init_firebase, measure, report
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from core.dependencies import get_storage
+from managers.BaseManager import CRED_PATH
+from managers.Encripter import Encripter
+
+
+def per_request_setup():
+    # lo que hacía BaseManager.__init__ en cada petición
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(CRED_PATH))
+    firestore.client()
+    Encripter(os.getenv("MASTER_KEY").encode())
+
+
+def main(requests: int):
+    init_firebase()
+    report("preparación por petición (antes)", measure(per_request_setup, requests))
+
+    with app_client(["user"]) as client:
+        app = client.app
+        route = lambda: client.get("/player/check_if_user_is_logged/user")
+        measure(route, 50)
+
+        # las dos variantes como override de get_storage: FastAPI resuelve los overrides
+        # en cada petición y ese coste no debe contar solo para una de ellas
+        def storage_per_request(request):
+            per_request_setup()
+            return request.app.state.storage
+
+        def shared_storage(request):
+            return request.app.state.storage
+
+        # alternando las dos variantes para que el calentamiento no favorezca a ninguna
+        before, after = [], []
+        for _ in range(10):
+            app.dependency_overrides[get_storage] = storage_per_request
+            before += measure(route, requests // 10)
+            app.dependency_overrides[get_storage] = shared_storage
+            after += measure(route, requests // 10)
+        app.dependency_overrides.clear()
+
+    report("ruta con BaseManager por petición (antes)", before)
+    report("ruta con el backend del proceso (ahora)", after)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
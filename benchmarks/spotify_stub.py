@@ -0,0 +1,105 @@
+# benchmarks/spotify_stub.py
+
+# Stub local de la API de Spotify (HTTP/1.1 con keep-alive) para los benchmarks. Es un
+# servidor asyncio en su propio hilo: cada petición espera `latency` segundos sin
+# ocupar un hilo y se responde con la función registrada para (método, ruta) más
+# larga que encaje; si no hay ninguna, 200 con {}.
+#
+#   stub = SpotifyStub(latency=0.02)
+#   stub.route("GET", "me/player", lambda request: (200, {...}))
+#   stub.start()  ->  "http://127.0.0.1:<puerto>/v1/"
+
+import asyncio
+import json
+import threading
+import urllib.parse
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests"}
+
+
+class StubRequest:
+    def __init__(self, method: str, path: str, params: dict, body: bytes):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class SpotifyStub:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.routes = {}
+        self.hits = 0
+        self.connections = 0
+        self._loop = None
+        self._server = None
+
+    def route(self, method: str, path: str, handler):
+        # handler(StubRequest) -> (status, cuerpo JSON o None)
+        self.routes[(method, path)] = handler
+
+    def _response(self, request: StubRequest) -> tuple:
+        matches = [
+            path for method, path in self.routes
+            if method == request.method and (request.path == path or request.path.startswith(path + "/"))
+        ]
+        if not matches:
+            return 200, {}
+        return self.routes[(request.method, max(matches, key=len))](request)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                self.hits += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                url = urllib.parse.urlsplit(target)
+                request = StubRequest(method, url.path.removeprefix("/v1/"), dict(urllib.parse.parse_qsl(url.query)), body)
+                status, payload = self._response(request)
+
+                data = json.dumps(payload).encode() if payload is not None else b""
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def start(self) -> str:
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, "127.0.0.1", 0, backlog=1024))
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name="spotify-stub", daemon=True).start()
+        started.wait()
+        return f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}/v1/"
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
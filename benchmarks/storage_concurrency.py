@@ -0,0 +1,104 @@
+# benchmarks/storage_concurrency.py
+
+# Lecturas de usuarios con muchas peticiones a la vez (por defecto 2000 lecturas con
+# 200 en vuelo), como las de las rutas async. Para cada variante: lecturas por segundo
+# y el máximo que el event loop estuvo bloqueado (un ticker de 1 ms mide su retraso).
+#  - firestore síncrono (antes): el cliente de BaseManager llamado dentro de la corrutina
+#  - firestore async (ahora): AsyncBaseManager sobre el AsyncClient
+#  - sqlite: SQLiteManager, con las consultas en hilos (asyncio.to_thread)
+#
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.storage_concurrency [lecturas] [en_vuelo]
+#
+# Las variantes de Firestore necesitan el emulador; sin él solo se mide SQLite.
+
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+from benchmarks.common import init_firebase
+
+from models.User import User
+
+EMULATOR_PROJECT = "demo-better-discord-spotify"
+USERS = 100
+
+
+class LoopLag:
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.max_lag = 0.0
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, time.perf_counter() - started - self.interval)
+
+
+async def add_users(storage):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for index in range(USERS):
+        user = User(
+            f"user-{index}",
+            now,
+            now + datetime.timedelta(hours=1),
+            storage.encripter._encript("token"),
+            storage.encripter._encript("refresh"),
+            "key"
+        )
+        await storage._add_user(user)
+
+
+async def run(label: str, read, reads: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    lag = LoopLag()
+
+    async def one(index: int):
+        async with semaphore:
+            assert await read(f"user-{index % USERS}") is not None
+
+    probe = asyncio.create_task(lag.run())
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(reads)))
+    elapsed = time.perf_counter() - started
+    probe.cancel()
+    print(f"{label:<28} {reads / elapsed:8.0f} lecturas/s  loop bloqueado como mucho {lag.max_lag * 1000:8.1f} ms")
+
+
+async def main(reads: int, concurrency: int):
+    from managers.SQLiteManager import SQLiteManager
+
+    storage = SQLiteManager(os.path.join(tempfile.mkdtemp(prefix="benchmarks-"), "storage.db"))
+    await add_users(storage)
+    await run("sqlite", storage._get_user, reads, concurrency)
+    storage.close()
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print("FIRESTORE_EMULATOR_HOST no está definido: no se miden las variantes de Firestore")
+        return
+
+    init_firebase(EMULATOR_PROJECT)
+    from firebase_admin import firestore
+    from managers.AsyncBaseManager import AsyncBaseManager
+
+    storage = AsyncBaseManager()
+    await add_users(storage)
+    sync_db = firestore.client()
+
+    async def sync_read(user_id: str):
+        # como las rutas de antes: una llamada bloqueante dentro de una ruta async
+        doc = sync_db.collection("users").document(user_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    await run("firestore síncrono (antes)", sync_read, reads, concurrency)
+    await run("firestore async (ahora)", storage._get_user, reads, concurrency)
+    storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    ))
@@ -1,4 +1,252 @@
-from flask_caching import Cache
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+import msgpack
+from cryptography.fernet import Fernet, InvalidToken
 
 
-cache = Cache()
\ No newline at end of file
+# L1: LRU en memoria del proceso. Cada entrada lleva su instante de caducidad
+# (time.time(), para poder compartirlo con el L2 entre workers).
+class LRUCache:
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # se puede usar desde otros hilos (asyncio.to_thread)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[1]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at: float):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_namespace(self, namespace: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == namespace]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Cache en dos niveles para toda la app (tokens, respuestas de Spotify...):
+#  - L1: LRUCache por proceso
+#  - L2: opcional, cualquier cliente con la API de redis.asyncio (REDIS_URL), compartido
+#    entre workers de uvicorn. Los valores se serializan con msgpack y se cifran con
+#    Fernet antes de salir del proceso. Con L2 activo las entradas del L1 viven como
+#    mucho l1_max_ttl segundos para que los cambios de otros workers se vean pronto.
+#  - get_or_set evita estampidas: una sola carga en vuelo por clave en el proceso y,
+#    con L2, un lock SET NX entre workers; el resto espera el valor
+#  - las claves van por namespace y se pueden invalidar namespaces enteros; un
+#    namespace puede tener su propio L1 (reserve_l1) para no competir con el resto
+class TieredCache:
+    def __init__(
+            self,
+            l1_size: int = 4096,
+            l2=None,
+            secret: str = None,
+            prefix: str = "siasw",
+            l1_max_ttl: float = 30.0,
+            lock_ttl: float = 10.0
+        ):
+        self.l1 = LRUCache(l1_size)
+        self._l1_reserved = {}
+        self.l2 = l2
+        self.cipher = Fernet(secret) if secret else None
+        self.prefix = prefix
+        self.l1_max_ttl = l1_max_ttl
+        self.lock_ttl = lock_ttl
+        self._in_flight = {}
+
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.loads_coalesced = 0
+        self.l2_errors = 0
+
+    @classmethod
+    def from_url(cls, redis_url: str = None, **kwargs) -> "TieredCache":
+        l2 = None
+        if redis_url:
+            import redis.asyncio as redis
+            l2 = redis.from_url(redis_url)
+        return cls(l2=l2, **kwargs)
+
+    async def close(self):
+        if self.l2 is not None:
+            await self.l2.aclose()
+
+    def _l2_key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def _dumps(self, value, expires_at: float) -> bytes:
+        payload = msgpack.packb([expires_at, value], datetime=True)
+        return self.cipher.encrypt(payload) if self.cipher else payload
+
+    def _loads(self, payload: bytes):
+        if self.cipher:
+            payload = self.cipher.decrypt(payload)
+        return msgpack.unpackb(payload, timestamp=3)
+
+    def reserve_l1(self, namespace: str, max_size: int):
+        # el namespace pasa a tener su propio LRU de max_size entradas
+        self._l1_reserved[namespace] = LRUCache(max_size)
+
+    def l1_for(self, namespace: str) -> LRUCache:
+        return self._l1_reserved.get(namespace, self.l1)
+
+    def _set_l1(self, namespace: str, key: str, value, expires_at: float):
+        if self.l2 is not None:
+            expires_at = min(expires_at, time.time() + self.l1_max_ttl)
+        self.l1_for(namespace).set((namespace, key), value, expires_at)
+
+    # --- acceso async, L1 + L2 ---
+
+    async def _get_l2(self, namespace: str, key: str):
+        try:
+            payload = await self.l2.get(self._l2_key(namespace, key))
+            if payload is not None:
+                expires_at, value = self._loads(payload)
+                if time.time() < expires_at:
+                    self._set_l1(namespace, key, value, expires_at)
+                    return value
+        except (InvalidToken, ValueError, msgpack.UnpackException):
+            await self.delete(namespace, key)
+        except Exception as e:
+            self.l2_errors += 1
+            print(f"Error al leer de la cache compartida: {e}")
+        return None
+
+    async def get(self, namespace: str, key: str):
+        entry = self.l1_for(namespace).get((namespace, key))
+        if entry is not None:
+            self.l1_hits += 1
+            return entry[0]
+
+        if self.l2 is not None:
+            value = await self._get_l2(namespace, key)
+            if value is not None:
+                self.l2_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, namespace: str, key: str, value, ttl: float):
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._set_l1(namespace, key, value, expires_at)
+        if self.l2 is not None:
+            try:
+                await self.l2.set(self._l2_key(namespace, key), self._dumps(value, expires_at), px=int(ttl * 1000))
+            except Exception as e:
+                self.l2_errors += 1
+                print(f"Error al escribir en la cache compartida: {e}")
+
+    async def delete(self, namespace: str, key: str):
+        self.l1_for(namespace).delete((namespace, key))
+        if self.l2 is not None:
+            try:
+                await self.l2.delete(self._l2_key(namespace, key))
+            except Exception as e:
+                self.l2_errors += 1
+                print(f"Error al borrar de la cache compartida: {e}")
+
+    async def invalidate_namespace(self, namespace: str):
+        self.l1_for(namespace).delete_namespace(namespace)
+        if self.l2 is not None:
+            try:
+                keys = [key async for key in self.l2.scan_iter(match=f"{self.prefix}:{namespace}:*", count=500)]
+                if keys:
+                    await self.l2.delete(*keys)
+            except Exception as e:
+                self.l2_errors += 1
+                print(f"Error al invalidar {namespace} en la cache compartida: {e}")
+
+    async def get_or_set(self, namespace: str, key: str, loader, ttl: float, accept=None, store_if=None):
+        # accept(valor): si un valor cacheado sirve (p.ej. no está obsoleto)
+        # loader(valor): carga el valor; recibe el cacheado que no se aceptó o None
+        # store_if(valor): si el valor recién cargado se guarda
+        accept = accept or (lambda value: True)
+        value = await self.get(namespace, key)
+        if value is not None and accept(value):
+            return value
+
+        task = self._in_flight.get((namespace, key))
+        if task is not None:
+            self.loads_coalesced += 1
+        else:
+            task = asyncio.create_task(self._load(namespace, key, loader, value, ttl, accept, store_if))
+            self._in_flight[(namespace, key)] = task
+            task.add_done_callback(lambda _: self._in_flight.pop((namespace, key), None))
+        return await asyncio.shield(task)
+
+    async def _load(self, namespace: str, key: str, loader, current, ttl: float, accept, store_if):
+        lock_key = self._l2_key(namespace, key) + ":lock"
+        locked = False
+        if self.l2 is not None:
+            try:
+                locked = bool(await self.l2.set(lock_key, b"1", nx=True, px=int(self.lock_ttl * 1000)))
+                if not locked:
+                    # otro worker lo está cargando: esperamos a que lo deje en el L2
+                    deadline = time.monotonic() + self.lock_ttl
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(0.05)
+                        value = await self._get_l2(namespace, key)
+                        if value is not None and accept(value):
+                            self.loads_coalesced += 1
+                            return value
+            except Exception as e:
+                self.l2_errors += 1
+                print(f"Error con el lock de la cache compartida: {e}")
+
+        try:
+            self.loads += 1
+            value = await loader(current)
+            if value is not None and (store_if is None or store_if(value)):
+                await self.set(namespace, key, value, ttl)
+            return value
+        finally:
+            if locked:
+                try:
+                    await self.l2.delete(lock_key)
+                except Exception:
+                    self.l2_errors += 1
+
+    def stats(self) -> dict:
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "l2_enabled": self.l2 is not None,
+            "l1_size": len(self.l1),
+            "l1_max_size": self.l1.max_size,
+            "l1_reserved": {
+                namespace: {"size": len(l1), "max_size": l1.max_size}
+                for namespace, l1 in self._l1_reserved.items()
+            },
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_rate": (self.l1_hits + self.l2_hits) / lookups if lookups else 0.0,
+            "loads": self.loads,
+            "loads_coalesced": self.loads_coalesced,
+            "l2_errors": self.l2_errors
+        }
@@ -1,14 +1,16 @@
 # app/core/auth.py
 
-from ast import literal_eval
-from fastapi import APIRouter, Request, Form, Query
+from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse
+from starlette.routing import Match
 from templates import templates
-from managers.BaseManager import BaseManager
+from managers.StorageBackend import StorageBackend
 from managers.Encripter import Encripter
+from core.dependencies import get_storage
+from core.tokens import TokenRefreshFailed, fetch_profile
 from models.User import User
-from core.config import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, AUTH_URL, TOKEN_URL, API_BASE_URL, MASTER_KEY
-import datetime, urllib.parse, requests
+from core.config import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, AUTH_URL, TOKEN_URL, MASTER_KEY
+import datetime, urllib.parse
 
 router = APIRouter()
 encripter = Encripter(MASTER_KEY.encode())
@@ -18,12 +20,11 @@ async def index_get(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @router.post("/", response_class=HTMLResponse)
-async def index_post(request: Request, ID: str = Form(...), Key: str = Form(...)):
-    base_manager = BaseManager()
-    if base_manager._check_user_is_login(ID):
+async def index_post(request: Request, ID: str = Form(...), Key: str = Form(...), storage: StorageBackend = Depends(get_storage)):
+    if await storage._check_user_is_login(ID):
         return RedirectResponse(url=f"/playlists/playlists/{ID}", status_code=200)
     
-    if base_manager._check_credentials_exists(ID, Key):
+    if await storage._check_credentials_exists(ID, Key):
         request.session["ID_DS"] = ID
         request.session["Key_DS"] = Key
         return RedirectResponse(url=f"/login?Id={ID}&Key={Key}", status_code=302)
@@ -58,7 +59,7 @@ async def login(Id: str, Key: str):
     return RedirectResponse(auth_url)
 
 @router.get("/callback")
-async def callback(request: Request, code: str = None, state: str = None, error: str = None):
+async def callback(request: Request, code: str = None, state: str = None, error: str = None, storage: StorageBackend = Depends(get_storage)):
     if error:
         return JSONResponse({"error": error})
 
@@ -74,22 +75,30 @@ async def callback(request: Request, code: str = None, state: str = None, error:
         "client_secret": CLIENT_SECRET
     }
 
-    response = requests.post(TOKEN_URL, data=req_body)
+    response = await request.app.state.http.post(TOKEN_URL, data=req_body)
     token_info = response.json()
 
     request.session["acces_token"] = token_info["access_token"]
     request.session["refresh_token"] = token_info["refresh_token"]
     request.session["expires_in"] = datetime.datetime.now().timestamp() + token_info["expires_in"]
 
+    # El perfil se pide una sola vez aquí; las rutas lo leen del usuario guardado
+    profile = await fetch_profile(request.app.state.http, token_info["access_token"]) or {}
+
     user = User(
         id=id,
         authenticated_at=datetime.datetime.now(),
         spotify_expires_at=datetime.datetime.now() + datetime.timedelta(seconds=token_info["expires_in"]),
         spotify_token=encripter._encript(token_info["access_token"]),
         refresh_token=encripter._encript(token_info["refresh_token"]),  
-        key=key
+        key=key,
+        product=profile.get("product"),
+        spotify_user_id=profile.get("id"),
+        country=profile.get("country")
     )
-    BaseManager()._add_user(user)
+    await storage._add_user(user)
+    # puede haber iniciado sesión con otra cuenta de Spotify: fuera su me/me/top cacheado
+    await request.app.state.response_cache.invalidate_user(id)
     return RedirectResponse("/playlist")
 
 
@@ -97,51 +106,43 @@ async def callback(request: Request, code: str = None, state: str = None, error:
 
 
 
-@router.get("/refresh_token")
-async def refresh_token(request: Request):
-    rute_back = request.query_params.get("rute_back")
-    refresh_token = request.query_params.get("refresh_token")
-    id = request.query_params.get("id")
-    original_params_raw = request.query_params.get("original_params")
-    original_params = literal_eval(original_params_raw) if original_params_raw else {}
-
-    if not refresh_token:
-        return HTMLResponse("No refresh token provided", status_code=400)
-
-    req_body = {
-        'grant_type': 'refresh_token',
-        'refresh_token': refresh_token,
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET
-    }
+def _local_redirect(request: Request, rute_back: str) -> str:
+    # Solo rutas de la propia app: nada de \ ni // (los navegadores tratan "/\evil.com"
+    # y "//evil.com" como otro host) y la ruta tiene que existir
+    if "\\" in rute_back or "//" in rute_back:
+        return None
+    url = urllib.parse.urlsplit(f"/{rute_back.lstrip('/')}")
+    if url.scheme or url.netloc:
+        return None
+    scope = {"type": "http", "method": "GET", "path": url.path, "root_path": ""}
+    if not any(route.matches(scope)[0] == Match.FULL for route in request.app.routes):
+        return None
+    return urllib.parse.urlunsplit(("", "", url.path, url.query, ""))
 
-    response = requests.post(TOKEN_URL, data=req_body)
-    new_token_info = response.json()
 
-    new_user = User(
-        id=id,
-        authenticated_at=datetime.datetime.now(),
-        spotify_expires_at=datetime.datetime.now() + datetime.timedelta(seconds=new_token_info['expires_in']),
-        spotify_token=Encripter(MASTER_KEY)._encript(new_token_info['access_token']),
-        refresh_token=refresh_token,
-        key=None
-    )
+@router.get("/refresh_token")
+async def refresh_token(request: Request, id: str, rute_back: str = None, storage: StorageBackend = Depends(get_storage)):
+    # Las rutas ya refrescan el token dentro de la propia petición; este endpoint queda
+    # para forzar un refresco desde fuera (p. ej. el bot) usando el refresh token guardado
+    redirect = None
+    if rute_back:
+        redirect = _local_redirect(request, rute_back)
+        if redirect is None:
+            return HTMLResponse("rute_back no es una ruta de la aplicación", status_code=400)
+
+    if not await storage._check_user_is_login(id):
+        return HTMLResponse("Usuario no encontrado", status_code=404)
 
     try:
-        BaseManager()._update_user_for_refresh(new_user)
+        _, expires_at = await request.app.state.token_refresher.refresh(id)
+    except TokenRefreshFailed as e:
+        print(f"Error al refrescar el token del usuario {id}: {e.detail}")
+        return HTMLResponse("Error al refrescar el token", status_code=500)
     except Exception as e:
         print(f"Error al actualizar el usuario: {e}")
         return HTMLResponse("Error al actualizar el usuario", status_code=500)
 
-    # reconstruimos la ruta final
-    path = f"/{rute_back}/" + "/".join([original_params[k] for k in original_params])
-    query_str = urllib.parse.urlencode({
-        **original_params,
-        "acces_token": new_token_info['access_token'],
-        "refresh_token": refresh_token,
-        "expires_in": int(datetime.datetime.now().timestamp() + new_token_info['expires_in'])
-    })
-
-    print(f"Nuevo token para el usuario {id}: {new_token_info['access_token']}")
+    if redirect is not None:
+        return RedirectResponse(redirect)
 
-    return RedirectResponse(f"{path}?{query_str}")
\ No newline at end of file
+    return JSONResponse(content={"id": id, "expires_at": expires_at.isoformat()})
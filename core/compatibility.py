@@ -0,0 +1,79 @@
+# app/core/compatibility.py
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def _gram(matrix: sp.csr_matrix) -> np.ndarray:
+    # matrix @ matrix.T (N x N denso). Solo con las columnas que usa algún usuario; si
+    # quedan bastante llenas (géneros) el producto denso con BLAS es más rápido
+    used = np.unique(matrix.indices)
+    compact = matrix[:, used]
+    if compact.nnz > 0.05 * compact.shape[0] * compact.shape[1]:
+        dense = compact.toarray().astype(np.float32)
+        return (dense @ dense.T).astype(np.float64)
+    return (compact @ compact.T).toarray()
+
+
+def _normalise_rows(matrix: sp.csr_matrix) -> sp.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.csr_matrix(sp.diags(1.0 / norms) @ matrix)
+
+
+def _cosine(matrix: sp.csr_matrix) -> np.ndarray:
+    return _gram(_normalise_rows(matrix))
+
+
+def _jaccard(matrix: sp.csr_matrix) -> np.ndarray:
+    # |A ∩ B| / |A ∪ B| sobre los conjuntos de items (sin pesos)
+    binary = (matrix != 0).astype(np.float64)
+    shared = _gram(binary)
+    sizes = np.asarray(binary.sum(axis=1)).ravel()
+    union = sizes[:, None] + sizes[None, :] - shared
+    return np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+
+# Compatibilidad musical entre todos los pares de los usuarios dados, con las filas
+# de artistas y géneros que el Recommender ya tiene de cada uno (sus snapshots de
+# estadísticas), en el orden de user_ids, y los nombres de los artistas por código.
+# Solo recibe copias: se llama desde un hilo mientras el event loop sigue
+# actualizando los índices del Recommender. Coseno de los pesos de artistas y de géneros y Jaccard de los
+# conjuntos de artistas, con productos de matrices dispersas (una sola pasada para
+# los N x N pares). score es la media de los dos cosenos. Devuelve los `limit` pares
+# con más score, de mayor a menor.
+def compatibility_pairs(
+        artists: sp.csr_matrix,
+        genres: sp.csr_matrix,
+        artist_names: list,
+        user_ids: list,
+        limit: int = 50,
+        shared: int = 3
+    ) -> list:
+    if len(user_ids) < 2:
+        return []
+
+    artist_cosine = _cosine(artists)
+    genre_cosine = _cosine(genres)
+    scores = (artist_cosine + genre_cosine) / 2
+
+    # solo el triángulo superior: cada par una vez y sin (i, i)
+    first, second = np.triu_indices(len(user_ids), k=1)
+    best = np.argsort(-scores[first, second], kind="stable")[:limit]
+    first, second = first[best], second[best]
+    jaccard = _jaccard(artists)
+
+    pairs = []
+    for i, j in zip(first.tolist(), second.tolist()):
+        # artistas en común con más peso para los dos
+        common = sp.csr_matrix(artists[i].multiply(artists[j]))
+        top = common.indices[np.argsort(-common.data, kind="stable")[:shared]]
+        pairs.append({
+            "users": [user_ids[i], user_ids[j]],
+            "score": round(float(scores[i, j]), 4),
+            "artists_cosine": round(float(artist_cosine[i, j]), 4),
+            "genres_cosine": round(float(genre_cosine[i, j]), 4),
+            "artists_jaccard": round(float(jaccard[i, j]), 4),
+            "shared_artists": [artist_names[code] for code in top.tolist()]
+        })
+    return pairs
@@ -11,3 +11,83 @@ REDIRECT_URI = "http://localhost:8000/callback"
 AUTH_URL = "https://accounts.spotify.com/authorize"
 TOKEN_URL = "https://accounts.spotify.com/api/token"
 API_BASE_URL = "https://api.spotify.com/v1/"
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+
+# Réplica en memoria de users/tempDataLogin con listeners on_snapshot
+USE_FIRESTORE_REPLICA = os.getenv("USE_FIRESTORE_REPLICA", "false").lower() == "true"
+REPLICA_EVICTION_SECONDS = int(os.getenv("REPLICA_EVICTION_SECONDS", "60"))
+
+# Backend de almacenamiento: "firestore" o "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "spotify.db")
+
+# Cliente HTTP compartido para la API de Spotify
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# Refresco proactivo de tokens: segundos antes de caducar y ventana de "usuario activo"
+TOKEN_REFRESH_LEAD_SECONDS = int(os.getenv("TOKEN_REFRESH_LEAD_SECONDS", "300"))
+TOKEN_REFRESH_ACTIVE_SECONDS = int(os.getenv("TOKEN_REFRESH_ACTIVE_SECONDS", "3600"))
+
+# Rate limit saliente hacia Spotify (peticiones/segundo y ráfaga) para la app y por usuario
+SPOTIFY_APP_RATE = float(os.getenv("SPOTIFY_APP_RATE", "10"))
+SPOTIFY_APP_BURST = float(os.getenv("SPOTIFY_APP_BURST", "30"))
+SPOTIFY_USER_RATE = float(os.getenv("SPOTIFY_USER_RATE", "5"))
+SPOTIFY_USER_BURST = float(os.getenv("SPOTIFY_USER_BURST", "20"))
+SPOTIFY_BACKGROUND_RESERVE = float(os.getenv("SPOTIFY_BACKGROUND_RESERVE", "0.25"))
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "3"))
+SPOTIFY_MAX_RETRY_WAIT = float(os.getenv("SPOTIFY_MAX_RETRY_WAIT", "10"))
+
+# Cache de dos niveles (cache_app.TieredCache): L1 en memoria y L2 Redis opcional
+# compartido entre workers (solo si hay REDIS_URL)
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "10000"))
+CACHE_L1_MAX_TTL = float(os.getenv("CACHE_L1_MAX_TTL", "30"))
+CACHE_LOCK_SECONDS = float(os.getenv("CACHE_LOCK_SECONDS", "10"))
+
+# Cache de respuestas GET de Spotify (TTL en segundos por tipo de endpoint)
+RESPONSE_CACHE_TTL_ME = int(os.getenv("RESPONSE_CACHE_TTL_ME", "3600"))
+RESPONSE_CACHE_TTL_ARTIST_TOP_TRACKS = int(os.getenv("RESPONSE_CACHE_TTL_ARTIST_TOP_TRACKS", "86400"))
+RESPONSE_CACHE_TTL_SEARCH = int(os.getenv("RESPONSE_CACHE_TTL_SEARCH", "3600"))
+
+# Seguimiento de la reproducción (me/player): segundos entre sondeos mientras suena
+# algo y sin reproducción, y cuánto se sigue sondeando a un usuario tras cerrarse su
+# último stream SSE (leer su reproducción no lo apunta al sondeo)
+PRESENCE_PLAYING_INTERVAL = float(os.getenv("PRESENCE_PLAYING_INTERVAL", "5"))
+PRESENCE_IDLE_INTERVAL = float(os.getenv("PRESENCE_IDLE_INTERVAL", "60"))
+PRESENCE_ACTIVE_SECONDS = float(os.getenv("PRESENCE_ACTIVE_SECONDS", "60"))
+PRESENCE_MAX_CONCURRENT = int(os.getenv("PRESENCE_MAX_CONCURRENT", "10"))
+
+# Usuarios consultados a la vez en POST /player/friends_activity
+FRIENDS_ACTIVITY_CONCURRENCY = int(os.getenv("FRIENDS_ACTIVITY_CONCURRENCY", "10"))
+
+# Snapshots de estadísticas cargados a la vez en POST /stats/compatibility
+COMPATIBILITY_CONCURRENCY = int(os.getenv("COMPATIBILITY_CONCURRENCY", "10"))
+
+# Snapshots de estadísticas: edad máxima antes de rehacerlos al consultarlos, cada
+# cuánto se rehacen en segundo plano y durante cuánto tiempo tras la última consulta
+STATS_SNAPSHOT_MAX_AGE = float(os.getenv("STATS_SNAPSHOT_MAX_AGE", "86400"))
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "21600"))
+STATS_ACTIVE_SECONDS = float(os.getenv("STATS_ACTIVE_SECONDS", "259200"))
+
+# Historial de escucha (managers/ListeningHistory.py): carpeta de los datos, cada
+# cuánto se piden las reproducciones nuevas y a partir de cuántos segmentos se compactan
+HISTORY_PATH = os.getenv("HISTORY_PATH", "history")
+HISTORY_POLL_SECONDS = float(os.getenv("HISTORY_POLL_SECONDS", "1800"))
+HISTORY_COMPACT_SEGMENTS = int(os.getenv("HISTORY_COMPACT_SEGMENTS", "64"))
+
+# Recomendaciones (managers/Recommender.py): vecinos guardados por artista/género y
+# cada cuánto se recalculan los de los usuarios con estadísticas nuevas
+RECOMMENDER_NEIGHBOURS = int(os.getenv("RECOMMENDER_NEIGHBOURS", "50"))
+RECOMMENDER_REFRESH_SECONDS = float(os.getenv("RECOMMENDER_REFRESH_SECONDS", "60"))
+
+# Votaciones de playlists de la comunidad: cada cuánto se vuelcan los votos, en
+# cuántos documentos se reparten los contadores de cada playlist (Firestore) y
+# cuántas canciones ganadoras se añaden como mucho en cada volcado
+VOTES_FLUSH_SECONDS = float(os.getenv("VOTES_FLUSH_SECONDS", "5"))
+VOTES_SHARDS = int(os.getenv("VOTES_SHARDS", "10"))
+VOTES_MAX_PROMOTIONS = int(os.getenv("VOTES_MAX_PROMOTIONS", "100"))
@@ -0,0 +1,112 @@
+# app/core/dependencies.py
+
+from fastapi import Request, Depends
+from managers.StorageBackend import StorageBackend
+from core.session import SpotifySession, UserNotLogged
+
+
+def get_storage(request: Request) -> StorageBackend:
+    return request.app.state.storage
+
+
+def _cached_session(state, user_id: str, cached: tuple) -> SpotifySession:
+    token, expires_at, profile = cached
+    state.token_refresher.touch(user_id, expires_at)
+    return SpotifySession(
+        user_id=user_id,
+        token=token,
+        expires_at=expires_at,
+        http=state.http,
+        refresher=state.token_refresher,
+        scheduler=state.spotify_scheduler,
+        profile=profile,
+        cache=state.response_cache
+    )
+
+
+async def _stored_session(state, storage: StorageBackend, user_id: str, user: dict) -> SpotifySession:
+    session = SpotifySession(
+        user_id=user_id,
+        token=storage.encripter._decript(user["spotify_token"]),
+        expires_at=user["spotify_expires_at"],
+        http=state.http,
+        refresher=state.token_refresher,
+        scheduler=state.spotify_scheduler,
+        refresh_token=storage.encripter._decript(user["refresh_token"]),
+        profile=storage._user_profile(user),
+        cache=state.response_cache
+    )
+    if not session.is_expired():
+        await storage.token_cache.aset(user_id, session.token, session.expires_at, session.profile)
+        state.token_refresher.touch(user_id, session.expires_at)
+    return session
+
+
+# Sesión de Spotify de un usuario a partir del estado de la app (app.state); la usan
+# las dependencias de las rutas y los servicios en segundo plano (PresenceTracker)
+async def load_session(state, storage: StorageBackend, user_id: str) -> SpotifySession:
+    # Camino caliente: token descifrado en memoria, sin tocar el almacenamiento
+    cached = await storage.token_cache.aget(user_id)
+    if cached is not None:
+        return _cached_session(state, user_id, cached)
+
+    user = await storage._get_user(user_id)
+    if user is None:
+        raise UserNotLogged(user_id)
+
+    session = await _stored_session(state, storage, user_id, user)
+    # refresco en la misma petición, la guarda en la cache de tokens
+    await session.ensure_fresh()
+    return session
+
+
+# Sesiones de varios usuarios: los que no están en la cache de tokens se leen del
+# almacenamiento en una sola lectura. Devuelve ({id: sesión}, {id: error}); los
+# tokens caducados se refrescan en la primera llamada de cada sesión.
+async def load_sessions(state, storage: StorageBackend, user_ids: list) -> tuple:
+    sessions = {}
+    errors = {}
+    missing = []
+    for user_id in user_ids:
+        cached = await storage.token_cache.aget(user_id)
+        if cached is not None:
+            sessions[user_id] = _cached_session(state, user_id, cached)
+        else:
+            missing.append(user_id)
+
+    users = await storage._get_users(missing) if missing else {}
+    for user_id in missing:
+        user = users.get(user_id)
+        if user is None:
+            errors[user_id] = f"El usuario {user_id} no está logueado en la aplicación"
+            continue
+        sessions[user_id] = await _stored_session(state, storage, user_id, user)
+    return sessions, errors
+
+
+async def get_spotify_session(request: Request, user_id: str, storage: StorageBackend = Depends(get_storage)) -> SpotifySession:
+    return await load_session(request.app.state, storage, user_id)
+
+
+async def get_target_session(request: Request, target_id: str, storage: StorageBackend = Depends(get_storage)) -> SpotifySession:
+    return await load_session(request.app.state, storage, target_id)
+
+
+def get_presence(request: Request):
+    return request.app.state.presence
+
+
+def get_stats_engine(request: Request):
+    return request.app.state.stats_engine
+
+
+def get_history_ingester(request: Request):
+    return request.app.state.history_ingester
+
+
+def get_recommender(request: Request):
+    return request.app.state.recommender
+
+
+def get_votes(request: Request):
+    return request.app.state.votes
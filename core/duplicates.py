@@ -0,0 +1,211 @@
+# app/core/duplicates.py
+
+import bisect
+import hashlib
+import re
+import unicodedata
+from core.session import SpotifySession
+from core.playlists import PLAYLIST_BATCH_SIZE, add_tracks_in_batches, iter_pages
+
+# me/tracks: páginas de 50 y DELETE con como mucho 50 ids
+SAVED_TRACKS_PAGE_SIZE = 50
+SAVED_TRACKS_BATCH_SIZE = 50
+# playlists/{id}/tracks: páginas de 100 y DELETE con como mucho 100 canciones
+PLAYLIST_PAGE_SIZE = 100
+# solo los campos que hacen falta para comparar y borrar
+PLAYLIST_ITEM_FIELDS = "items(track(id,uri,name,duration_ms,is_local,external_ids(isrc),artists(name))),next,offset"
+
+# "(feat. X)", "[with X]"... y "- Remastered 2011", "(2009 Remaster)"...
+_FEATURING = re.compile(r"[\(\[]\s*(feat\.?|ft\.?|featuring|with)\s[^\)\]]*[\)\]]", re.IGNORECASE)
+_REMASTER = re.compile(r"(\s-\s[^-]*remaster[^-]*$)|([\(\[][^\)\]]*remaster[^\)\]]*[\)\]])", re.IGNORECASE)
+_NOT_ALNUM = re.compile(r"[\W_]+")
+
+
+def normalise(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NOT_ALNUM.sub(" ", text.casefold()).strip()
+
+
+def normalise_title(title: str) -> str:
+    return normalise(_REMASTER.sub("", _FEATURING.sub("", title)))
+
+
+def _digest(key: str) -> bytes:
+    # 8 bytes por clave: la memoria depende del número de claves, no de las canciones
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+
+
+def track_keys(track: dict, duration_tolerance_ms: int) -> tuple:
+    # (claves con las que se guarda la canción, claves con las que se busca): la
+    # duración va en tramos de duration_tolerance_ms y se busca también en los dos
+    # tramos vecinos, para que dos duraciones casi iguales no queden a ambos lados
+    isrc = (track.get("external_ids") or {}).get("isrc")
+    keys = [_digest("isrc:" + isrc.upper())] if isrc else []
+    lookups = list(keys)
+    artists = track.get("artists") or []
+    if track.get("name") and artists:
+        name = f"name:{normalise_title(track['name'])}\0{normalise(artists[0].get('name') or '')}\0"
+        bucket = (track.get("duration_ms") or 0) // duration_tolerance_ms
+        keys.append(_digest(f"{name}{bucket}"))
+        lookups.extend(_digest(f"{name}{near}") for near in (bucket, bucket - 1, bucket + 1))
+    return keys, lookups
+
+
+# Detección de duplicados en una sola pasada: una canción es duplicada si comparte
+# ISRC o título+artista principal+duración normalizados con una anterior. Solo se
+# guarda, por cada clave, la posición de la primera canción que la tenía.
+class DuplicateFinder:
+    def __init__(self, duration_tolerance_ms: int = 2000):
+        self.duration_tolerance_ms = duration_tolerance_ms
+        self._first = {}
+        self.scanned = 0
+
+    def check(self, position: int, track: dict):
+        # posición de la canción de la que es duplicada, o None si es la primera
+        self.scanned += 1
+        keys, lookups = track_keys(track, self.duration_tolerance_ms)
+        original = next((self._first[key] for key in lookups if key in self._first), None)
+        for key in keys:
+            self._first.setdefault(key, position if original is None else original)
+        return original
+
+    def stats(self) -> dict:
+        return {"scanned": self.scanned, "unique_keys": len(self._first)}
+
+
+def _duplicate(position: int, original: int, track: dict, uri_kept_at: int = None) -> dict:
+    return {
+        "position": position,
+        "duplicate_of": original,
+        # posición de la copia que se conserva con la misma URI (duplicado exacto) o None
+        "uri_kept_at": uri_kept_at,
+        "id": track.get("id"),
+        "uri": track.get("uri"),
+        "name": track.get("name"),
+        "artists": [artist.get("name") for artist in track.get("artists") or []]
+    }
+
+
+# Recorre las canciones guardadas (me/tracks, de la más reciente a la más antigua) o
+# una playlist (en su orden) y va devolviendo los duplicados según aparecen. Las
+# canciones locales no se comparan: no se pueden borrar por id. En una playlist se
+# apunta además la posición de cada URI que se conserva (una misma canción puede estar
+# varias veces y a Spotify se le borra por URI).
+async def iter_duplicates(session: SpotifySession, finder: DuplicateFinder, playlist_id: str = None):
+    if playlist_id is None:
+        items = iter_pages(session, "me/tracks", SAVED_TRACKS_PAGE_SIZE)
+    else:
+        items = iter_pages(session, f"playlists/{playlist_id}/tracks", PLAYLIST_PAGE_SIZE, {"fields": PLAYLIST_ITEM_FIELDS})
+
+    kept_uris = {}
+    position = -1
+    async for item in items:
+        position += 1
+        track = item.get("track")
+        if not track or track.get("is_local") or not track.get("uri"):
+            continue
+        original = finder.check(position, track)
+        if original is None:
+            if playlist_id is not None:
+                kept_uris.setdefault(track["uri"], position)
+        else:
+            yield _duplicate(position, original, track, kept_uris.get(track["uri"]))
+
+
+async def remove_saved_tracks(session: SpotifySession, track_ids: list) -> list:
+    batches = []
+    for start in range(0, len(track_ids), SAVED_TRACKS_BATCH_SIZE):
+        batch_ids = track_ids[start:start + SAVED_TRACKS_BATCH_SIZE]
+        batch = {"index": len(batches), "tracks": len(batch_ids)}
+        try:
+            response = await session.delete("me/tracks", params={"ids": ",".join(batch_ids)})
+            if response.status_code == 200:
+                batch["status"] = "removed"
+            else:
+                batch.update({"status": "error", "error": response.text})
+        except Exception as e:
+            batch.update({"status": "error", "error": str(e)})
+        batches.append(batch)
+    return batches
+
+
+# Borra los duplicados de una playlist. DELETE playlists/{id}/tracks solo admite la
+# URI y quita todas sus apariciones, así que:
+#  - las URIs de los duplicados se borran en lotes de 100, encadenando el snapshot_id
+#  - las que además estaban en una posición que se conserva (duplicados exactos) se
+#    vuelven a añadir después, en su posición original menos los duplicados que tenía
+#    delante; de la primera a la última, en tramos de posiciones seguidas
+# Si un lote de borrado falla no se sigue, y las URIs de los lotes ya borrados se
+# vuelven a añadir igualmente para no perder la canción que se conservaba.
+async def remove_playlist_duplicates(session: SpotifySession, playlist_id: str, snapshot_id: str, duplicates: list) -> dict:
+    tracks_by_uri = {}
+    kept_at = {}
+    for duplicate in duplicates:
+        tracks_by_uri[duplicate["uri"]] = tracks_by_uri.get(duplicate["uri"], 0) + 1
+        if duplicate["uri_kept_at"] is not None:
+            kept_at[duplicate["uri"]] = duplicate["uri_kept_at"]
+
+    uris = list(tracks_by_uri)
+    batches = []
+    removed_uris = []
+    for start in range(0, len(uris), PLAYLIST_BATCH_SIZE):
+        batch_uris = uris[start:start + PLAYLIST_BATCH_SIZE]
+        data = {"tracks": [{"uri": uri} for uri in batch_uris], "snapshot_id": snapshot_id}
+        batch = {"index": len(batches), "tracks": sum(tracks_by_uri[uri] for uri in batch_uris)}
+        try:
+            response = await session.delete(f"playlists/{playlist_id}/tracks", json=data)
+            if response.status_code == 200:
+                snapshot_id = response.json().get("snapshot_id", snapshot_id)
+                removed_uris.extend(batch_uris)
+                batch.update({"status": "removed", "snapshot_id": snapshot_id})
+            else:
+                batch.update({"status": "error", "error": response.text})
+        except Exception as e:
+            batch.update({"status": "error", "error": str(e)})
+        batches.append(batch)
+        if batch["status"] == "error":
+            break
+
+    # posiciones de los duplicados que se han borrado de verdad
+    removed = set(removed_uris)
+    gone = sorted(duplicate["position"] for duplicate in duplicates if duplicate["uri"] in removed)
+    restores = []
+    runs = []
+    for uri in sorted((uri for uri in removed_uris if uri in kept_at), key=kept_at.get):
+        position = kept_at[uri] - bisect.bisect_left(gone, kept_at[uri])
+        if runs and runs[-1][0] + len(runs[-1][1]) == position:
+            runs[-1][1].append(uri)
+        else:
+            runs.append((position, [uri]))
+    for position, run_uris in runs:
+        result = await add_tracks_in_batches(session, playlist_id, run_uris, position)
+        snapshot_id = result["snapshot_id"] or snapshot_id
+        restores.append({"position": position, "uris": run_uris, "restored": result["added"], "batches": result["batches"]})
+
+    return {"snapshot_id": snapshot_id, "batches": batches, "restored": restores}
+
+
+# Limpieza completa como una secuencia de eventos para un stream NDJSON: cada
+# duplicado según se encuentra y, al final, el resumen con los lotes borrados
+# (ninguno con dry_run). Para una playlist hace falta el snapshot_id de antes de leerla.
+async def remove_duplicates(session: SpotifySession, playlist_id: str = None, snapshot_id: str = None, dry_run: bool = True):
+    finder = DuplicateFinder()
+    # de cada duplicado solo se guarda lo necesario para borrarlo
+    to_remove = []
+    try:
+        async for duplicate in iter_duplicates(session, finder, playlist_id):
+            to_remove.append({key: duplicate[key] for key in ("position", "id", "uri", "uri_kept_at")})
+            yield {"duplicate": duplicate}
+    except Exception as e:
+        yield {"error": f"Error al leer las canciones: {e}", **finder.stats()}
+        return
+
+    summary = {**finder.stats(), "duplicates": len(to_remove), "dry_run": dry_run}
+    if not dry_run and to_remove:
+        if playlist_id is None:
+            summary["batches"] = await remove_saved_tracks(session, [duplicate["id"] for duplicate in to_remove])
+        else:
+            summary.update(await remove_playlist_duplicates(session, playlist_id, snapshot_id, to_remove))
+        summary["removed"] = sum(batch["tracks"] for batch in summary["batches"] if batch["status"] == "removed")
+    yield {"summary": summary}
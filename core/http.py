@@ -0,0 +1,74 @@
+# app/core/http.py
+
+import importlib.util
+import time
+from collections import Counter
+import httpx
+from core.config import HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP2_ENABLED
+
+
+# Colecciones de la API cuyo siguiente segmento es un id (artists/{id}/top-tracks...)
+ID_COLLECTIONS = {"artists", "albums", "tracks", "playlists", "users", "shows", "episodes", "audiobooks"}
+
+
+def endpoint_name(request: httpx.Request) -> str:
+    # "GET artists/{id}/top-tracks": la ruta sin /v1/ y con los ids sustituidos
+    segments = [segment for segment in request.url.path.split("/") if segment]
+    if request.url.host == "api.spotify.com" and segments[:1] == ["v1"]:
+        segments = segments[1:]
+    for index in range(1, len(segments)):
+        if segments[index - 1] in ID_COLLECTIONS and segments[index - 2:index - 1] != ["me"]:
+            segments[index] = "{id}"
+    return f"{request.method} {'/'.join(segments)}"
+
+
+# Contadores del cliente HTTP compartido: cuántas peticiones reutilizan una
+# conexión ya abierta, la latencia hasta recibir las cabeceras de la respuesta
+# y cuántas peticiones se hacen a cada endpoint de Spotify
+class HttpMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.endpoints = Counter()
+        self.connections_opened = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def on_request(self, request: httpx.Request):
+        request.extensions["trace"] = self._trace
+        request.extensions["started_at"] = time.perf_counter()
+
+    async def on_response(self, response: httpx.Response):
+        latency = time.perf_counter() - response.request.extensions["started_at"]
+        self.requests += 1
+        self.endpoints[endpoint_name(response.request)] += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def stats(self) -> dict:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connection_reuse_rate": reused / self.requests if self.requests else 0.0,
+            "avg_latency_ms": self.total_latency / self.requests * 1000 if self.requests else 0.0,
+            "max_latency_ms": self.max_latency * 1000,
+            "endpoints": dict(self.endpoints.most_common())
+        }
+
+
+def create_http_client(metrics: HttpMetrics) -> httpx.AsyncClient:
+    # HTTP/2 solo si está instalado el paquete h2 (httpx[http2] en requirements.txt)
+    http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+    if HTTP2_ENABLED and not http2:
+        print("HTTP/2 no disponible (falta el paquete h2): el cliente HTTP usa HTTP/1.1")
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        event_hooks={"request": [metrics.on_request], "response": [metrics.on_response]}
+    )
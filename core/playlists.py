@@ -0,0 +1,92 @@
+# app/core/playlists.py
+
+import asyncio
+import contextlib
+from core.session import SpotifySession
+
+# Máximo de URIs por petición que admite POST playlists/{id}/tracks
+PLAYLIST_BATCH_SIZE = 100
+
+
+# Añade a una playlist una lista de URIs en lotes de 100: quita duplicados
+# conservando el orden, manda los lotes uno tras otro (así se mantiene el orden
+# en la playlist) y va guardando el snapshot_id que devuelve Spotify en cada uno.
+# Si se da `position`, cada lote se inserta justo detrás del anterior.
+async def add_tracks_in_batches(session: SpotifySession, playlist_id: str, uris: list, position: int = None) -> dict:
+    unique_uris = list(dict.fromkeys(uris))
+    batches = []
+    snapshot_id = None
+    added = 0
+
+    for start in range(0, len(unique_uris), PLAYLIST_BATCH_SIZE):
+        batch_uris = unique_uris[start:start + PLAYLIST_BATCH_SIZE]
+        data = {"uris": batch_uris}
+        if position is not None:
+            data["position"] = position + added
+
+        batch = {"index": len(batches), "uris": len(batch_uris)}
+        try:
+            response = await session.post(f"playlists/{playlist_id}/tracks", json=data)
+            if response.status_code == 201:
+                snapshot_id = response.json().get("snapshot_id", snapshot_id)
+                added += len(batch_uris)
+                batch.update({"status": "added", "snapshot_id": snapshot_id})
+            else:
+                batch.update({"status": "error", "error": response.text})
+        except Exception as e:
+            batch.update({"status": "error", "error": str(e)})
+        batches.append(batch)
+
+    return {
+        "requested": len(uris),
+        "duplicates": len(uris) - len(unique_uris),
+        "added": added,
+        "snapshot_id": snapshot_id,
+        "batches": batches
+    }
+
+
+# Recorre todos los elementos de un endpoint paginado con limit/offset (me/playlists,
+# me/tracks, playlists/{id}/tracks...). Mientras se entregan los elementos de una
+# página ya está en vuelo la petición de la siguiente.
+async def iter_pages(session: SpotifySession, endpoint: str, page_size: int, params: dict = None):
+    def fetch(offset: int):
+        return asyncio.create_task(session.get(endpoint, params={**(params or {}), "limit": page_size, "offset": offset}))
+
+    next_page = fetch(0)
+    try:
+        while next_page is not None:
+            response = await next_page
+            if response.status_code != 200:
+                raise Exception(response.text)
+
+            page = response.json()
+            next_page = None
+            if page.get("next"):
+                next_page = fetch(page["offset"] + len(page["items"]))
+
+            for item in page["items"]:
+                yield item
+    finally:
+        # si el cliente corta el stream no dejamos la siguiente página en vuelo
+        if next_page is not None and not next_page.done():
+            next_page.cancel()
+
+
+async def iter_user_playlists(session: SpotifySession, page_size: int = 50):
+    # Spotify devuelve null en el lugar de las playlists que ya no están disponibles
+    async with contextlib.aclosing(iter_pages(session, "me/playlists", page_size)) as playlists:
+        async for playlist in playlists:
+            if playlist is not None:
+                yield playlist
+
+
+# Proyección de un playlist a los campos pedidos; "track_count" es tracks.total
+def project_playlist(playlist: dict, fields: list) -> dict:
+    projected = {}
+    for field in fields:
+        if field == "track_count":
+            projected[field] = (playlist.get("tracks") or {}).get("total")
+        else:
+            projected[field] = playlist.get(field)
+    return projected
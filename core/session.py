@@ -0,0 +1,102 @@
+# app/core/session.py
+
+import datetime
+from core.config import API_BASE_URL
+from managers.SpotifyScheduler import INTERACTIVE
+
+
+class UserNotLogged(Exception):
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+
+
+# Sesión autenticada contra Spotify para un usuario durante una petición:
+# el documento del usuario se lee una sola vez y el token se descifra una sola vez.
+# Si el token caduca (o Spotify responde 401) se refresca aquí mismo a través del
+# TokenRefresher (un solo refresco en vuelo por usuario) y se reintenta la llamada.
+# Todas las llamadas pasan por el SpotifyScheduler (rate limit, 429, prioridades) y los
+# GET cacheables (me, search, top-tracks) por la ResponseCache.
+class SpotifySession:
+    def __init__(
+            self,
+            user_id: str,
+            token: str,
+            expires_at: datetime.datetime,
+            http,
+            refresher,
+            scheduler,
+            refresh_token: str = None,
+            profile: dict = None,
+            cache=None
+        ):
+        self.user_id = user_id
+        self.token = token
+        self.expires_at = expires_at
+        self.http = http
+        self.refresher = refresher
+        self.scheduler = scheduler
+        self.refresh_token = refresh_token
+        self.profile = profile
+        self.cache = cache
+
+    def is_expired(self) -> bool:
+        return datetime.datetime.now(datetime.timezone.utc) > self.expires_at
+
+    async def refresh(self):
+        self.token, self.expires_at = await self.refresher.refresh(self.user_id, self.refresh_token)
+
+    async def ensure_fresh(self):
+        if self.is_expired():
+            self.refresher.expired_token_hits += 1
+            await self.refresh()
+
+    async def request(self, method: str, endpoint: str, priority: int = INTERACTIVE, **kwargs):
+        cache_key = None
+        if method == "GET" and self.cache is not None:
+            cache_key = self.cache.key_for(endpoint, kwargs.get("params"), self.user_id, (self.profile or {}).get("country"))
+        if cache_key is None:
+            return await self._request(method, endpoint, priority, **kwargs)
+
+        extra_headers = kwargs.pop("headers", {})
+        return await self.cache.fetch(
+            cache_key,
+            lambda headers: self._request(method, endpoint, priority, headers={**extra_headers, **headers}, **kwargs)
+        )
+
+    async def _request(self, method: str, endpoint: str, priority: int = INTERACTIVE, **kwargs):
+        await self.ensure_fresh()
+
+        extra_headers = kwargs.pop("headers", {})
+        response = await self._send(method, endpoint, extra_headers, priority, **kwargs)
+        if response.status_code == 401:
+            # token revocado o caducado antes de tiempo: refrescamos y reintentamos una vez
+            await self.refresh()
+            response = await self._send(method, endpoint, extra_headers, priority, **kwargs)
+        return response
+
+    async def _send(self, method: str, endpoint: str, extra_headers: dict, priority: int, **kwargs):
+        headers = {"Authorization": f"Bearer {self.token}", **extra_headers}
+        return await self.scheduler.send(
+            lambda: self.http.request(method, API_BASE_URL + endpoint, headers=headers, **kwargs),
+            self.user_id,
+            priority
+        )
+
+    async def get(self, endpoint: str, **kwargs):
+        return await self.request("GET", endpoint, **kwargs)
+
+    async def post(self, endpoint: str, **kwargs):
+        return await self.request("POST", endpoint, **kwargs)
+
+    async def put(self, endpoint: str, **kwargs):
+        return await self.request("PUT", endpoint, **kwargs)
+
+    async def delete(self, endpoint: str, **kwargs):
+        return await self.request("DELETE", endpoint, **kwargs)
+
+    async def get_profile(self) -> dict:
+        # GET me se hace como mucho una vez por petición
+        if self.profile is None:
+            response = await self.get("me")
+            self.profile = response.json() if response.status_code == 200 else {}
+        return self.profile
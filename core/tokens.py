@@ -0,0 +1,63 @@
+# app/core/tokens.py
+
+import datetime
+from models.User import User
+from core.config import CLIENT_ID, CLIENT_SECRET, TOKEN_URL, API_BASE_URL
+
+
+class TokenRefreshFailed(Exception):
+    def __init__(self, user_id: str, detail: str = None):
+        self.user_id = user_id
+        self.detail = detail
+
+
+# Lee el perfil (product, id, country) con un access token recién obtenido.
+# Devuelve None si Spotify no responde bien: el perfil guardado se conserva.
+async def fetch_profile(http, access_token: str) -> dict:
+    try:
+        response = await http.get(API_BASE_URL + "me", headers={"Authorization": f"Bearer {access_token}"})
+    except Exception:
+        return None
+    if response.status_code != 200:
+        return None
+    profile = response.json()
+    return {"id": profile.get("id"), "product": profile.get("product"), "country": profile.get("country")}
+
+
+# Refresca el access token de un usuario contra TOKEN_URL, lo guarda cifrado en el
+# almacenamiento junto con el perfil de Spotify y deja ambos en la cache.
+# Devuelve (token, expires_at).
+async def refresh_access_token(http, storage, user_id: str, refresh_token: str):
+    req_body = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'client_id': CLIENT_ID,
+        'client_secret': CLIENT_SECRET
+    }
+
+    response = await http.post(TOKEN_URL, data=req_body)
+    if response.status_code != 200:
+        raise TokenRefreshFailed(user_id, response.text)
+
+    new_token_info = response.json()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expires_at = now + datetime.timedelta(seconds=new_token_info['expires_in'])
+
+    # Spotify puede rotar el refresh token; si no manda uno nuevo se conserva el actual
+    rotated_refresh_token = new_token_info.get('refresh_token')
+    profile = await fetch_profile(http, new_token_info['access_token']) or {}
+    new_user = User(
+        id=user_id,
+        authenticated_at=now,
+        spotify_expires_at=expires_at,
+        spotify_token=storage.encripter._encript(new_token_info['access_token']),
+        refresh_token=storage.encripter._encript(rotated_refresh_token) if rotated_refresh_token else None,
+        key=None,
+        product=profile.get('product'),
+        spotify_user_id=profile.get('id'),
+        country=profile.get('country')
+    )
+    await storage._update_user_for_refresh(new_user)
+    await storage.token_cache.aset(user_id, new_token_info['access_token'], expires_at, profile or None)
+
+    return new_token_info['access_token'], expires_at
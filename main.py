@@ -1,6 +1,8 @@
 # main.py
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
@@ -11,9 +13,141 @@ from routes.player import player_operations
 from routes.playlist import playlist_operatiosn
 from routes.tracks import tracks_operations
 from routes.stats import stats_operations
+from routes.metrics import metrics_operations
+from routes.votes import votes_operations
 from core import auth
+from core.session import UserNotLogged
+from core.tokens import TokenRefreshFailed
+from core.http import HttpMetrics, create_http_client
+from managers.BaseManager import BaseManager
+from managers.AsyncBaseManager import AsyncBaseManager
+from managers.SQLiteManager import SQLiteManager
+from managers.FirestoreReplica import FirestoreReplica
+from managers.TokenRefresher import TokenRefresher
+from managers.SpotifyScheduler import SpotifyScheduler, SpotifyRateLimited
+from managers.ResponseCache import ResponseCache
+from managers.TokenCache import TokenCache
+from managers.PresenceTracker import PresenceTracker
+from managers.StatsEngine import StatsEngine
+from managers.ListeningHistory import ListeningHistory, HistoryIngester
+from managers.Recommender import Recommender
+from managers.VoteAggregator import VoteAggregator, VotingClosed, VotingForbidden
+from core.dependencies import load_session
+from cache_app import TieredCache
+from core.config import USE_FIRESTORE_REPLICA, REPLICA_EVICTION_SECONDS, STORAGE_BACKEND, SQLITE_PATH
+from core.config import TOKEN_REFRESH_LEAD_SECONDS, TOKEN_REFRESH_ACTIVE_SECONDS
+from core.config import MASTER_KEY, REDIS_URL, CACHE_L1_SIZE, CACHE_L1_MAX_TTL, CACHE_LOCK_SECONDS, TOKEN_CACHE_SIZE
+from core.config import PRESENCE_PLAYING_INTERVAL, PRESENCE_IDLE_INTERVAL, PRESENCE_ACTIVE_SECONDS, PRESENCE_MAX_CONCURRENT
+from core.config import STATS_SNAPSHOT_MAX_AGE, STATS_REFRESH_SECONDS, STATS_ACTIVE_SECONDS
+from core.config import HISTORY_PATH, HISTORY_POLL_SECONDS, HISTORY_COMPACT_SEGMENTS
+from core.config import RECOMMENDER_NEIGHBOURS, RECOMMENDER_REFRESH_SECONDS
+from core.config import VOTES_FLUSH_SECONDS, VOTES_SHARDS, VOTES_MAX_PROMOTIONS
+from core.config import (
+    SPOTIFY_APP_RATE, SPOTIFY_APP_BURST, SPOTIFY_USER_RATE, SPOTIFY_USER_BURST,
+    SPOTIFY_BACKGROUND_RESERVE, SPOTIFY_MAX_RETRIES, SPOTIFY_MAX_RETRY_WAIT
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un único backend de almacenamiento para todo el proceso (STORAGE_BACKEND en core/config.py)
+    # Una única cache de dos niveles para tokens y respuestas de Spotify
+    app.state.cache = TieredCache.from_url(
+        REDIS_URL,
+        l1_size=CACHE_L1_SIZE,
+        secret=MASTER_KEY,
+        l1_max_ttl=CACHE_L1_MAX_TTL,
+        lock_ttl=CACHE_LOCK_SECONDS
+    )
+    token_cache = TokenCache(TOKEN_CACHE_SIZE, cache=app.state.cache)
+    app.state.base_manager = None
+    app.state.replica = None
+    if STORAGE_BACKEND == "sqlite":
+        app.state.storage = SQLiteManager(SQLITE_PATH, token_cache=token_cache)
+    else:
+        # BaseManager (cliente síncrono) solo hace falta para los listeners de la réplica;
+        # las rutas usan el AsyncClient
+        app.state.base_manager = BaseManager()
+        app.state.storage = AsyncBaseManager(token_cache=token_cache)
+        if USE_FIRESTORE_REPLICA and app.state.base_manager.db is not None:
+            app.state.replica = FirestoreReplica(app.state.base_manager.db, REPLICA_EVICTION_SECONDS)
+            app.state.replica.start()
+            app.state.storage.replica = app.state.replica
+    # Un único cliente HTTP con pool de conexiones keep-alive para toda la app
+    app.state.http_metrics = HttpMetrics()
+    app.state.http = create_http_client(app.state.http_metrics)
+    app.state.token_refresher = TokenRefresher(
+        app.state.storage,
+        app.state.http,
+        lead_time=TOKEN_REFRESH_LEAD_SECONDS,
+        active_window=TOKEN_REFRESH_ACTIVE_SECONDS
+    )
+    app.state.token_refresher.start()
+    app.state.spotify_scheduler = SpotifyScheduler(
+        SPOTIFY_APP_RATE,
+        SPOTIFY_APP_BURST,
+        SPOTIFY_USER_RATE,
+        SPOTIFY_USER_BURST,
+        background_reserve=SPOTIFY_BACKGROUND_RESERVE,
+        max_retries=SPOTIFY_MAX_RETRIES,
+        max_retry_wait=SPOTIFY_MAX_RETRY_WAIT
+    )
+    app.state.response_cache = ResponseCache(app.state.cache)
+    app.state.presence = PresenceTracker(
+        lambda user_id: load_session(app.state, app.state.storage, user_id),
+        playing_interval=PRESENCE_PLAYING_INTERVAL,
+        idle_interval=PRESENCE_IDLE_INTERVAL,
+        active_window=PRESENCE_ACTIVE_SECONDS,
+        max_concurrent=PRESENCE_MAX_CONCURRENT
+    )
+    app.state.presence.start()
+    app.state.stats_engine = StatsEngine(
+        app.state.storage,
+        app.state.cache,
+        lambda user_id: load_session(app.state, app.state.storage, user_id),
+        max_age=STATS_SNAPSHOT_MAX_AGE,
+        refresh_interval=STATS_REFRESH_SECONDS,
+        active_window=STATS_ACTIVE_SECONDS
+    )
+    app.state.stats_engine.start()
+    app.state.recommender = Recommender(
+        app.state.storage,
+        neighbours=RECOMMENDER_NEIGHBOURS,
+        refresh_interval=RECOMMENDER_REFRESH_SECONDS
+    )
+    app.state.stats_engine.listeners.append(app.state.recommender.update)
+    app.state.recommender.start()
+    app.state.history_ingester = HistoryIngester(
+        ListeningHistory(HISTORY_PATH, compact_segments=HISTORY_COMPACT_SEGMENTS),
+        lambda user_id: load_session(app.state, app.state.storage, user_id),
+        poll_interval=HISTORY_POLL_SECONDS
+    )
+    app.state.history_ingester.start()
+    app.state.votes = VoteAggregator(
+        app.state.storage,
+        lambda user_id: load_session(app.state, app.state.storage, user_id),
+        flush_interval=VOTES_FLUSH_SECONDS,
+        shards=VOTES_SHARDS,
+        max_promotions=VOTES_MAX_PROMOTIONS
+    )
+    app.state.votes.start()
+    yield
+    await app.state.votes.stop()
+    await app.state.history_ingester.stop()
+    await app.state.recommender.stop()
+    await app.state.stats_engine.stop()
+    await app.state.presence.stop()
+    await app.state.token_refresher.stop()
+    await app.state.http.aclose()
+    if app.state.replica is not None:
+        app.state.replica.stop()
+    app.state.storage.close()
+    if app.state.base_manager is not None:
+        app.state.base_manager.close()
+    await app.state.cache.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configurar middleware de sesiones
 app.add_middleware(
@@ -29,3 +163,35 @@ app.include_router(player_operations.router)
 app.include_router(playlist_operatiosn.router)
 app.include_router(tracks_operations.router)
 app.include_router(stats_operations.router)
+app.include_router(metrics_operations.router)
+app.include_router(votes_operations.router)
+
+
+@app.exception_handler(TokenRefreshFailed)
+async def token_refresh_failed_handler(request: Request, exc: TokenRefreshFailed):
+    print(f"Error al refrescar el token del usuario {exc.user_id}: {exc.detail}")
+    return JSONResponse(content=f"No se pudo refrescar el token del usuario {exc.user_id}, tiene que volver a iniciar sesión", status_code=401)
+
+
+@app.exception_handler(UserNotLogged)
+async def user_not_logged_handler(request: Request, exc: UserNotLogged):
+    return JSONResponse(content=f"El usuario {exc.user_id} no está logueado en la aplicación", status_code=404)
+
+
+@app.exception_handler(SpotifyRateLimited)
+async def spotify_rate_limited_handler(request: Request, exc: SpotifyRateLimited):
+    return JSONResponse(
+        content={"error": "Spotify está limitando las peticiones, inténtalo de nuevo en unos segundos", "retry_after": exc.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(VotingClosed)
+async def voting_closed_handler(request: Request, exc: VotingClosed):
+    return JSONResponse(content=f"La playlist {exc.playlist_id} no tiene una votación abierta", status_code=404)
+
+
+@app.exception_handler(VotingForbidden)
+async def voting_forbidden_handler(request: Request, exc: VotingForbidden):
+    return JSONResponse(content=f"La playlist {exc.playlist_id} no es del usuario {exc.user_id}", status_code=403)
@@ -0,0 +1,208 @@
+import firebase_admin
+from firebase_admin import credentials, firestore, firestore_async
+from google.api_core.exceptions import NotFound
+import datetime
+from models.User import User
+from managers.TokenCache import TokenCache
+from managers.BaseManager import CRED_PATH
+from managers.StorageBackend import StorageBackend
+
+# Backend de almacenamiento sobre el AsyncClient de Firestore (STORAGE_BACKEND=firestore),
+# sin bloquear el event loop de uvicorn. El cliente síncrono (BaseManager) solo lo usan
+# la réplica y UserMigrator.
+class AsyncBaseManager(StorageBackend):
+    def __init__(self, token_cache: TokenCache = None):
+        super().__init__(token_cache)
+        try:
+            if not firebase_admin._apps:
+                cred = credentials.Certificate(CRED_PATH)
+                firebase_admin.initialize_app(cred)
+            self.db = firestore_async.client()
+        except Exception as e:
+            print(f"Error al iniciar la base de datos: {e}")
+            self.db = None
+
+    def _user_ref(self, id):
+        return self.db.collection("users").document(id)
+
+    async def _get_user(self, id) -> dict:
+        doc = await self._user_ref(id).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
+
+    async def _get_users(self, ids: list) -> dict:
+        if not ids:
+            return {}
+        users = dict.fromkeys(ids)
+        async for doc in self.db.get_all([self._user_ref(id) for id in ids]):
+            if doc.exists:
+                users[doc.id] = doc.to_dict()
+        return users
+
+    async def _add_user(self, user: User):
+        await self._user_ref(user.id).set(
+            {
+                "Id": user.id,
+                "authenticated_at": user.authenticated_at,
+                "refresh_token": user.refresh_token,
+                "spotify_token": user.spotify_token,
+                "spotify_expires_at": user.spotify_expires_at,
+                "key": user.key,
+                **user.profile_fields()
+            },
+            merge=True
+        )
+        await self.token_cache.ainvalidate(user.id)
+
+    async def _update_user_for_refresh(self, user: User):
+        fields = {
+            "Id": user.id,
+            "spotify_token": user.spotify_token,
+            "spotify_expires_at": user.spotify_expires_at,
+            "authenticated_at": user.authenticated_at,
+        }
+        if user.refresh_token is not None:
+            fields["refresh_token"] = user.refresh_token
+        fields.update(user.profile_fields())
+        await self._user_ref(user.id).update(fields)
+        await self.token_cache.ainvalidate(user.id)
+
+    async def _check_user_is_login(self, id) -> bool:
+        if self.replica is not None and self.replica.is_ready():
+            return self.replica.has_user(id)
+
+        doc = await self._user_ref(id).get(field_paths=["Id"])
+        return doc.exists
+
+    async def _add_temp_credentials(self, id, key, expires_at: datetime.datetime):
+        await self.db.collection("tempDataLogin").add({"ID": id, "Key": key, "expires_at": expires_at})
+
+    async def _check_credentials_exists(self, id, key) -> bool:
+        if self.replica is not None and self.replica.is_ready():
+            return self.replica.check_credentials(id, key)
+
+        temp_data_ref = self.db.collection("tempDataLogin")
+        temp_data_query = temp_data_ref.where("ID", "==", id).where("expires_at", ">", datetime.datetime.now(datetime.timezone.utc)).where("Key", "==", key).limit(1)
+
+        return len(await temp_data_query.get()) > 0
+
+    async def _add_coop_playlists(self, id, playlist_ids: list):
+        try:
+            await self._user_ref(id).update(
+                {
+                    "coop_playlists": firestore.ArrayUnion(playlist_ids)
+                }
+            )
+        except NotFound:
+            print(f"No users found with the given ID: {id}.")
+        except Exception as e:
+            print(f"Error al añadir la playlist colaborativa: {e}")
+
+    async def _get_stats_snapshot(self, id) -> dict:
+        doc = await self.db.collection("statsSnapshots").document(id).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
+
+    async def _iter_stats_snapshots(self):
+        async for doc in self.db.collection("statsSnapshots").stream():
+            yield doc.id, doc.to_dict()
+
+    async def _save_stats_snapshot(self, id, snapshot: dict):
+        ref = self.db.collection("statsSnapshots").document(id)
+
+        @firestore_async.async_transactional
+        async def save(transaction):
+            current = await ref.get(transaction=transaction)
+            if current.exists and current.get("version") >= snapshot["version"]:
+                return
+            transaction.set(ref, snapshot)
+
+        await save(self.db.transaction())
+
+    def _vote_playlist_ref(self, playlist_id):
+        return self.db.collection("votePlaylists").document(playlist_id)
+
+    async def _save_vote_playlist(self, playlist_id, owner_id, threshold: int):
+        await self._vote_playlist_ref(playlist_id).set({"owner": owner_id, "threshold": threshold}, merge=True)
+
+    async def _get_vote_playlist(self, playlist_id) -> dict:
+        doc = await self._vote_playlist_ref(playlist_id).get()
+        if not doc.exists:
+            return None
+        playlist = doc.to_dict()
+        playlist.setdefault("promoted", [])
+        return playlist
+
+    def _voter_ref(self, playlist_id, user_id, track_id):
+        return self._vote_playlist_ref(playlist_id).collection("voters").document(f"{user_id}_{track_id}")
+
+    async def _has_voted(self, playlist_id, user_id, track_id) -> bool:
+        doc = await self._voter_ref(playlist_id, user_id, track_id).get()
+        return doc.exists
+
+    async def _add_votes(self, votes: dict, shard: int) -> dict:
+        # Cada playlist va en una transacción: se leen los documentos de los votantes,
+        # se crean los que faltan y se suman solo esos al shard votePlaylists/{id}/shards/{shard}
+        # con Increment (repartido entre shards para no pasar del límite de escrituras
+        # por documento). Una transacción admite 500 escrituras: 499 votantes y el shard
+        @firestore_async.async_transactional
+        async def add(transaction, playlist_id, voters):
+            refs = [self._voter_ref(playlist_id, user_id, track_id) for user_id, track_id in voters]
+            existing = {doc.id async for doc in self.db.get_all(refs, transaction=transaction) if doc.exists}
+            counts = {}
+            for ref, (user_id, track_id) in zip(refs, voters):
+                if ref.id in existing:
+                    continue
+                transaction.create(ref, {"user_id": user_id, "track_id": track_id, "voted_at": firestore.SERVER_TIMESTAMP})
+                counts[track_id] = counts.get(track_id, 0) + 1
+            if counts:
+                increments = {track_id: firestore.Increment(votes) for track_id, votes in counts.items()}
+                shard_ref = self._vote_playlist_ref(playlist_id).collection("shards").document(str(shard))
+                transaction.set(shard_ref, {"counts": increments}, merge=True)
+            return counts
+
+        saved = {}
+        for playlist_id, voters in votes.items():
+            voters = list(voters)
+            counts = {}
+            try:
+                for start in range(0, len(voters), 499):
+                    for track_id, votes_added in (await add(self.db.transaction(), playlist_id, voters[start:start + 499])).items():
+                        counts[track_id] = counts.get(track_id, 0) + votes_added
+            except Exception as e:
+                print(f"Error al guardar los votos de la playlist {playlist_id}: {e}")
+                continue
+            saved[playlist_id] = counts
+        return saved
+
+    async def _get_vote_counts(self, playlist_id) -> dict:
+        totals = {}
+        async for doc in self._vote_playlist_ref(playlist_id).collection("shards").stream():
+            for track_id, votes in (doc.to_dict().get("counts") or {}).items():
+                totals[track_id] = totals.get(track_id, 0) + votes
+        return totals
+
+    async def _add_promoted_tracks(self, playlist_id, track_ids: list) -> list:
+        ref = self._vote_playlist_ref(playlist_id)
+
+        @firestore_async.async_transactional
+        async def add(transaction):
+            doc = await ref.get(transaction=transaction)
+            promoted = set((doc.to_dict() or {}).get("promoted", []))
+            added = [track_id for track_id in track_ids if track_id not in promoted]
+            if added:
+                transaction.update(ref, {"promoted": firestore.ArrayUnion(added)})
+            return added
+
+        return await add(self.db.transaction())
+
+    async def _remove_promoted_tracks(self, playlist_id, track_ids: list):
+        await self._vote_playlist_ref(playlist_id).update({"promoted": firestore.ArrayRemove(track_ids)})
+
+    def close(self):
+        # la app de firebase la cierra BaseManager.close()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,96 @@
+import datetime
+import threading
+
+# Copia en memoria de las colecciones "users" (solo los IDs: los tokens no se guardan
+# en memoria) y "tempDataLogin" (solo credenciales sin caducar) mantenida al día con
+# listeners on_snapshot. Con ella las comprobaciones de login y de credenciales no
+# hacen ninguna consulta a Firestore.
+class FirestoreReplica:
+    def __init__(self, db, eviction_interval: int = 60):
+        self.db = db
+        self.eviction_interval = eviction_interval
+        self._lock = threading.Lock()
+        self._users = set()
+        # ID -> {doc_id: (Key, expires_at)}
+        self._temp_credentials = {}
+        self._users_ready = threading.Event()
+        self._temp_ready = threading.Event()
+        self._stop = threading.Event()
+        self._watches = []
+        self._evictor = None
+
+    def start(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self._watches.append(self.db.collection("users").on_snapshot(self._on_users_snapshot))
+        # El filtro se fija al arrancar; lo que caduque después lo quita el evictor
+        self._watches.append(
+            self.db.collection("tempDataLogin").where("expires_at", ">", now).on_snapshot(self._on_temp_snapshot)
+        )
+        self._evictor = threading.Thread(target=self._evict_loop, name="replica-evictor", daemon=True)
+        self._evictor.start()
+
+    def stop(self):
+        self._stop.set()
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def is_ready(self) -> bool:
+        return self._users_ready.is_set() and self._temp_ready.is_set()
+
+    def _on_users_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self._users.discard(change.document.id)
+                else:
+                    self._users.add(change.document.id)
+        self._users_ready.set()
+
+    def _on_temp_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                data = change.document.to_dict() or {}
+                credentials = self._temp_credentials.setdefault(data.get("ID"), {})
+                if change.type.name == "REMOVED":
+                    credentials.pop(change.document.id, None)
+                else:
+                    credentials[change.document.id] = (data.get("Key"), data.get("expires_at"))
+                if not credentials:
+                    self._temp_credentials.pop(data.get("ID"), None)
+        self._temp_ready.set()
+
+    def _evict_loop(self):
+        while not self._stop.wait(self.eviction_interval):
+            self._evict_expired()
+
+    def _evict_expired(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            for id in list(self._temp_credentials):
+                credentials = self._temp_credentials[id]
+                for doc_id, (_, expires_at) in list(credentials.items()):
+                    if expires_at is None or expires_at <= now:
+                        del credentials[doc_id]
+                if not credentials:
+                    del self._temp_credentials[id]
+
+    def has_user(self, id) -> bool:
+        with self._lock:
+            return id in self._users
+
+    def check_credentials(self, id, key) -> bool:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            for stored_key, expires_at in self._temp_credentials.get(id, {}).values():
+                if stored_key == key and expires_at is not None and expires_at > now:
+                    return True
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.is_ready(),
+                "users": len(self._users),
+                "temp_credentials": sum(len(credentials) for credentials in self._temp_credentials.values())
+            }
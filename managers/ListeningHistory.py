@@ -0,0 +1,438 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+import numpy as np
+from managers.SpotifyScheduler import INTERACTIVE, BACKGROUND
+from core.session import UserNotLogged
+
+HISTORY_TYPES = ("artists", "tracks", "genres")
+# recently-played y artists?ids= devuelven como mucho 50 elementos por petición
+RECENTLY_PLAYED_LIMIT = 50
+ARTISTS_BATCH_SIZE = 50
+
+VOCAB_FILE = "vocab.jsonl"
+SEGMENT_PREFIX = "plays-"
+
+
+class HistoryUnavailable(Exception):
+    # Spotify no devolvió las reproducciones recientes (respuesta distinta de 200)
+    pass
+
+
+def played_at_ms(played_at: str) -> int:
+    # "2024-05-01T10:00:00.123Z" -> milisegundos desde epoch
+    return int(datetime.fromisoformat(played_at.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def _top(counts: np.ndarray, limit: int) -> np.ndarray:
+    # índices de los limit mayores (sin los que tienen 0), de mayor a menor
+    nonzero = np.flatnonzero(counts)
+    if len(nonzero) > limit:
+        nonzero = nonzero[np.argpartition(counts[nonzero], -limit)[-limit:]]
+    return nonzero[np.argsort(-counts[nonzero], kind="stable")]
+
+
+class Vocabulary:
+    # Ids de Spotify (o nombres de género) <-> códigos enteros consecutivos
+    def __init__(self):
+        self.ids = []
+        self.codes = {}
+
+    def get(self, key: str):
+        return self.codes.get(key)
+
+    def add(self, key: str) -> int:
+        self.codes[key] = len(self.ids)
+        self.ids.append(key)
+        return self.codes[key]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class PairColumn:
+    # Relación entre códigos (canción -> artistas, artista -> géneros) en dos columnas
+    def __init__(self):
+        self.left = []
+        self.right = []
+        self._arrays = None
+
+    def extend(self, left: int, rights: list):
+        self.left.extend([left] * len(rights))
+        self.right.extend(rights)
+        self._arrays = None
+
+    def arrays(self) -> tuple:
+        if self._arrays is None:
+            self._arrays = (np.array(self.left, dtype=np.int32), np.array(self.right, dtype=np.int32))
+        return self._arrays
+
+
+# Historial de escucha de los usuarios, guardado en local en formato columnar y
+# solo de añadir:
+#  - cada reproducción son tres columnas: played_at (ms, int64), usuario y canción
+#    (códigos int32); artistas y géneros salen de las relaciones canción -> artistas
+#    y artista -> géneros, que no cambian
+#  - en disco: vocab.jsonl (ids <-> códigos, una línea por alta) y un .npz por cada
+#    volcado con las reproducciones nuevas; al arrancar se compactan si hay muchos
+#  - en memoria las columnas se ordenan por (usuario, played_at), así una ventana
+#    de un usuario es un slice y el top-N un np.bincount sobre él
+class ListeningHistory:
+    def __init__(self, path: str, compact_segments: int = 64):
+        self.path = path
+        self.users = Vocabulary()
+        self.tracks = Vocabulary()
+        self.artists = Vocabulary()
+        self.genres = Vocabulary()
+        self.track_names = []
+        self.artist_names = []
+        self.track_artists = PairColumn()
+        self.artist_genres = PairColumn()
+        self.genres_resolved = set()
+        self._cursors = {}
+        self._chunks = []
+        self._columns = (np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.int32))
+        self._pending = []
+        self._pending_lines = []
+        self._segments = []
+        self._flush_lock = asyncio.Lock()
+
+        self.plays_appended = 0
+        self.duplicates_skipped = 0
+        self.segments_written = 0
+        self.queries = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._load(compact_segments)
+
+    # --- carga y volcado a disco ---
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.path, f"{SEGMENT_PREFIX}{seq:08d}.npz")
+
+    def _load(self, compact_segments: int):
+        vocab_path = os.path.join(self.path, VOCAB_FILE)
+        if os.path.exists(vocab_path):
+            with open(vocab_path, encoding="utf-8") as vocab:
+                for line in vocab:
+                    if line.strip():
+                        self._apply(json.loads(line))
+
+        self._segments = sorted(
+            int(name[len(SEGMENT_PREFIX):-len(".npz")])
+            for name in os.listdir(self.path)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(".npz")
+        )
+        for seq in self._segments:
+            with np.load(self._segment_path(seq)) as segment:
+                self._chunks.append((segment["played_at"], segment["user"], segment["track"]))
+        played_at, user, track = self._sorted_columns()
+
+        if len(played_at):
+            cursors = np.full(len(self.users), -1, dtype=np.int64)
+            np.maximum.at(cursors, user, played_at)
+            self._cursors = {self.users.ids[code]: int(cursor) for code, cursor in enumerate(cursors) if cursor >= 0}
+
+        if len(self._segments) > compact_segments:
+            # un único segmento con todo; los antiguos se borran después de escribirlo
+            seq = self._segments[-1] + 1
+            self._write_segment(seq, played_at, user, track)
+            for old in self._segments:
+                os.remove(self._segment_path(old))
+            self._segments = [seq]
+
+    def _apply(self, record: dict):
+        # Alta del vocabulario, tanto al cargar vocab.jsonl como al añadir en memoria
+        if "u" in record:
+            self.users.add(record["u"])
+        elif "t" in record:
+            code = self.tracks.add(record["t"])
+            self.track_names.append(record.get("name"))
+            self.track_artists.extend(code, record["a"])
+        elif "a" in record:
+            self.artists.add(record["a"])
+            self.artist_names.append(record.get("name"))
+        elif "g" in record:
+            self.genres.add(record["g"])
+        elif "ag" in record:
+            self.artist_genres.extend(record["ag"], record["genres"])
+            self.genres_resolved.add(record["ag"])
+
+    def _record(self, record: dict):
+        self._apply(record)
+        self._pending_lines.append(json.dumps(record, ensure_ascii=False))
+
+    def _write_segment(self, seq: int, played_at, user, track):
+        # se escribe a un temporal y se renombra: un segmento nunca queda a medias
+        path = self._segment_path(seq)
+        with open(path + ".tmp", "wb") as segment:
+            np.savez(segment, played_at=played_at, user=user, track=track)
+        os.replace(path + ".tmp", path)
+
+    def _write(self, lines: list, seq: int, columns: tuple):
+        # el vocabulario va antes que el segmento que usa sus códigos
+        if lines:
+            with open(os.path.join(self.path, VOCAB_FILE), "a", encoding="utf-8") as vocab:
+                vocab.write("\n".join(lines) + "\n")
+        if seq is not None:
+            self._write_segment(seq, *columns)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending_lines and not self._pending:
+                return
+            lines, self._pending_lines = self._pending_lines, []
+            pending, self._pending = self._pending, []
+            seq = None
+            columns = None
+            if pending:
+                seq = (self._segments[-1] + 1) if self._segments else 0
+                self._segments.append(seq)
+                played_at, user, track = zip(*pending)
+                columns = (np.array(played_at, np.int64), np.array(user, np.int32), np.array(track, np.int32))
+            await asyncio.to_thread(self._write, lines, seq, columns)
+            if seq is not None:
+                self.segments_written += 1
+
+    # --- altas ---
+
+    def _code(self, vocabulary: Vocabulary, key: str, record: dict) -> int:
+        code = vocabulary.get(key)
+        if code is None:
+            self._record(record)
+            code = vocabulary.get(key)
+        return code
+
+    def cursor(self, user_id: str):
+        # played_at (ms) de la última reproducción guardada del usuario, o None
+        return self._cursors.get(user_id)
+
+    def append(self, user_id: str, items: list) -> int:
+        # items de me/player/recently-played; se ignoran los ya guardados
+        cursor = self._cursors.get(user_id, -1)
+        user = self._code(self.users, user_id, {"u": user_id})
+        plays = []
+        for item in items:
+            track = item.get("track") or {}
+            if not track.get("id"):
+                continue
+            played_at = played_at_ms(item["played_at"])
+            if played_at <= cursor:
+                self.duplicates_skipped += 1
+                continue
+            artists = [
+                self._code(self.artists, artist["id"], {"a": artist["id"], "name": artist.get("name")})
+                for artist in track.get("artists", []) if artist.get("id")
+            ]
+            code = self._code(self.tracks, track["id"], {"t": track["id"], "name": track.get("name"), "a": artists})
+            plays.append((played_at, user, code))
+
+        if plays:
+            plays.sort()
+            self._cursors[user_id] = plays[-1][0]
+            self._pending.extend(plays)
+            played_at, users, tracks = zip(*plays)
+            self._chunks.append((np.array(played_at, np.int64), np.array(users, np.int32), np.array(tracks, np.int32)))
+            self.plays_appended += len(plays)
+        return len(plays)
+
+    def unresolved_artists(self) -> list:
+        return [artist_id for code, artist_id in enumerate(self.artists.ids) if code not in self.genres_resolved]
+
+    def set_artist_genres(self, artist_id: str, genres: list):
+        artist = self.artists.get(artist_id)
+        if artist is None or artist in self.genres_resolved:
+            return
+        codes = [self._code(self.genres, genre, {"g": genre}) for genre in genres]
+        self._record({"ag": artist, "genres": codes})
+
+    # --- consultas ---
+
+    def _sorted_columns(self) -> tuple:
+        if self._chunks:
+            chunks = [self._columns, *self._chunks]
+            self._chunks = []
+            played_at, user, track = (np.concatenate([chunk[i] for chunk in chunks]) for i in range(3))
+            order = np.lexsort((played_at, user))
+            self._columns = (played_at[order], user[order], track[order])
+        return self._columns
+
+    def window(self, user_id: str, start: float = None, end: float = None) -> np.ndarray:
+        # códigos de canción de las reproducciones del usuario con start <= played_at < end (segundos)
+        user = self.users.get(user_id)
+        played_at, users, tracks = self._sorted_columns()
+        if user is None:
+            return tracks[:0]
+        first, last = np.searchsorted(users, [user, user + 1])
+        times = played_at[first:last]
+        lower = 0 if start is None else np.searchsorted(times, int(start * 1000))
+        upper = len(times) if end is None else np.searchsorted(times, int(end * 1000))
+        return tracks[first + lower:first + upper]
+
+    def top(self, user_id: str, top_type: str, start: float = None, end: float = None, limit: int = 25) -> dict:
+        self.queries += 1
+        window = self.window(user_id, start, end)
+        track_counts = np.bincount(window, minlength=len(self.tracks))
+        # cada reproducción cuenta para todos los artistas de la canción y para
+        # todos los géneros de esos artistas
+        if top_type == "tracks":
+            counts = track_counts
+        else:
+            track_codes, artist_codes = self.track_artists.arrays()
+            counts = np.bincount(artist_codes, weights=track_counts[track_codes], minlength=len(self.artists))
+            if top_type == "genres":
+                artist_codes, genre_codes = self.artist_genres.arrays()
+                counts = np.bincount(genre_codes, weights=counts[artist_codes], minlength=len(self.genres))
+
+        items = []
+        for code in _top(counts, limit):
+            code = int(code)
+            if top_type == "tracks":
+                items.append({
+                    "id": self.tracks.ids[code],
+                    "name": self.track_names[code],
+                    "artists": [self.artist_names[artist] for artist in self._artists_of(code)],
+                    "plays": int(counts[code])
+                })
+            elif top_type == "artists":
+                items.append({"id": self.artists.ids[code], "name": self.artist_names[code], "plays": int(counts[code])})
+            else:
+                items.append({"genre": self.genres.ids[code], "plays": int(counts[code])})
+        return {"plays": len(window), "items": items}
+
+    def _artists_of(self, track: int) -> list:
+        track_codes, artist_codes = self.track_artists.arrays()
+        first, last = np.searchsorted(track_codes, [track, track + 1])
+        return artist_codes[first:last].tolist()
+
+    def stats(self) -> dict:
+        played_at, user, track = self._columns
+        return {
+            "plays": len(played_at) + sum(len(chunk[0]) for chunk in self._chunks),
+            "users": len(self.users),
+            "tracks": len(self.tracks),
+            "artists": len(self.artists),
+            "genres": len(self.genres),
+            "column_bytes": played_at.nbytes + user.nbytes + track.nbytes,
+            "segments": len(self._segments),
+            "plays_appended": self.plays_appended,
+            "duplicates_skipped": self.duplicates_skipped,
+            "segments_written": self.segments_written,
+            "queries": self.queries
+        }
+
+
+# Ingesta en segundo plano de me/player/recently-played en ListeningHistory:
+#  - cada poll_interval se piden, con el cursor after, las reproducciones nuevas de
+#    los usuarios del historial (se apuntan al consultar su historial por primera vez)
+#  - recently-played solo guarda las 50 últimas, así que poll_interval tiene que ser
+#    menor que lo que se tarda en escuchar 50 canciones
+#  - los géneros de los artistas nuevos se piden en lotes de 50 con artists?ids=
+class HistoryIngester:
+    def __init__(
+            self,
+            history: ListeningHistory,
+            session_factory,
+            poll_interval: float = 1800,
+            max_concurrent: int = 4
+        ):
+        self.history = history
+        # session_factory(user_id) -> SpotifySession, para sondear sin una petición
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._users = set(history.users.ids)
+        self._task = None
+
+        self.polls = 0
+        self.requests = 0
+        self.poll_failures = 0
+        self.artists_resolved = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.history.flush()
+
+    async def enroll(self, session):
+        # Apunta al usuario; si aún no tiene historial se ingiere en el momento
+        self._users.add(session.user_id)
+        if self.history.cursor(session.user_id) is None:
+            await self.ingest(session.user_id, session, INTERACTIVE)
+
+    async def ingest(self, user_id: str, session=None, priority: int = BACKGROUND) -> int:
+        if session is None:
+            session = await self.session_factory(user_id)
+
+        added = 0
+        while True:
+            params = {"limit": RECENTLY_PLAYED_LIMIT}
+            cursor = self.history.cursor(user_id)
+            if cursor is not None:
+                params["after"] = cursor
+            response = await session.get("me/player/recently-played", params=params, priority=priority)
+            self.requests += 1
+            if response.status_code != 200:
+                raise HistoryUnavailable(f"Error al obtener me/player/recently-played: {response.text}")
+            page = response.json()
+            new = self.history.append(user_id, page.get("items", []))
+            added += new
+            # sin cursor solo se pueden leer las 50 últimas; con él se sigue hasta el final
+            if cursor is None or not new or len(page.get("items", [])) < RECENTLY_PLAYED_LIMIT:
+                break
+
+        await self._resolve_genres(session, priority)
+        await self.history.flush()
+        self.polls += 1
+        return added
+
+    async def _resolve_genres(self, session, priority: int):
+        pending = self.history.unresolved_artists()
+        for i in range(0, len(pending), ARTISTS_BATCH_SIZE):
+            batch = pending[i:i + ARTISTS_BATCH_SIZE]
+            response = await session.get("artists", params={"ids": ",".join(batch)}, priority=priority)
+            self.requests += 1
+            if response.status_code != 200:
+                # se vuelve a intentar en la siguiente ingesta
+                print(f"Error al obtener los géneros de los artistas: {response.text}")
+                return
+            for artist in response.json().get("artists", []):
+                if artist:
+                    self.history.set_artist_genres(artist["id"], artist.get("genres", []))
+                    self.artists_resolved += 1
+
+    async def _poll(self, user_id: str):
+        async with self._semaphore:
+            try:
+                await self.ingest(user_id)
+            except UserNotLogged:
+                # ha cerrado sesión: se deja de sondear hasta que vuelva a consultar
+                self._users.discard(user_id)
+            except Exception as e:
+                self.poll_failures += 1
+                print(f"Error al ingerir el historial de {user_id}: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await asyncio.gather(*(self._poll(user_id) for user_id in list(self._users)))
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "polls": self.polls,
+            "requests": self.requests,
+            "poll_failures": self.poll_failures,
+            "artists_resolved": self.artists_resolved,
+            **self.history.stats()
+        }
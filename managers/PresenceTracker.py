@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+import json
+import time
+from managers.SpotifyScheduler import INTERACTIVE, BACKGROUND
+
+
+class PresenceState:
+    def __init__(self, player: dict, fetched_at: float):
+        # player: respuesta de me/player, o None si no hay nada en reproducción
+        self.player = player
+        self.fetched_at = fetched_at
+
+    def track_key(self):
+        if not self.player or not self.player.get("item"):
+            return None, False
+        return self.player["item"].get("id"), self.player.get("is_playing", False)
+
+
+def track_event(user_id: str, player: dict) -> dict:
+    item = (player or {}).get("item") or {}
+    return {
+        "user_id": user_id,
+        "is_playing": bool(player and player.get("is_playing")),
+        "track_id": item.get("id"),
+        "track_name": item.get("name"),
+        "track_uri": item.get("uri"),
+        "artists": [artist["name"] for artist in item.get("artists", [])],
+        "progress_ms": (player or {}).get("progress_ms"),
+        "duration_ms": item.get("duration_ms")
+    }
+
+
+# Estado de reproducción (me/player) compartido por todas las rutas:
+#  - now_playing sirve la última lectura si tiene menos de playing_interval segundos;
+#    si no, la pide a Spotify (una sola petición en vuelo por usuario). Leer no apunta
+#    al usuario al sondeo: su lectura se descarta en cuanto deja de servir
+#  - en segundo plano solo se sondea a los usuarios con suscriptores (y durante
+#    active_window segundos después de que se vaya el último, por si se reconecta):
+#    cada playing_interval mientras suena algo (o al acabar la canción si es antes)
+#    y cada idle_interval cuando no
+#  - los cambios de canción se publican a los suscriptores (stream SSE de las rutas)
+class PresenceTracker:
+    def __init__(
+            self,
+            session_factory,
+            playing_interval: float = 5.0,
+            idle_interval: float = 60.0,
+            active_window: float = 60.0,
+            max_concurrent: int = 10
+        ):
+        # session_factory(user_id) -> SpotifySession, para sondear sin una petición
+        self.session_factory = session_factory
+        self.playing_interval = playing_interval
+        self.idle_interval = idle_interval
+        self.active_window = active_window
+        self._states = {}
+        self._last_seen = {}
+        self._subscribers = {}
+        self._heap = []
+        self._scheduled = {}
+        self._in_flight = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._background_tasks = set()
+
+        self.hits = 0
+        self.fetches = 0
+        self.fetches_coalesced = 0
+        self.polls = 0
+        self.events_published = 0
+        self.poll_failures = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def watch(self, user_id: str):
+        self._last_seen[user_id] = time.time()
+        if user_id not in self._scheduled:
+            self._schedule(user_id, time.time() + self._interval(self._states.get(user_id)))
+
+    def _schedule(self, user_id: str, poll_at: float):
+        self._scheduled[user_id] = poll_at
+        heapq.heappush(self._heap, (poll_at, user_id))
+        self._wakeup.set()
+
+    def _interval(self, state: PresenceState) -> float:
+        if state is None or not state.player or not state.player.get("is_playing"):
+            return self.idle_interval
+        # si la canción acaba antes, sondeamos justo después para ver la siguiente
+        item = state.player.get("item") or {}
+        remaining = (item.get("duration_ms", 0) - state.player.get("progress_ms", 0)) / 1000
+        if 0 < remaining < self.playing_interval:
+            return remaining + 0.5
+        return self.playing_interval
+
+    def _is_watched(self, user_id: str) -> bool:
+        if self._subscribers.get(user_id):
+            return True
+        return time.time() - self._last_seen.get(user_id, 0) <= self.active_window
+
+    async def now_playing(self, session) -> dict:
+        # me/player del usuario de la sesión; None si no hay reproducción o falla
+        user_id = session.user_id
+        state = self._states.get(user_id)
+        if state is not None and time.time() - state.fetched_at < self.playing_interval:
+            self.hits += 1
+            return state.player
+        state = await self._fetch(user_id, session, INTERACTIVE)
+        return state.player if state is not None else None
+
+    async def _fetch(self, user_id: str, session=None, priority: int = BACKGROUND) -> PresenceState:
+        task = self._in_flight.get(user_id)
+        if task is not None:
+            self.fetches_coalesced += 1
+        else:
+            task = asyncio.create_task(self._read_player(user_id, session, priority))
+            self._in_flight[user_id] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _read_player(self, user_id: str, session, priority: int) -> PresenceState:
+        if session is None:
+            session = await self.session_factory(user_id)
+        self.fetches += 1
+        response = await session.get("me/player", priority=priority)
+        if response.status_code == 204:
+            player = None
+        elif response.status_code == 200:
+            player = response.json()
+        else:
+            return None
+
+        state = PresenceState(player, time.time())
+        previous = self._states.get(user_id)
+        self._states[user_id] = state
+        poll_at = state.fetched_at + self._interval(state)
+        if user_id not in self._scheduled:
+            # sin suscriptores _run no lo sondea: solo quita la lectura cuando caduca
+            self._schedule(user_id, poll_at)
+        elif self._scheduled[user_id] > poll_at:
+            # ha empezado a sonar algo: se adelanta el siguiente sondeo
+            self._schedule(user_id, poll_at)
+        if previous is None or previous.track_key() != state.track_key():
+            self._publish(user_id, track_event(user_id, player))
+        return state
+
+    def _publish(self, user_id: str, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+                self.events_published += 1
+            except asyncio.QueueFull:
+                # un cliente lento no frena al resto: se descarta el evento
+                pass
+
+    def subscribe(self, user_ids: list) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=100 + len(user_ids))
+        for user_id in user_ids:
+            self._subscribers.setdefault(user_id, set()).add(queue)
+            self.watch(user_id)
+            state = self._states.get(user_id)
+            if state is not None:
+                queue.put_nowait(track_event(user_id, state.player))
+            else:
+                self._schedule(user_id, time.time())
+        return queue
+
+    def unsubscribe(self, user_ids: list, queue: asyncio.Queue):
+        for user_id in user_ids:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[user_id]
+            # marca la última actividad para que se siga sondeando un rato más
+            self._last_seen[user_id] = time.time()
+
+    async def stream(self, user_ids: list, keepalive: float = 15.0):
+        # Eventos Server-Sent Events para los usuarios indicados
+        queue = self.subscribe(user_ids)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: track_change\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(user_ids, queue)
+
+    async def _poll(self, user_id: str):
+        async with self._semaphore:
+            try:
+                await self._fetch(user_id)
+                self.polls += 1
+            except Exception as e:
+                self.poll_failures += 1
+                print(f"Error al consultar la reproducción de {user_id}: {e}")
+        if user_id not in self._scheduled:
+            self._schedule(user_id, time.time() + self._interval(self._states.get(user_id)))
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            poll_at, user_id = self._heap[0]
+            delay = poll_at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            heapq.heappop(self._heap)
+            if self._scheduled.get(user_id) != poll_at:
+                continue
+            del self._scheduled[user_id]
+
+            if not self._is_watched(user_id):
+                self._last_seen.pop(user_id, None)
+                self._states.pop(user_id, None)
+                continue
+            state = self._states.get(user_id)
+            if state is not None and time.time() - state.fetched_at < self._interval(state) / 2:
+                # una ruta la acaba de leer: basta con reprogramar
+                self._schedule(user_id, state.fetched_at + self._interval(state))
+                continue
+            task = asyncio.create_task(self._poll(user_id))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_users": len(self._states),
+            "scheduled_users": len(self._scheduled),
+            "subscribed_users": len(self._subscribers),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "fetches_coalesced": self.fetches_coalesced,
+            "polls": self.polls,
+            "poll_failures": self.poll_failures,
+            "events_published": self.events_published
+        }
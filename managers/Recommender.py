@@ -0,0 +1,291 @@
+import asyncio
+import time
+import numpy as np
+import scipy.sparse as sp
+from managers.StatsEngine import TIME_RANGES
+
+RECOMMENDATION_TYPES = ("artists", "genres")
+
+
+def artist_weights(snapshot: dict) -> tuple:
+    # Peso de cada artista en los top de los tres time_range: (n - posición) / n,
+    # sumado entre rangos. Devuelve ({id: peso}, {id: nombre}).
+    weights = {}
+    names = {}
+    for time_range in TIME_RANGES:
+        artists = snapshot["ranges"].get(time_range, {}).get("artists", [])
+        for position, artist in enumerate(artists):
+            weights[artist["id"]] = weights.get(artist["id"], 0.0) + (len(artists) - position) / len(artists)
+            names[artist["id"]] = artist["name"]
+    return weights, names
+
+
+def genre_weights(snapshot: dict) -> dict:
+    # Peso de cada género: su cuenta entre la del más común de cada rango, sumado entre rangos
+    weights = {}
+    for time_range in TIME_RANGES:
+        genres = snapshot["ranges"].get(time_range, {}).get("genres", [])
+        if not genres:
+            continue
+        top = max(genre["count"] for genre in genres)
+        for genre in genres:
+            weights[genre["genre"]] = weights.get(genre["genre"], 0.0) + genre["count"] / top
+    return weights
+
+
+def _top_neighbours(similarity: np.ndarray, items: np.ndarray, neighbours: int) -> tuple:
+    # similarity: (len(items) x n_items) densa; de cada fila los `neighbours` mayores
+    similarity[np.arange(len(items)), items] = 0
+    if similarity.shape[1] > neighbours:
+        codes = np.argpartition(similarity, -neighbours, axis=1)[:, -neighbours:]
+    else:
+        codes = np.repeat(np.arange(similarity.shape[1])[None, :], len(items), axis=0)
+    sims = np.take_along_axis(similarity, codes, axis=1)
+    # rellena con el propio item hasta tener `neighbours` columnas
+    padding = neighbours - codes.shape[1]
+    codes = np.hstack([codes, np.repeat(items[:, None], padding, axis=1)]).astype(np.int32)
+    sims = np.hstack([sims, np.zeros((len(items), padding))]).astype(np.float32)
+    return codes, sims
+
+
+def _rows_matrix(rows: list, n_items: int) -> sp.csr_matrix:
+    # filas (códigos, pesos) -> matriz dispersa usuarios x items
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(codes) for codes, _ in rows])
+    indices = np.concatenate([codes for codes, _ in rows]) if rows else np.empty(0, np.int32)
+    data = np.concatenate([weights for _, weights in rows]) if rows else np.empty(0, np.float32)
+    return sp.csr_matrix((data, indices, indptr), shape=(len(rows), n_items))
+
+
+def _compute_neighbours(rows: dict, n_items: int, items: np.ndarray, neighbours: int, chunk_size: int) -> tuple:
+    # Similitud coseno entre columnas de la matriz usuario x item (dispersa) para los
+    # items dados; de cada uno se quedan los `neighbours` más parecidos. Se calcula
+    # por bloques de columnas para no tener nunca la matriz item x item entera.
+    matrix = _rows_matrix(list(rows.values()), n_items)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalised = (matrix @ sp.diags(1.0 / norms)).tocsc()
+    transposed = normalised.T.tocsr()
+
+    # sin vecino: el propio item con similitud 0 (no suma nada al recomendar)
+    codes = np.repeat(items[:, None], neighbours, axis=1).astype(np.int32)
+    sims = np.zeros((len(items), neighbours), dtype=np.float32)
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        similarity = (transposed @ normalised[:, chunk]).tocsc()
+        for offset, item in enumerate(chunk):
+            column = slice(similarity.indptr[offset], similarity.indptr[offset + 1])
+            candidates = similarity.indices[column]
+            values = similarity.data[column]
+            keep = candidates != item
+            candidates, values = candidates[keep], values[keep]
+            if len(candidates) > neighbours:
+                best = np.argpartition(values, -neighbours)[-neighbours:]
+                candidates, values = candidates[best], values[best]
+            codes[start + offset, :len(candidates)] = candidates
+            sims[start + offset, :len(candidates)] = values
+    return codes, sims
+
+
+# Índice de items parecidos (artistas o géneros) a partir de los usuarios:
+#  - cada usuario es una fila dispersa (códigos de item, pesos)
+#  - de cada item se guardan sus `neighbours` items más parecidos por coseno entre
+#    columnas, en dos arrays (n_items x neighbours)
+#  - cuando cambia un usuario solo se recalculan los vecinos de los items de su fila
+#    antigua y nueva (los pendientes); refresh() lo hace en un hilo
+#  - con dense=True (pocos items, como los géneros) se mantiene además la matriz de
+#    coocurrencias X^T X entera: en cada refresh se le suman N^T N y se le restan
+#    O^T O, con N y O las filas nuevas y antiguas de los usuarios que han cambiado,
+#    y los vecinos salen de ella sin recorrer al resto de usuarios
+#  - recomendar es sumar las filas de vecinos de los items del usuario, ponderadas
+#    por sus pesos, con np.bincount
+class SimilarityIndex:
+    def __init__(self, neighbours: int = 50, chunk_size: int = 1024, dense: bool = False):
+        self.neighbours = neighbours
+        self.chunk_size = chunk_size
+        self.dense = dense
+        self._gram = np.zeros((0, 0))
+        self._gram_updates = []
+        self.ids = []
+        self.codes = {}
+        self.names = []
+        self._rows = {}
+        self._pending = set()
+        self._neighbour_codes = np.empty((0, neighbours), dtype=np.int32)
+        self._neighbour_sims = np.empty((0, neighbours), dtype=np.float32)
+        self._lock = asyncio.Lock()
+
+        self.updates = 0
+        self.items_recomputed = 0
+        self.last_refresh_seconds = 0.0
+
+    def _code(self, item_id: str, name: str = None) -> int:
+        code = self.codes.get(item_id)
+        if code is None:
+            code = self.codes[item_id] = len(self.ids)
+            self.ids.append(item_id)
+            self.names.append(name)
+        return code
+
+    def set_user(self, user_id: str, weights: dict, names: dict = None):
+        previous = self._rows.get(user_id)
+        codes = np.array([self._code(item_id, (names or {}).get(item_id)) for item_id in weights], dtype=np.int32)
+        values = np.array(list(weights.values()), dtype=np.float32)
+        self._rows[user_id] = (codes, values)
+        self._pending.update(codes.tolist())
+        if previous is not None:
+            self._pending.update(previous[0].tolist())
+        if self.dense:
+            self._gram_updates.append((previous, (codes, values)))
+        self.updates += 1
+
+    def _dense_neighbours(self, updates: list, n_items: int, items: np.ndarray) -> tuple:
+        if n_items > len(self._gram):
+            # crece al doble para no copiarla en cada item nuevo
+            gram = np.zeros((max(n_items, 2 * len(self._gram)),) * 2)
+            gram[:len(self._gram), :len(self._gram)] = self._gram
+            self._gram = gram
+        added = _rows_matrix([new for _, new in updates], n_items)
+        removed = _rows_matrix([previous for previous, _ in updates if previous is not None], n_items)
+        self._gram[:n_items, :n_items] += (added.T @ added - removed.T @ removed).toarray()
+
+        norms = np.sqrt(np.clip(np.diagonal(self._gram)[:n_items], 0, None))
+        norms[norms == 0] = 1.0
+        similarity = self._gram[items, :n_items] / norms[items, None] / norms[None, :]
+        return _top_neighbours(similarity, items, self.neighbours)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._rows
+
+    def matrix(self, user_ids: list) -> sp.csr_matrix:
+        # filas de los usuarios dados (en ese orden) con los códigos de item globales
+        return _rows_matrix([self._rows[user_id] for user_id in user_ids], len(self.ids))
+
+    def has_pending(self, user_id: str = None) -> bool:
+        if user_id is None:
+            return bool(self._pending)
+        row = self._rows.get(user_id)
+        return row is not None and any(code in self._pending for code in row[0].tolist())
+
+    async def refresh(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            started = time.perf_counter()
+            items = np.array(sorted(self._pending), dtype=np.int32)
+            self._pending = set()
+            if self.dense:
+                updates, self._gram_updates = self._gram_updates, []
+                codes, sims = await asyncio.to_thread(self._dense_neighbours, updates, len(self.ids), items)
+            else:
+                # copia de las filas: los usuarios pueden cambiar mientras se calcula
+                rows = dict(self._rows)
+                codes, sims = await asyncio.to_thread(_compute_neighbours, rows, len(self.ids), items, self.neighbours, self.chunk_size)
+
+            grow = len(self.ids) - len(self._neighbour_codes)
+            if grow > 0:
+                new = np.arange(len(self._neighbour_codes), len(self.ids), dtype=np.int32)
+                self._neighbour_codes = np.vstack([self._neighbour_codes, np.repeat(new[:, None], self.neighbours, axis=1)])
+                self._neighbour_sims = np.vstack([self._neighbour_sims, np.zeros((grow, self.neighbours), dtype=np.float32)])
+            self._neighbour_codes[items] = codes
+            self._neighbour_sims[items] = sims
+            self.items_recomputed += len(items)
+            self.last_refresh_seconds = time.perf_counter() - started
+
+    def recommend(self, user_id: str, limit: int = 20) -> list:
+        row = self._rows.get(user_id)
+        if row is None:
+            return []
+        codes, weights = row
+        # los items dados de alta después del último refresh aún no tienen vecinos
+        known = codes < len(self._neighbour_codes)
+        codes, weights = codes[known], weights[known]
+        neighbours = self._neighbour_codes[codes]
+        scores = np.bincount(
+            neighbours.ravel(),
+            weights=(self._neighbour_sims[codes] * weights[:, None]).ravel(),
+            minlength=len(self._neighbour_codes)
+        )
+        # no se recomienda lo que el usuario ya escucha
+        scores[row[0][row[0] < len(scores)]] = 0
+        best = np.flatnonzero(scores)
+        if len(best) > limit:
+            best = best[np.argpartition(scores[best], -limit)[-limit:]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.ids[code], self.names[code], float(scores[code])) for code in best.tolist()]
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._rows),
+            "items": len(self.ids),
+            "pending_items": len(self._pending),
+            "updates": self.updates,
+            "items_recomputed": self.items_recomputed,
+            "index_bytes": self._neighbour_codes.nbytes + self._neighbour_sims.nbytes + self._gram.nbytes,
+            "last_refresh_seconds": round(self.last_refresh_seconds, 3)
+        }
+
+
+# Recomendaciones de artistas y géneros a partir de la comunidad de usuarios:
+#  - al arrancar se cargan los snapshots de estadísticas (StatsEngine) guardados
+#  - cada snapshot nuevo actualiza la fila del usuario (StatsEngine.listeners)
+#  - cada refresh_interval se recalculan los vecinos de los items pendientes
+class Recommender:
+    def __init__(self, storage, neighbours: int = 50, refresh_interval: float = 60):
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self.artists = SimilarityIndex(neighbours)
+        self.genres = SimilarityIndex(neighbours, dense=True)
+        self.loaded = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def update(self, user_id: str, snapshot: dict):
+        weights, names = artist_weights(snapshot)
+        self.artists.set_user(user_id, weights, names)
+        self.genres.set_user(user_id, genre_weights(snapshot))
+
+    def index(self, recommendation_type: str) -> SimilarityIndex:
+        return self.artists if recommendation_type == "artists" else self.genres
+
+    async def recommend(self, user_id: str, recommendation_type: str, limit: int = 20) -> list:
+        index = self.index(recommendation_type)
+        # si sus items están pendientes se recalculan ya, sin esperar al siguiente ciclo
+        if index.has_pending(user_id):
+            await index.refresh()
+        recommendations = index.recommend(user_id, limit)
+        if recommendation_type == "artists":
+            return [{"id": item_id, "name": name, "score": round(score, 4)} for item_id, name, score in recommendations]
+        return [{"genre": item_id, "score": round(score, 4)} for item_id, _, score in recommendations]
+
+    async def _load(self):
+        async for user_id, snapshot in self.storage._iter_stats_snapshots():
+            # uno hecho antes de cargar (StatsEngine.listeners) es igual o más reciente
+            if user_id not in self.artists:
+                self.update(user_id, snapshot)
+        self.loaded = True
+
+    async def _run(self):
+        try:
+            await self._load()
+        except Exception as e:
+            print(f"Error al cargar los snapshots de estadísticas: {e}")
+        while True:
+            await self.artists.refresh()
+            await self.genres.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self) -> dict:
+        return {"loaded": self.loaded, "artists": self.artists.stats(), "genres": self.genres.stats()}
@@ -0,0 +1,116 @@
+import re
+import time
+from urllib.parse import urlencode
+import httpx
+from cache_app import TieredCache
+from core.config import (
+    RESPONSE_CACHE_TTL_ME, RESPONSE_CACHE_TTL_ARTIST_TOP_TRACKS, RESPONSE_CACHE_TTL_SEARCH
+)
+
+# (nombre, patrón del endpoint, TTL en segundos, ámbito). Ámbito "user": la respuesta
+# depende del usuario (me); "market": se comparte entre los usuarios del mismo país
+# (Spotify responde con el market del parámetro o, si no lo hay, con el del token).
+# me/top no se cachea aquí: lo materializa StatsEngine en los snapshots.
+DEFAULT_RULES = [
+    ("me", r"^me$", RESPONSE_CACHE_TTL_ME, "user"),
+    ("artist_top_tracks", r"^artists/[^/]+/top-tracks$", RESPONSE_CACHE_TTL_ARTIST_TOP_TRACKS, "market"),
+    ("search", r"^search$", RESPONSE_CACHE_TTL_SEARCH, "market"),
+]
+
+
+# Cache con TTL de las respuestas GET idempotentes de Spotify sobre la TieredCache
+# de la app, indexada por endpoint, parámetros y ámbito. Las respuestas de un
+# usuario van en el namespace "responses:<id>" y las compartidas en
+# "responses:market:<país>"; si no se sabe el país del usuario, en las suyas.
+# Si la carga compartida la hizo otra petición y falló (401, excepción...), el error
+# no se reparte: esta petición hace la suya sin cache.
+# Las entradas se guardan el doble de su TTL: pasado el TTL, si Spotify mandó ETag,
+# se revalidan con If-None-Match en vez de volver a descargarlas.
+class ResponseCache:
+    def __init__(self, cache: TieredCache, rules: list = None):
+        self.cache = cache
+        self.rules = [(name, re.compile(pattern), ttl, scope) for name, pattern, ttl, scope in (rules or DEFAULT_RULES)]
+        self.ttls = {name: ttl for name, _, ttl, _ in self.rules}
+        # nombre de la regla -> {"hits", "revalidated", "misses"}
+        self.metrics = {name: {"hits": 0, "revalidated": 0, "misses": 0} for name, *_ in self.rules}
+
+    def key_for(self, endpoint: str, params: dict, user_id: str, country: str = None):
+        # None si el endpoint no se cachea. country: el del perfil guardado del usuario
+        for name, pattern, ttl, scope in self.rules:
+            if pattern.match(endpoint):
+                query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+                market = (params or {}).get("market") or country
+                if scope == "market" and market:
+                    namespace = f"responses:market:{market}"
+                else:
+                    namespace = f"responses:{user_id}"
+                return name, namespace, f"{endpoint}?{query}"
+        return None
+
+    def _entry(self, name: str, response: httpx.Response) -> dict:
+        return {
+            "status": response.status_code,
+            "content": response.content,
+            "content_type": response.headers.get("Content-Type", "application/json"),
+            "etag": response.headers.get("ETag"),
+            "fresh_until": time.time() + self.ttls[name]
+        }
+
+    def _response(self, entry: dict, request: httpx.Request = None) -> httpx.Response:
+        return httpx.Response(
+            entry["status"],
+            content=entry["content"],
+            headers={"Content-Type": entry["content_type"]},
+            request=request
+        )
+
+    async def fetch(self, key, send) -> httpx.Response:
+        # send(headers) hace la petición real a Spotify con las cabeceras extra
+        name, namespace, cache_key = key
+        outcome = {}
+
+        async def load(stale):
+            outcome["loaded"] = True
+            headers = {"If-None-Match": stale["etag"]} if stale is not None and stale["etag"] else {}
+            response = await send(headers)
+            if response.status_code == 304 and stale is not None:
+                outcome["kind"] = "revalidated"
+                return {**stale, "fresh_until": time.time() + self.ttls[name]}
+            outcome["kind"] = "misses"
+            outcome["response"] = response
+            return self._entry(name, response)
+
+        try:
+            entry = await self.cache.get_or_set(
+                namespace,
+                cache_key,
+                load,
+                self.ttls[name] * 2,
+                accept=lambda entry: time.time() < entry["fresh_until"],
+                store_if=lambda entry: entry["status"] == 200
+            )
+        except Exception:
+            if "loaded" in outcome:
+                raise
+            entry = None
+        if "loaded" not in outcome and (entry is None or entry["status"] != 200):
+            # falló la carga de otra petición (quizá de otro usuario): se pide sin cache
+            self.metrics[name]["misses"] += 1
+            return await send({})
+
+        # si la carga la hizo otra petición concurrente, para esta es un acierto
+        self.metrics[name][outcome.get("kind", "hits")] += 1
+        if "response" in outcome:
+            return outcome["response"]
+        return self._response(entry)
+
+    async def invalidate_user(self, user_id: str):
+        await self.cache.invalidate_namespace(f"responses:{user_id}")
+
+    def stats(self) -> dict:
+        endpoints = {}
+        for name, counters in self.metrics.items():
+            total = sum(counters.values())
+            served = counters["hits"] + counters["revalidated"]
+            endpoints[name] = {**counters, "hit_rate": served / total if total else 0.0}
+        return {"endpoints": endpoints}
@@ -0,0 +1,388 @@
+import asyncio
+import datetime
+import json
+import sqlite3
+import threading
+from models.User import User
+from managers.TokenCache import TokenCache
+from managers.StorageBackend import StorageBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    authenticated_at REAL,
+    refresh_token BLOB,
+    spotify_token BLOB,
+    spotify_expires_at REAL,
+    key TEXT,
+    product TEXT,
+    spotify_user_id TEXT,
+    country TEXT
+);
+CREATE TABLE IF NOT EXISTS temp_data_login (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_temp_data_login_user ON temp_data_login (user_id, expires_at);
+CREATE INDEX IF NOT EXISTS idx_temp_data_login_expires ON temp_data_login (expires_at);
+CREATE TABLE IF NOT EXISTS stats_snapshots (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vote_playlists (
+    playlist_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    threshold INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vote_counts (
+    playlist_id TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    votes INTEGER NOT NULL,
+    PRIMARY KEY (playlist_id, track_id)
+);
+CREATE TABLE IF NOT EXISTS vote_voters (
+    playlist_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, user_id, track_id)
+);
+CREATE TABLE IF NOT EXISTS vote_promotions (
+    playlist_id TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, track_id)
+);
+CREATE TABLE IF NOT EXISTS coop_playlists (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    playlist_id TEXT NOT NULL,
+    UNIQUE (user_id, playlist_id)
+);
+"""
+
+# Columnas añadidas después de crear la tabla users, para bases de datos ya existentes
+USER_PROFILE_COLUMNS = ("product", "spotify_user_id", "country")
+
+
+def _to_timestamp(value: datetime.datetime) -> float:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.timestamp()
+
+
+def _to_datetime(value: float) -> datetime.datetime:
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+
+
+# Backend de almacenamiento local (STORAGE_BACKEND=sqlite) para pruebas de carga o
+# para desplegar en una sola máquina sin Firestore. SQLite en modo WAL; las consultas
+# se ejecutan en un hilo aparte para no bloquear el event loop.
+class SQLiteManager(StorageBackend):
+    def __init__(self, path: str, token_cache: TokenCache = None):
+        super().__init__(token_cache)
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(users)")}
+        for column in USER_PROFILE_COLUMNS:
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE users ADD COLUMN {column} TEXT")
+        self.db.commit()
+
+    def _execute(self, sql: str, params: tuple = (), fetch: bool = False, many: bool = False):
+        with self._lock:
+            try:
+                cursor = self.db.executemany(sql, params) if many else self.db.execute(sql, params)
+                rows = cursor.fetchall() if fetch else None
+                self.db.commit()
+            except Exception:
+                # que una escritura a medias no se confirme con la siguiente
+                self.db.rollback()
+                raise
+            return rows
+
+    async def _run(self, sql: str, params: tuple = (), fetch: bool = False, many: bool = False):
+        return await asyncio.to_thread(self._execute, sql, params, fetch, many)
+
+    def _execute_transaction(self, function):
+        # varias sentencias que se confirman juntas: function(db) -> resultado
+        with self._lock:
+            try:
+                result = function(self.db)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+            return result
+
+    async def _run_transaction(self, function):
+        return await asyncio.to_thread(self._execute_transaction, function)
+
+    def _row_to_user(self, row, playlists: list) -> dict:
+        user = {
+            "Id": row["id"],
+            "authenticated_at": _to_datetime(row["authenticated_at"]),
+            "refresh_token": row["refresh_token"],
+            "spotify_token": row["spotify_token"],
+            "spotify_expires_at": _to_datetime(row["spotify_expires_at"]),
+            "key": row["key"]
+        }
+        for column in USER_PROFILE_COLUMNS:
+            if row[column] is not None:
+                user[column] = row[column]
+        if playlists:
+            user["coop_playlists"] = playlists
+        return user
+
+    def _fetch_user(self, id) -> dict:
+        with self._lock:
+            row = self.db.execute("SELECT * FROM users WHERE id = ?", (id,)).fetchone()
+            if row is None:
+                return None
+            playlists = self.db.execute(
+                "SELECT playlist_id FROM coop_playlists WHERE user_id = ? ORDER BY id", (id,)
+            ).fetchall()
+
+        return self._row_to_user(row, [playlist["playlist_id"] for playlist in playlists])
+
+    def _fetch_users(self, ids: list) -> dict:
+        placeholders = ", ".join("?" * len(ids))
+        with self._lock:
+            rows = self.db.execute(f"SELECT * FROM users WHERE id IN ({placeholders})", ids).fetchall()
+            playlists = self.db.execute(
+                f"SELECT user_id, playlist_id FROM coop_playlists WHERE user_id IN ({placeholders}) ORDER BY id", ids
+            ).fetchall()
+
+        playlists_by_user = {}
+        for playlist in playlists:
+            playlists_by_user.setdefault(playlist["user_id"], []).append(playlist["playlist_id"])
+        users = dict.fromkeys(ids)
+        for row in rows:
+            users[row["id"]] = self._row_to_user(row, playlists_by_user.get(row["id"], []))
+        return users
+
+    async def _get_user(self, id) -> dict:
+        return await asyncio.to_thread(self._fetch_user, id)
+
+    async def _get_users(self, ids: list) -> dict:
+        if not ids:
+            return {}
+        return await asyncio.to_thread(self._fetch_users, list(ids))
+
+    async def _add_user(self, user: User):
+        await self._run(
+            """
+            INSERT INTO users (
+                id, authenticated_at, refresh_token, spotify_token, spotify_expires_at, key,
+                product, spotify_user_id, country
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                authenticated_at = excluded.authenticated_at,
+                refresh_token = excluded.refresh_token,
+                spotify_token = excluded.spotify_token,
+                spotify_expires_at = excluded.spotify_expires_at,
+                key = excluded.key,
+                product = COALESCE(excluded.product, product),
+                spotify_user_id = COALESCE(excluded.spotify_user_id, spotify_user_id),
+                country = COALESCE(excluded.country, country)
+            """,
+            (
+                user.id,
+                _to_timestamp(user.authenticated_at),
+                user.refresh_token,
+                user.spotify_token,
+                _to_timestamp(user.spotify_expires_at),
+                user.key,
+                user.product,
+                user.spotify_user_id,
+                user.country
+            )
+        )
+        await self.token_cache.ainvalidate(user.id)
+
+    async def _update_user_for_refresh(self, user: User):
+        await self._run(
+            """
+            UPDATE users SET
+                spotify_token = ?,
+                spotify_expires_at = ?,
+                authenticated_at = ?,
+                refresh_token = COALESCE(?, refresh_token),
+                product = COALESCE(?, product),
+                spotify_user_id = COALESCE(?, spotify_user_id),
+                country = COALESCE(?, country)
+            WHERE id = ?
+            """,
+            (
+                user.spotify_token,
+                _to_timestamp(user.spotify_expires_at),
+                _to_timestamp(user.authenticated_at),
+                user.refresh_token,
+                user.product,
+                user.spotify_user_id,
+                user.country,
+                user.id
+            )
+        )
+        await self.token_cache.ainvalidate(user.id)
+
+    async def _check_user_is_login(self, id) -> bool:
+        rows = await self._run("SELECT 1 FROM users WHERE id = ?", (id,), fetch=True)
+        return len(rows) > 0
+
+    async def _add_temp_credentials(self, id, key, expires_at: datetime.datetime):
+        await self._purge_expired_credentials()
+        await self._run(
+            "INSERT INTO temp_data_login (user_id, key, expires_at) VALUES (?, ?, ?)",
+            (id, key, _to_timestamp(expires_at))
+        )
+
+    async def _check_credentials_exists(self, id, key) -> bool:
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        rows = await self._run(
+            "SELECT 1 FROM temp_data_login WHERE user_id = ? AND expires_at > ? AND key = ? LIMIT 1",
+            (id, now, key),
+            fetch=True
+        )
+        return len(rows) > 0
+
+    async def _purge_expired_credentials(self):
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        await self._run("DELETE FROM temp_data_login WHERE expires_at <= ?", (now,))
+
+    async def _add_coop_playlists(self, id, playlist_ids: list):
+        if not await self._check_user_is_login(id):
+            print(f"No users found with the given ID: {id}.")
+            return
+
+        await self._run(
+            "INSERT OR IGNORE INTO coop_playlists (user_id, playlist_id) VALUES (?, ?)",
+            [(id, playlist_id) for playlist_id in playlist_ids],
+            many=True
+        )
+
+    async def _get_stats_snapshot(self, id) -> dict:
+        rows = await self._run("SELECT data FROM stats_snapshots WHERE user_id = ?", (id,), fetch=True)
+        if not rows:
+            return None
+        return json.loads(rows[0]["data"])
+
+    async def _iter_stats_snapshots(self, page_size: int = 500):
+        last_id = ""
+        while True:
+            rows = await self._run(
+                "SELECT user_id, data FROM stats_snapshots WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (last_id, page_size),
+                fetch=True
+            )
+            for row in rows:
+                yield row["user_id"], json.loads(row["data"])
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]["user_id"]
+
+    async def _save_stats_snapshot(self, id, snapshot: dict):
+        await self._run(
+            """
+            INSERT INTO stats_snapshots (user_id, version, created_at, data) VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                version = excluded.version,
+                created_at = excluded.created_at,
+                data = excluded.data
+            WHERE excluded.version > stats_snapshots.version
+            """,
+            (id, snapshot["version"], snapshot["created_at"], json.dumps(snapshot))
+        )
+
+    async def _save_vote_playlist(self, playlist_id, owner_id, threshold: int):
+        await self._run(
+            """
+            INSERT INTO vote_playlists (playlist_id, owner, threshold) VALUES (?, ?, ?)
+            ON CONFLICT (playlist_id) DO UPDATE SET owner = excluded.owner, threshold = excluded.threshold
+            """,
+            (playlist_id, owner_id, threshold)
+        )
+
+    async def _get_vote_playlist(self, playlist_id) -> dict:
+        rows = await self._run("SELECT owner, threshold FROM vote_playlists WHERE playlist_id = ?", (playlist_id,), fetch=True)
+        if not rows:
+            return None
+        promoted = await self._run("SELECT track_id FROM vote_promotions WHERE playlist_id = ?", (playlist_id,), fetch=True)
+        return {"owner": rows[0]["owner"], "threshold": rows[0]["threshold"], "promoted": [row["track_id"] for row in promoted]}
+
+    async def _has_voted(self, playlist_id, user_id, track_id) -> bool:
+        rows = await self._run(
+            "SELECT 1 FROM vote_voters WHERE playlist_id = ? AND user_id = ? AND track_id = ?",
+            (playlist_id, user_id, track_id),
+            fetch=True
+        )
+        return len(rows) > 0
+
+    async def _add_votes(self, votes: dict, shard: int) -> dict:
+        # un solo proceso escribe en la base de datos: no hacen falta shards. Votantes y
+        # contadores van en una sola transacción (se guardan todos o ninguno)
+        def add(db):
+            saved = {}
+            for playlist_id, voters in votes.items():
+                counts = saved.setdefault(playlist_id, {})
+                for user_id, track_id in voters:
+                    inserted = db.execute(
+                        "INSERT INTO vote_voters (playlist_id, user_id, track_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING RETURNING 1",
+                        (playlist_id, user_id, track_id)
+                    ).fetchall()
+                    if inserted:
+                        counts[track_id] = counts.get(track_id, 0) + 1
+            db.executemany(
+                """
+                INSERT INTO vote_counts (playlist_id, track_id, votes) VALUES (?, ?, ?)
+                ON CONFLICT (playlist_id, track_id) DO UPDATE SET votes = vote_counts.votes + excluded.votes
+                """,
+                [
+                    (playlist_id, track_id, count)
+                    for playlist_id, counts in saved.items()
+                    for track_id, count in counts.items()
+                ]
+            )
+            return saved
+
+        return await self._run_transaction(add)
+
+    async def _get_vote_counts(self, playlist_id) -> dict:
+        rows = await self._run("SELECT track_id, votes FROM vote_counts WHERE playlist_id = ?", (playlist_id,), fetch=True)
+        return {row["track_id"]: row["votes"] for row in rows}
+
+    async def _add_promoted_tracks(self, playlist_id, track_ids: list) -> list:
+        def add(db):
+            return [
+                track_id
+                for track_id in track_ids
+                if db.execute(
+                    "INSERT INTO vote_promotions (playlist_id, track_id) VALUES (?, ?) ON CONFLICT DO NOTHING RETURNING 1",
+                    (playlist_id, track_id)
+                ).fetchall()
+            ]
+
+        return await self._run_transaction(add)
+
+    async def _remove_promoted_tracks(self, playlist_id, track_ids: list):
+        await self._run(
+            "DELETE FROM vote_promotions WHERE playlist_id = ? AND track_id = ?",
+            [(playlist_id, track_id) for track_id in track_ids],
+            many=True
+        )
+
+    def close(self):
+        with self._lock:
+            self.db.close()
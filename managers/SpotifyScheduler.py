@@ -0,0 +1,153 @@
+import asyncio
+import math
+import random
+import time
+from collections import OrderedDict
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+class SpotifyRateLimited(Exception):
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, reserve: float = 0.0) -> float:
+        # segundos hasta que se pueda sacar un token dejando `reserve` en el cubo
+        self._refill()
+        missing = 1 + reserve - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+# Planificador de las llamadas salientes a la API de Spotify:
+#  - un token bucket para la app (el rate limit de Spotify es por client id) y otro por usuario
+#  - las peticiones en segundo plano (stats, presencia...) no pueden gastar la reserva
+#    del cubo de la app, así los comandos interactivos (cola, añadir) siempre tienen hueco
+#  - respeta Retry-After en los 429 para toda la app y reintenta con backoff con jitter
+class SpotifyScheduler:
+    def __init__(
+            self,
+            app_rate: float,
+            app_burst: float,
+            user_rate: float,
+            user_burst: float,
+            background_reserve: float = 0.25,
+            max_retries: int = 3,
+            max_retry_wait: float = 10.0,
+            max_users: int = 10000
+        ):
+        self.app_bucket = TokenBucket(app_rate, app_burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.background_reserve = background_reserve * app_burst
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.max_users = max_users
+        self._user_buckets = OrderedDict()
+        self._blocked_until = 0.0
+
+        self.requests = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.gave_up = 0
+
+    def _user_bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            self._user_buckets[user_id] = bucket
+            while len(self._user_buckets) > self.max_users:
+                self._user_buckets.popitem(last=False)
+        else:
+            self._user_buckets.move_to_end(user_id)
+        return bucket
+
+    async def acquire(self, user_id: str, priority: int = INTERACTIVE):
+        throttled = False
+        while True:
+            now = time.monotonic()
+            if self._blocked_until > now:
+                wait = self._blocked_until - now
+                if priority == BACKGROUND:
+                    # que los interactivos salgan primero cuando se levante el bloqueo
+                    wait += random.uniform(0.1, 0.5)
+            else:
+                reserve = self.background_reserve if priority == BACKGROUND else 0.0
+                user_bucket = self._user_bucket(user_id)
+                wait = max(self.app_bucket.wait_time(reserve), user_bucket.wait_time())
+                if wait == 0:
+                    self.app_bucket.take()
+                    user_bucket.take()
+                    if throttled:
+                        self.throttled += 1
+                    return
+
+            throttled = True
+            await asyncio.sleep(wait)
+
+    def _retry_delay(self, response, attempt: int) -> float:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+        # backoff exponencial con full jitter
+        return random.uniform(0, min(self.max_retry_wait, 0.5 * 2 ** attempt))
+
+    async def send(self, send, user_id: str, priority: int = INTERACTIVE):
+        attempt = 0
+        while True:
+            await self.acquire(user_id, priority)
+            self.requests += 1
+            response = await send()
+            if response.status_code not in RETRY_STATUS:
+                return response
+
+            delay = self._retry_delay(response, attempt)
+            if response.status_code == 429:
+                self.rate_limited += 1
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+            # los trabajos en segundo plano se rinden antes para no ocupar la cola
+            max_retries = self.max_retries if priority == INTERACTIVE else 1
+            if attempt >= max_retries or delay > self.max_retry_wait:
+                self.gave_up += 1
+                if response.status_code == 429:
+                    raise SpotifyRateLimited(math.ceil(delay))
+                return response
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "gave_up": self.gave_up,
+            "blocked_for_seconds": max(0.0, self._blocked_until - time.monotonic()),
+            "app_tokens": self.app_bucket.tokens,
+            "tracked_users": len(self._user_buckets)
+        }
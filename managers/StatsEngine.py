@@ -0,0 +1,207 @@
+import asyncio
+import time
+from collections import Counter
+from managers.SpotifyScheduler import BACKGROUND, INTERACTIVE
+
+TIME_RANGES = ("short_term", "medium_term", "long_term")
+TOP_TYPES = ("artists", "tracks")
+# Formato de los datos del snapshot; si cambia, los guardados se recalculan
+SNAPSHOT_SCHEMA = 1
+# me/top devuelve como mucho 50 por página
+TOP_PAGE_SIZE = 50
+
+NAMESPACE = "stats"
+
+
+class StatsUnavailable(Exception):
+    # Spotify no devolvió los top del usuario (respuesta distinta de 200)
+    pass
+
+
+def _artist_summary(artist: dict) -> dict:
+    return {
+        "id": artist["id"],
+        "name": artist["name"],
+        "uri": artist.get("uri"),
+        "genres": artist.get("genres", []),
+        "popularity": artist.get("popularity")
+    }
+
+
+def _track_summary(track: dict) -> dict:
+    return {
+        "id": track["id"],
+        "name": track["name"],
+        "uri": track.get("uri"),
+        "artists": [artist["name"] for artist in track.get("artists", [])],
+        "popularity": track.get("popularity")
+    }
+
+
+def build_rankings(artists: list, tracks: list) -> dict:
+    # Los géneros se cuentan una sola vez aquí, en el orden de los top artists
+    genres_count = Counter(genre for artist in artists for genre in artist.get("genres", []))
+    return {
+        "artists": [_artist_summary(artist) for artist in artists],
+        "tracks": [_track_summary(track) for track in tracks],
+        "genres": [{"genre": genre, "count": count} for genre, count in genres_count.most_common()]
+    }
+
+
+# Snapshots materializados de las estadísticas de escucha de cada usuario:
+#  - top artists y top tracks de los tres time_range se piden a la vez, paginando
+#    hasta el máximo que da la API, y los rankings se calculan una sola vez
+#  - el snapshot se guarda versionado en el almacenamiento y en la TieredCache
+#  - get() lo rehace en el momento si tiene más de max_age segundos, con prioridad
+#    INTERACTIVE (hay un usuario esperando); en segundo plano se rehacen, con prioridad
+#    BACKGROUND, cada refresh_interval los de los usuarios que los consultan
+class StatsEngine:
+    def __init__(
+            self,
+            storage,
+            cache,
+            session_factory,
+            max_age: float = 86400,
+            refresh_interval: float = 21600,
+            active_window: float = 259200,
+            check_interval: float = 300,
+            max_concurrent: int = 4
+        ):
+        self.storage = storage
+        self.cache = cache
+        # session_factory(user_id) -> SpotifySession, para refrescar sin una petición
+        self.session_factory = session_factory
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.active_window = active_window
+        self.check_interval = check_interval
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._last_seen = {}
+        self._task = None
+        # listener(user_id, snapshot) tras cada snapshot nuevo (p.ej. el Recommender)
+        self.listeners = []
+
+        self.snapshots_built = 0
+        self.background_checks = 0
+        self.refresh_failures = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _is_fresh(self, snapshot: dict, max_age: float) -> bool:
+        return snapshot.get("schema") == SNAPSHOT_SCHEMA and time.time() - snapshot["created_at"] < max_age
+
+    async def get(self, session, max_age: float = None) -> dict:
+        self._last_seen[session.user_id] = time.time()
+        return await self._snapshot(session.user_id, session, self.max_age if max_age is None else max_age, INTERACTIVE)
+
+    async def _snapshot(self, user_id: str, session, max_age: float, priority: int) -> dict:
+        loaded = False
+
+        async def load(current):
+            nonlocal loaded
+            loaded = True
+            if current is None:
+                current = await self.storage._get_stats_snapshot(user_id)
+                if current is not None and self._is_fresh(current, max_age):
+                    return current
+            return await self._build(user_id, session, current, priority)
+
+        snapshot = await self.cache.get_or_set(
+            NAMESPACE,
+            user_id,
+            load,
+            self.max_age,
+            accept=lambda snapshot: self._is_fresh(snapshot, max_age)
+        )
+        if loaded or self._is_fresh(snapshot, max_age):
+            return snapshot
+
+        # se ha unido a una carga en vuelo que pedía un snapshot menos reciente (p.ej.
+        # refresh=true mientras otra petición lo lee): se carga aparte, con su max_age
+        snapshot = await self.cache.get_or_set(
+            NAMESPACE,
+            f"{user_id}:max_age={max_age}",
+            load,
+            self.max_age,
+            accept=lambda snapshot: False,
+            store_if=lambda snapshot: False
+        )
+        await self.cache.set(NAMESPACE, user_id, snapshot, self.max_age)
+        return snapshot
+
+    async def _build(self, user_id: str, session, previous: dict, priority: int) -> dict:
+        if session is None:
+            session = await self.session_factory(user_id)
+
+        combos = [(top_type, time_range) for time_range in TIME_RANGES for top_type in TOP_TYPES]
+        results = await asyncio.gather(*(self._fetch_top(session, top_type, time_range, priority) for top_type, time_range in combos))
+        items = dict(zip(combos, results))
+
+        snapshot = {
+            "version": (previous or {}).get("version", 0) + 1,
+            "schema": SNAPSHOT_SCHEMA,
+            "created_at": time.time(),
+            "ranges": {
+                time_range: build_rankings(items[("artists", time_range)], items[("tracks", time_range)])
+                for time_range in TIME_RANGES
+            }
+        }
+        await self.storage._save_stats_snapshot(user_id, snapshot)
+        self.snapshots_built += 1
+        for listener in self.listeners:
+            listener(user_id, snapshot)
+        return snapshot
+
+    async def _fetch_top(self, session, top_type: str, time_range: str, priority: int) -> list:
+        items = []
+        offset = 0
+        while True:
+            response = await session.get(
+                f"me/top/{top_type}",
+                params={"time_range": time_range, "limit": TOP_PAGE_SIZE, "offset": offset},
+                priority=priority
+            )
+            if response.status_code != 200:
+                raise StatsUnavailable(f"Error al obtener me/top/{top_type} ({time_range}): {response.text}")
+            page = response.json()
+            items.extend(page["items"])
+            offset += len(page["items"])
+            if not page.get("next") or not page["items"]:
+                return items
+
+    async def _refresh(self, user_id: str):
+        async with self._semaphore:
+            try:
+                await self._snapshot(user_id, None, self.refresh_interval, BACKGROUND)
+                self.background_checks += 1
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Error al refrescar las estadísticas de {user_id}: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            now = time.time()
+            for user_id, last_seen in list(self._last_seen.items()):
+                if now - last_seen > self.active_window:
+                    del self._last_seen[user_id]
+            # _snapshot no hace nada si el snapshot es más reciente que refresh_interval
+            await asyncio.gather(*(self._refresh(user_id) for user_id in list(self._last_seen)))
+
+    def stats(self) -> dict:
+        return {
+            "active_users": len(self._last_seen),
+            "snapshots_built": self.snapshots_built,
+            "background_checks": self.background_checks,
+            "refresh_failures": self.refresh_failures
+        }
@@ -0,0 +1,155 @@
+import datetime
+import os
+from abc import ABC, abstractmethod
+from models.User import User
+from managers.Encripter import Encripter
+from managers.TokenCache import TokenCache
+from core.config import TOKEN_CACHE_SIZE
+
+# Interfaz común de almacenamiento (usuarios, credenciales temporales de login,
+# playlists colaborativas, snapshots de estadísticas y votaciones). Cada backend implementa las primitivas abstractas y
+# hereda el resto, que solo se apoya en _get_user.
+# Implementaciones: AsyncBaseManager (Firestore) y SQLiteManager (local).
+class StorageBackend(ABC):
+    def __init__(self, token_cache: TokenCache = None):
+        # FirestoreReplica opcional, la asigna el lifespan si USE_FIRESTORE_REPLICA
+        self.replica = None
+        self.token_cache = token_cache if token_cache is not None else TokenCache(TOKEN_CACHE_SIZE)
+        self.encripter = Encripter(os.getenv('MASTER_KEY').encode())
+
+    @abstractmethod
+    async def _get_user(self, id) -> dict:
+        ...
+
+    @abstractmethod
+    async def _get_users(self, ids: list) -> dict:
+        # varios usuarios en una sola lectura: {id: documento o None}
+        ...
+
+    @abstractmethod
+    async def _add_user(self, user: User):
+        ...
+
+    @abstractmethod
+    async def _update_user_for_refresh(self, user: User):
+        ...
+
+    @abstractmethod
+    async def _check_user_is_login(self, id) -> bool:
+        ...
+
+    @abstractmethod
+    async def _add_temp_credentials(self, id, key, expires_at: datetime.datetime):
+        ...
+
+    @abstractmethod
+    async def _check_credentials_exists(self, id, key) -> bool:
+        ...
+
+    @abstractmethod
+    async def _add_coop_playlists(self, id, playlist_ids: list):
+        ...
+
+    @abstractmethod
+    async def _get_stats_snapshot(self, id) -> dict:
+        ...
+
+    @abstractmethod
+    async def _save_stats_snapshot(self, id, snapshot: dict):
+        # snapshot["version"] crece con cada guardado; no se pisa uno más nuevo
+        ...
+
+    @abstractmethod
+    def _iter_stats_snapshots(self):
+        # async generator con (id, snapshot) de todos los usuarios, leídos por páginas
+        ...
+
+    @abstractmethod
+    async def _save_vote_playlist(self, playlist_id, owner_id, threshold: int):
+        ...
+
+    @abstractmethod
+    async def _get_vote_playlist(self, playlist_id) -> dict:
+        # {"owner": id, "threshold": n, "promoted": [track_id]} o None si no está abierta
+        ...
+
+    @abstractmethod
+    async def _has_voted(self, playlist_id, user_id, track_id) -> bool:
+        ...
+
+    @abstractmethod
+    async def _add_votes(self, votes: dict, shard: int) -> dict:
+        # {playlist_id: [(user_id, track_id)]}: cada votante se guarda junto con su
+        # suma al contador (o ninguno de los dos) y los que ya estaban guardados no
+        # cuentan otra vez, así un volcado se puede repetir sin contar votos de más.
+        # shard reparte las escrituras de una misma playlist entre varios documentos.
+        # Devuelve {playlist_id: {track_id: votos nuevos}} de las playlists que se
+        # guardaron: las que falten no se escribieron enteras
+        ...
+
+    @abstractmethod
+    async def _get_vote_counts(self, playlist_id) -> dict:
+        # {track_id: votos} sumando todos los shards
+        ...
+
+    @abstractmethod
+    async def _add_promoted_tracks(self, playlist_id, track_ids: list) -> list:
+        # marca las canciones como añadidas a la playlist y devuelve las que no lo
+        # estaban ya: aunque dos workers las marquen a la vez, cada una sale en uno solo
+        ...
+
+    @abstractmethod
+    async def _remove_promoted_tracks(self, playlist_id, track_ids: list):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+    def _user_profile(self, user: dict) -> dict:
+        # Perfil guardado en el login/refresco con la forma de GET me, o None si no lo hay
+        if user.get("spotify_user_id") is None:
+            return None
+        return {"id": user["spotify_user_id"], "product": user.get("product"), "country": user.get("country")}
+
+    async def _check_token_expired(self, id) -> bool:
+        user = await self._get_user(id)
+        if user is None:
+            return False
+
+        return datetime.datetime.now(datetime.timezone.utc) > user['spotify_expires_at']
+
+    async def _obtain_user_token(self, id) -> str:
+        cached = await self.token_cache.aget(id)
+        if cached is not None:
+            return cached[0]
+
+        user = await self._get_user(id)
+        if user is None:
+            return "No users found"
+
+        token = self.encripter._decript(user["spotify_token"])
+        await self.token_cache.aset(id, token, user["spotify_expires_at"], self._user_profile(user))
+        return token
+
+    async def _obtain_user_refresh_token(self, id) -> str:
+        user = await self._get_user(id)
+        if user is None:
+            return "No users found"
+
+        return self.encripter._decript(user["refresh_token"])
+
+    async def _obtain_coop_playlists(self, id) -> list:
+        user = await self._get_user(id)
+        if user is None:
+            return "No users found"
+
+        return user.get("coop_playlists", [])
+
+    async def _user_has_coop_playlists(self, id) -> bool:
+        user = await self._get_user(id)
+        if user is None:
+            print(f"No users found with the given ID: {id}.")
+            return False
+
+        return len(user.get("coop_playlists", [])) > 0
@@ -0,0 +1,50 @@
+import datetime
+from cache_app import TieredCache
+
+NAMESPACE = "tokens"
+
+
+# Access tokens ya descifrados (con el perfil de Spotify del usuario), indexados por
+# id de usuario, sobre la TieredCache de la app (namespace "tokens", con su propio L1
+# de max_size entradas: las respuestas y los snapshots no echan a los tokens). Cada
+# entrada caduca `skew` segundos antes que el token, así que nunca devuelve un token
+# caducado ni a punto de caducar: en ese caso se vuelve al almacenamiento y se refresca.
+# Pasa también por el L2 compartido entre workers si hay REDIS_URL.
+class TokenCache:
+    def __init__(self, max_size: int = 1024, cache: TieredCache = None, skew: float = 30.0):
+        self.cache = cache if cache is not None else TieredCache()
+        self.cache.reserve_l1(NAMESPACE, max_size)
+        self.skew = skew
+        self.hits = 0
+        self.misses = 0
+
+    def _ttl(self, expires_at: datetime.datetime) -> float:
+        return (expires_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds() - self.skew
+
+    def _count(self, entry):
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # (token, expires_at, perfil)
+        return tuple(entry)
+
+    async def aget(self, user_id):
+        return self._count(await self.cache.get(NAMESPACE, user_id))
+
+    async def aset(self, user_id, token: str, expires_at: datetime.datetime, profile: dict = None):
+        await self.cache.set(NAMESPACE, user_id, (token, expires_at, profile), self._ttl(expires_at))
+
+    async def ainvalidate(self, user_id):
+        await self.cache.delete(NAMESPACE, user_id)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        l1 = self.cache.l1_for(NAMESPACE)
+        return {
+            "size": len(l1),
+            "max_size": l1.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
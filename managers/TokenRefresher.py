@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import time
+from core.session import UserNotLogged
+from core.tokens import refresh_access_token
+
+# Refresco de tokens de Spotify:
+#  - single-flight: si ya hay un refresco en curso para un usuario, el resto de
+#    peticiones esperan a ese en vez de lanzar otro contra TOKEN_URL
+#  - en segundo plano: un min-heap ordenado por spotify_expires_at refresca los
+#    tokens de los usuarios activos unos minutos antes de que caduquen
+class TokenRefresher:
+    def __init__(self, storage, http, lead_time: int = 300, active_window: int = 3600, max_concurrent: int = 10):
+        self.storage = storage
+        self.http = http
+        self.lead_time = lead_time
+        self.active_window = active_window
+        self._heap = []
+        # user_id -> refresh_at de la entrada vigente; las demás del heap están obsoletas
+        self._scheduled = {}
+        self._last_seen = {}
+        self._in_flight = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._background_tasks = set()
+
+        self.refreshes_performed = 0
+        self.refreshes_coalesced = 0
+        self.background_refreshes = 0
+        self.refresh_failures = 0
+        self.expired_token_hits = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # los refrescos en curso se cancelan antes de que se cierre el cliente HTTP
+        tasks = [*self._background_tasks, *self._in_flight.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def touch(self, user_id: str, expires_at):
+        # Cada petición marca al usuario como activo y (re)programa su refresco
+        self._last_seen[user_id] = time.time()
+        refresh_at = expires_at.timestamp() - self.lead_time
+        if self._scheduled.get(user_id) == refresh_at:
+            return
+
+        self._scheduled[user_id] = refresh_at
+        heapq.heappush(self._heap, (refresh_at, user_id))
+        self._wakeup.set()
+
+    async def refresh(self, user_id: str, refresh_token: str = None):
+        task = self._in_flight.get(user_id)
+        if task is not None:
+            self.refreshes_coalesced += 1
+        else:
+            task = asyncio.create_task(self._refresh(user_id, refresh_token))
+            self._in_flight[user_id] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(user_id, None))
+        # shield: si se cancela una petición no se cancela el refresco que esperan las demás
+        return await asyncio.shield(task)
+
+    async def _refresh(self, user_id: str, refresh_token: str = None):
+        if refresh_token is None:
+            # _obtain_user_refresh_token devuelve "No users found" si el usuario no existe
+            user = await self.storage._get_user(user_id)
+            if user is None or not user.get("refresh_token"):
+                raise UserNotLogged(user_id)
+            refresh_token = self.storage.encripter._decript(user["refresh_token"])
+
+        try:
+            token, expires_at = await refresh_access_token(self.http, self.storage, user_id, refresh_token)
+        except Exception:
+            self.refresh_failures += 1
+            raise
+
+        self.refreshes_performed += 1
+        self.touch(user_id, expires_at)
+        return token, expires_at
+
+    async def _background_refresh(self, user_id: str):
+        async with self._semaphore:
+            try:
+                await self.refresh(user_id)
+                self.background_refreshes += 1
+            except Exception as e:
+                print(f"Error al refrescar en segundo plano el token de {user_id}: {e}")
+
+    def _is_active(self, user_id: str) -> bool:
+        return time.time() - self._last_seen.get(user_id, 0) <= self.active_window
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            refresh_at, user_id = self._heap[0]
+            delay = refresh_at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            heapq.heappop(self._heap)
+            if self._scheduled.get(user_id) != refresh_at:
+                continue
+            del self._scheduled[user_id]
+
+            if not self._is_active(user_id):
+                self._last_seen.pop(user_id, None)
+                continue
+            task = asyncio.create_task(self._background_refresh(user_id))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    def stats(self) -> dict:
+        return {
+            "scheduled_users": len(self._scheduled),
+            "in_flight": len(self._in_flight),
+            "refreshes_performed": self.refreshes_performed,
+            "refreshes_coalesced": self.refreshes_coalesced,
+            "background_refreshes": self.background_refreshes,
+            "refresh_failures": self.refresh_failures,
+            "expired_token_hits": self.expired_token_hits
+        }
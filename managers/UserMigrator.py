@@ -0,0 +1,79 @@
+import datetime
+import sys
+from managers.BaseManager import BaseManager
+
+# Herramienta de un solo uso: antes cada login hacía collection("users").add(...),
+# así que un mismo usuario puede tener varios documentos. Esto los fusiona en
+# un único documento cuyo id es el Id de la app.
+#
+#   python -m managers.UserMigrator [--dry-run]
+
+OLDEST = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+class UserMigrator:
+    def __init__(self, base_manager: BaseManager):
+        self.db = base_manager.db
+
+    def _group_users(self) -> dict:
+        groups = {}
+        for doc in self.db.collection("users").stream():
+            user_id = doc.to_dict().get("Id")
+            if user_id is None:
+                print(f"Documento {doc.id} sin campo Id, se ignora")
+                continue
+            groups.setdefault(user_id, []).append(doc)
+        return groups
+
+    @staticmethod
+    def _merge(docs) -> dict:
+        # El login más reciente manda (tokens, key...), las playlists colaborativas se unen
+        ordered = sorted(docs, key=lambda doc: doc.to_dict().get("authenticated_at") or OLDEST)
+
+        merged = {}
+        coop_playlists = []
+        for doc in ordered:
+            data = doc.to_dict()
+            merged.update(data)
+            for playlist_id in data.get("coop_playlists", []):
+                if playlist_id not in coop_playlists:
+                    coop_playlists.append(playlist_id)
+
+        merged.pop("coop_playlists", None)
+        if coop_playlists:
+            merged["coop_playlists"] = coop_playlists
+        return merged
+
+    def migrate(self, dry_run: bool = False) -> dict:
+        stats = {"users": 0, "migrated_users": 0, "deleted_documents": 0}
+
+        for user_id, docs in self._group_users().items():
+            stats["users"] += 1
+            if len(docs) == 1 and docs[0].id == user_id:
+                continue
+
+            stats["migrated_users"] += 1
+            merged = self._merge(docs)
+            old_docs = [doc for doc in docs if doc.id != user_id]
+            stats["deleted_documents"] += len(old_docs)
+
+            if dry_run:
+                print(f"{user_id}: {len(docs)} documento(s) -> 1")
+                continue
+
+            # Escritura y borrados en el mismo batch para no dejar el usuario a medias
+            batch = self.db.batch()
+            batch.set(self.db.collection("users").document(user_id), merged)
+            for doc in old_docs:
+                batch.delete(doc.reference)
+            batch.commit()
+
+        return stats
+
+
+if __name__ == "__main__":
+    base_manager = BaseManager()
+    try:
+        print(UserMigrator(base_manager).migrate(dry_run="--dry-run" in sys.argv))
+    finally:
+        base_manager.close()
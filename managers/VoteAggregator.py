@@ -0,0 +1,212 @@
+import asyncio
+import random
+from collections import Counter
+from core.playlists import add_tracks_in_batches, PLAYLIST_BATCH_SIZE
+
+
+class VotingClosed(Exception):
+    def __init__(self, playlist_id: str):
+        self.playlist_id = playlist_id
+
+
+class VotingForbidden(Exception):
+    def __init__(self, playlist_id: str, user_id: str):
+        self.playlist_id = playlist_id
+        self.user_id = user_id
+
+
+def track_id_from(track: str) -> str:
+    # acepta el id o la URI ("spotify:track:{id}")
+    return track.rsplit(":", 1)[-1]
+
+
+# Votaciones de canciones para playlists de la comunidad:
+#  - cada voto se comprueba en el momento contra el almacenamiento (votePlaylists/{id}/voters
+#    o la tabla vote_voters) y contra los pendientes: un voto por usuario y canción
+#  - cada flush_interval se vuelcan los de todas las playlists: el votante y su suma al
+#    contador se guardan juntos, y los votantes que ya estaban guardados (otro worker
+#    o un volcado repetido) no cuentan dos veces. Los contadores van en un shard al
+#    azar de cada playlist (con Increment: muchos votos por minuto no caen todos en el
+#    mismo documento)
+#  - tras el volcado se leen los totales de las playlists con votos nuevos y las
+#    canciones con al menos `threshold` votos se marcan como añadidas (solo un worker
+#    se queda con cada una) y se añaden de una vez a la playlist (add_tracks_in_batches,
+#    con la sesión del dueño), las más votadas primero
+class VoteAggregator:
+    def __init__(
+            self,
+            storage,
+            session_factory,
+            flush_interval: float = 5.0,
+            shards: int = 10,
+            max_promotions: int = 100
+        ):
+        self.storage = storage
+        # session_factory(user_id) -> SpotifySession del dueño de la playlist
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.shards = shards
+        self.max_promotions = max_promotions
+        self._playlists = {}
+        self._pending = {}
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+        self.votes_received = 0
+        self.votes_duplicated = 0
+        self.flushes = 0
+        self.writes = 0
+        self.flush_failures = 0
+        self.tracks_promoted = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # los votos aún en memoria no se pierden al apagar
+        await self.flush()
+
+    async def open(self, session, playlist_id: str, threshold: int):
+        # solo el dueño de la playlist en Spotify puede abrir la votación, y una vez
+        # abierta solo él puede cambiar el umbral
+        current = await self.storage._get_vote_playlist(playlist_id)
+        if current is not None and current["owner"] != session.user_id:
+            raise VotingForbidden(playlist_id, session.user_id)
+        response, profile = await asyncio.gather(
+            session.get(f"playlists/{playlist_id}", params={"fields": "owner(id)"}),
+            session.get_profile()
+        )
+        owner = response.json().get("owner", {}).get("id") if response.status_code == 200 else None
+        if owner is None or owner != profile.get("id"):
+            raise VotingForbidden(playlist_id, session.user_id)
+
+        await self.storage._save_vote_playlist(playlist_id, session.user_id, threshold)
+        self._playlists[playlist_id] = await self.storage._get_vote_playlist(playlist_id)
+
+    async def _playlist(self, playlist_id: str) -> dict:
+        playlist = self._playlists.get(playlist_id)
+        if playlist is None:
+            playlist = await self.storage._get_vote_playlist(playlist_id)
+            if playlist is None:
+                raise VotingClosed(playlist_id)
+            self._playlists[playlist_id] = playlist
+        return playlist
+
+    async def vote(self, playlist_id: str, user_id: str, track: str) -> bool:
+        # False si el usuario ya había votado esa canción
+        await self._playlist(playlist_id)
+        track_id = track_id_from(track)
+        voted = await self.storage._has_voted(playlist_id, user_id, track_id)
+        pending = self._pending.setdefault(playlist_id, set())
+        if voted or (user_id, track_id) in pending:
+            self.votes_duplicated += 1
+            return False
+        pending.add((user_id, track_id))
+        self.votes_received += 1
+        return True
+
+    async def totals(self, playlist_id: str) -> dict:
+        # votos guardados más los que aún no se han volcado
+        playlist = await self._playlist(playlist_id)
+        totals = Counter(await self.storage._get_vote_counts(playlist_id))
+        totals.update(track_id for _, track_id in self._pending.get(playlist_id, ()))
+        return {
+            "threshold": playlist["threshold"],
+            "promoted": list(playlist["promoted"]),
+            "votes": [{"track_id": track_id, "votes": votes} for track_id, votes in totals.most_common()]
+        }
+
+    async def flush(self):
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            pending = {playlist_id: voters for playlist_id, voters in pending.items() if voters}
+            if not pending:
+                return
+            try:
+                saved = await self.storage._add_votes(
+                    {playlist_id: list(voters) for playlist_id, voters in pending.items()},
+                    random.randrange(self.shards)
+                )
+            except Exception as e:
+                print(f"Error al guardar los votos: {e}")
+                saved = {}
+            failed = [playlist_id for playlist_id in pending if playlist_id not in saved]
+            if failed:
+                # los votos de las playlists que no se guardaron vuelven a pendientes; si
+                # una parte sí llegó a guardarse, esos votantes no cuentan otra vez
+                self.flush_failures += 1
+                for playlist_id in failed:
+                    self._pending.setdefault(playlist_id, set()).update(pending[playlist_id])
+            if not saved:
+                return
+            self.flushes += 1
+            self.writes += len(saved)
+
+            for playlist_id in saved:
+                try:
+                    await self._promote(playlist_id)
+                except Exception as e:
+                    print(f"Error al añadir las canciones ganadoras a la playlist {playlist_id}: {e}")
+
+    async def _promote(self, playlist_id: str):
+        playlist, totals = await asyncio.gather(
+            self.storage._get_vote_playlist(playlist_id),
+            self.storage._get_vote_counts(playlist_id)
+        )
+        self._playlists[playlist_id] = playlist
+        promoted = set(playlist["promoted"])
+        winners = sorted(
+            (track_id for track_id, votes in totals.items() if votes >= playlist["threshold"] and track_id not in promoted),
+            key=lambda track_id: -totals[track_id]
+        )[:self.max_promotions]
+        if not winners:
+            return
+
+        # se marcan antes de añadirlas: si otro worker ya marcó alguna, la añade él
+        claimed = set(await self.storage._add_promoted_tracks(playlist_id, winners))
+        winners = [track_id for track_id in winners if track_id in claimed]
+        if not winners:
+            return
+
+        added = []
+        try:
+            session = await self.session_factory(playlist["owner"])
+            result = await add_tracks_in_batches(session, playlist_id, [f"spotify:track:{track_id}" for track_id in winners])
+            # los lotes van en orden de PLAYLIST_BATCH_SIZE: solo se quedan marcados los que entraron
+            added = [
+                track_id
+                for batch in result["batches"] if batch["status"] == "added"
+                for track_id in winners[batch["index"] * PLAYLIST_BATCH_SIZE:(batch["index"] + 1) * PLAYLIST_BATCH_SIZE]
+            ]
+        finally:
+            not_added = [track_id for track_id in winners if track_id not in added]
+            if not_added:
+                # se desmarcan para que el siguiente volcado lo vuelva a intentar
+                await self.storage._remove_promoted_tracks(playlist_id, not_added)
+
+        playlist["promoted"] = [*playlist["promoted"], *added]
+        self.tracks_promoted += len(added)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "playlists": len(self._playlists),
+            "pending_votes": sum(len(voters) for voters in self._pending.values()),
+            "votes_received": self.votes_received,
+            "votes_duplicated": self.votes_duplicated,
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "flush_failures": self.flush_failures,
+            "tracks_promoted": self.tracks_promoted
+        }
@@ -8,7 +8,10 @@ class User:
             spotify_expires_at: datetime,
             spotify_token,
             refresh_token,
-            key
+            key,
+            product: str = None,
+            spotify_user_id: str = None,
+            country: str = None
         ):
         self.id = id
         self.authenticated_at = authenticated_at
@@ -16,4 +19,13 @@ class User:
         self.spotify_token = spotify_token
         self.key = key
         self.refresh_token = refresh_token
+        # Perfil de Spotify, se guarda al hacer login y se actualiza con cada refresco del token
+        self.product = product
+        self.spotify_user_id = spotify_user_id
+        self.country = country
+
+    def profile_fields(self) -> dict:
+        # solo los campos del perfil que se conocen, para no pisar los guardados con None
+        fields = {"product": self.product, "spotify_user_id": self.spotify_user_id, "country": self.country}
+        return {name: value for name, value in fields.items() if value is not None}
 
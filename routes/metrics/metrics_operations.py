@@ -0,0 +1,70 @@
+# app/routers/metrics_operations.py
+
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import JSONResponse
+from managers.StorageBackend import StorageBackend
+from core.dependencies import get_storage
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/token_cache")
+async def get_token_cache_metrics(storage: StorageBackend = Depends(get_storage)):
+    return JSONResponse(content=storage.token_cache.stats())
+
+
+@router.get("/cache")
+async def get_cache_metrics(request: Request):
+    return JSONResponse(content=request.app.state.cache.stats())
+
+
+@router.get("/http")
+async def get_http_metrics(request: Request):
+    return JSONResponse(content=request.app.state.http_metrics.stats())
+
+
+@router.get("/token_refresher")
+async def get_token_refresher_metrics(request: Request):
+    return JSONResponse(content=request.app.state.token_refresher.stats())
+
+
+@router.get("/spotify_scheduler")
+async def get_spotify_scheduler_metrics(request: Request):
+    return JSONResponse(content=request.app.state.spotify_scheduler.stats())
+
+
+@router.get("/response_cache")
+async def get_response_cache_metrics(request: Request):
+    return JSONResponse(content=request.app.state.response_cache.stats())
+
+
+@router.get("/presence")
+async def get_presence_metrics(request: Request):
+    return JSONResponse(content=request.app.state.presence.stats())
+
+
+@router.get("/stats_engine")
+async def get_stats_engine_metrics(request: Request):
+    return JSONResponse(content=request.app.state.stats_engine.stats())
+
+
+@router.get("/history")
+async def get_history_metrics(request: Request):
+    return JSONResponse(content=request.app.state.history_ingester.stats())
+
+
+@router.get("/recommender")
+async def get_recommender_metrics(request: Request):
+    return JSONResponse(content=request.app.state.recommender.stats())
+
+
+@router.get("/votes")
+async def get_votes_metrics(request: Request):
+    return JSONResponse(content=request.app.state.votes.stats())
+
+
+@router.get("/replica")
+async def get_replica_metrics(request: Request):
+    if request.app.state.replica is None:
+        return JSONResponse(content={"enabled": False})
+    return JSONResponse(content={"enabled": True, **request.app.state.replica.stats()})
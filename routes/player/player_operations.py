@@ -1,75 +1,48 @@
 # app/routers/player_operations.py
 
-from fastapi import APIRouter, Query
-from fastapi.responses import RedirectResponse, JSONResponse
-import requests
-import urllib.parse
-from managers.BaseManager import BaseManager
-from core.config import API_BASE_URL
-import datetime
+import asyncio
+from fastapi import APIRouter, Query, Depends, Request, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+from managers.StorageBackend import StorageBackend
+from core.dependencies import get_storage, get_spotify_session, get_target_session, get_presence, get_stats_engine, load_sessions
+from core.config import FRIENDS_ACTIVITY_CONCURRENCY
+from core.session import SpotifySession
+from managers.PresenceTracker import PresenceTracker
+from managers.StatsEngine import StatsEngine, StatsUnavailable, TIME_RANGES, TOP_TYPES
 
 router = APIRouter(prefix="/player", tags=["player"])
 
 @router.get("/top/{user_id}/{type}")
-async def get_top_items(user_id: str, type: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-
-    print(f"Token for user {user_id}: {token}")
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id, "type": type}
-        params = {
-            "rute_back": "player/top",
-            "refresh_token": refresh_token_obteined,
-            "id": user_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-
-    headers = {"Authorization": f"Bearer {token}"}
-    params = {"type": type, "time_range": "long_term", "limit": 10}
-    response = requests.get(f"{API_BASE_URL}me/top/{type}", headers=headers, params=params)
-
-    if response.status_code != 200:
-        return JSONResponse(content={"error": "Error al obtener las canciones/artistas", "detail": response.text}, status_code=500)
-
-    top_items = response.json()
-    if type in ["artists", "tracks"]:
-        names = [item["name"] for item in top_items["items"]]
-        return JSONResponse(content=names)
-
-    return JSONResponse(content=top_items)
+async def get_top_items(
+    type: str,
+    time_range: str = "long_term",
+    limit: int = 10,
+    session: SpotifySession = Depends(get_spotify_session),
+    stats: StatsEngine = Depends(get_stats_engine)
+):
+    if type not in TOP_TYPES or time_range not in TIME_RANGES:
+        return JSONResponse(content={"error": "type tiene que ser artists o tracks y time_range short_term, medium_term o long_term"}, status_code=400)
+
+    try:
+        snapshot = await stats.get(session)
+    except StatsUnavailable as e:
+        return JSONResponse(content={"error": "Error al obtener las canciones/artistas", "detail": str(e)}, status_code=500)
+
+    names = [item["name"] for item in snapshot["ranges"][time_range][type][:limit]]
+    return JSONResponse(content=names)
 
 @router.get("/add_target_song_to_playlist/{user_id}/{target_id}/{playlist_id}")
-async def add_song_to_playlist(user_id: str, target_id: str, playlist_id: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id, "target_id": target_id, "playlist_id": playlist_id}
-        params = {
-            "rute_back": "player/add_target_song_to_playlist",
-            "refresh_token": refresh_token_obteined,
-            "id": user_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-
-    if not base_manager._check_user_is_login(target_id):
-        return JSONResponse(content="El usuario target no está logueado en la aplicación", status_code=500)
-
-    target_token = base_manager._obtain_user_token(target_id)
-    headers = {"Authorization": f"Bearer {target_token}"}
-    response = requests.get(f"{API_BASE_URL}me/player", headers=headers)
-
-    if response.status_code != 200:
+async def add_song_to_playlist(
+    playlist_id: str,
+    session: SpotifySession = Depends(get_spotify_session),
+    target: SpotifySession = Depends(get_target_session),
+    presence: PresenceTracker = Depends(get_presence)
+):
+    song = await presence.now_playing(target)
+
+    if song is None:
         return JSONResponse(content="Error al obtener la canción o no hay reproducción", status_code=500)
 
-    song = response.json()
     if 'item' not in song:
         return JSONResponse(content=f"No track is currently playing: {song}", status_code=500)
 
@@ -77,13 +50,10 @@ async def add_song_to_playlist(user_id: str, target_id: str, playlist_id: str):
     track_id = song['item']['id']
     track_name = song['item']['name']
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
+    headers = {"Content-Type": "application/json"}
     req_body = {"uris": [track_uri], "position": 0}
 
-    response = requests.post(f"{API_BASE_URL}playlists/{playlist_id}/tracks", headers=headers, json=req_body)
+    response = await session.post(f"playlists/{playlist_id}/tracks", headers=headers, json=req_body)
     if response.status_code != 201:
         return JSONResponse(content=f"Error al añadir la canción: {response.text}", status_code=500)
 
@@ -91,51 +61,24 @@ async def add_song_to_playlist(user_id: str, target_id: str, playlist_id: str):
 
 
 @router.get("/check_if_user_is_logged/{id}")
-async def check_if_user_is_logged(id: str):
-    is_logged_in = BaseManager()._check_user_is_login(id)
+async def check_if_user_is_logged(id: str, storage: StorageBackend = Depends(get_storage)):
+    is_logged_in = await storage._check_user_is_login(id)
     return JSONResponse(content={"is_logged_in": is_logged_in}, status_code=200 if is_logged_in else 404)
-    
+
 @router.get("/add_target_song_to_queue/{user_id}/{target_id}")
-async def add_target_song_to_queue(user_id: str, target_id: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id, "target_id": target_id}
-        params = {
-            "rute_back": "player/add_target_song_to_queue",
-            "refresh_token": refresh_token_obteined,
-            "id": user_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-
-    if not base_manager._check_user_is_login(target_id):
-        return JSONResponse(content="El usuario target no está logueado", status_code=500)
-
-    target_token = base_manager._obtain_user_token(target_id)
-
-    if base_manager._check_token_expired(target_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(target_id)
-        original_params = {"user_id": user_id, "target_id": target_id}
-        params = {
-            "rute_back": "player/add_target_song_to_queue",
-            "refresh_token": refresh_token_obteined,
-            "id": target_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-
-    user_info = requests.get(f"{API_BASE_URL}me", headers={"Authorization": f"Bearer {token}"}).json()
-    if user_info.get("product") == "free":
+async def add_target_song_to_queue(
+    session: SpotifySession = Depends(get_spotify_session),
+    target: SpotifySession = Depends(get_target_session),
+    presence: PresenceTracker = Depends(get_presence)
+):
+    profile = await session.get_profile()
+    if profile.get("product") == "free":
         return JSONResponse(content="El usuario no es premium", status_code=501)
 
-    response = requests.get(f"{API_BASE_URL}me/player", headers={"Authorization": f"Bearer {target_token}"})
-    if response.status_code != 200:
+    song = await presence.now_playing(target)
+    if song is None:
         return JSONResponse(content="Error al obtener la canción del target", status_code=500)
 
-    song = response.json()
     if 'item' not in song:
         return JSONResponse(content=f"No hay canción en reproducción: {song}", status_code=500)
 
@@ -143,59 +86,34 @@ async def add_target_song_to_queue(user_id: str, target_id: str):
     track_id = song['item']['id']
     track_name = song['item']['name']
 
-    response = requests.post(
-        f"{API_BASE_URL}me/player/queue",
-        headers={"Authorization": f"Bearer {token}"},
-        params={"uri": track_uri}
-    )
+    response = await session.post("me/player/queue", params={"uri": track_uri})
 
     return JSONResponse(content={"message": "Canción en cola", "track_uri": track_uri, "track_name": track_name, "track_id": track_id})
 
 
-@router.get('/friends_activity/{user_id}')
-async def get_friends_activity(user_id: str):
-    base_manager = BaseManager()
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id}
-        params = {
-            "rute_back": "player/friends_activity",
-            "refresh_token": refresh_token_obteined,
-            "id": user_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-    
-
-    token = base_manager._obtain_user_token(user_id)
-
-    # Primero antes de nada debemos obtener la canción que está escuchando el usuario
-    headers = {
-        'Authorization': f'Bearer {token}'
-    }
+class ActivityError(Exception):
+    def __init__(self, message: str, detail: str = None):
+        self.message = message
+        self.detail = detail
 
-    # Obtenemos la canción que está escuchando el usuario y guaradamos los id de los artistas
-    response = requests.get(API_BASE_URL + 'me/player', headers=headers)
 
-    if response.status_code != 200:
-        return JSONResponse(content={"error": "Error al obtener la canción actual del usuario", "detail": response.text}, status_code=500)
-    
-    informarion = response.json()
-
-    headers = {
-        'Authorization': f'Bearer {token}'
-    }
-
-    # Obtenemos la informacion de las 3 reprudcciones mas recientes del usuario
-    response = requests.get(API_BASE_URL + 'me/player/recently-played?limit=3', headers=headers)
+async def _friend_activity(session: SpotifySession, presence: PresenceTracker) -> dict:
+    # La canción actual (del PresenceTracker) y las 3 reproducciones más recientes se piden a la vez
+    informarion, response = await asyncio.gather(
+        presence.now_playing(session),
+        session.get('me/player/recently-played', params={"limit": 3})
+    )
 
+    if informarion is None:
+        raise ActivityError("Error al obtener la canción actual del usuario")
+    if informarion.get('item') is None:
+        raise ActivityError("No hay reproducción")
     if response.status_code != 200:
-        return JSONResponse(content={"error": "Error al obtener la actividad reciente del usuario", "detail": response.text}, status_code=500)
-    
+        raise ActivityError("Error al obtener la actividad reciente del usuario", response.text)
+
     recent_plays = response.json()
 
-    informacion_extraida = {
+    return {
         "device_type": informarion['device']['type'],
         "volume_percent": informarion['device']['volume_percent'],
         "currently_playing": informarion['item']['name'],
@@ -203,53 +121,82 @@ async def get_friends_activity(user_id: str):
         "last_played": [item['track']['name'] for item in recent_plays['items']],
     }
 
+
+@router.get('/friends_activity/{user_id}')
+async def get_friends_activity(session: SpotifySession = Depends(get_spotify_session), presence: PresenceTracker = Depends(get_presence)):
+    try:
+        informacion_extraida = await _friend_activity(session, presence)
+    except ActivityError as e:
+        return JSONResponse(content={"error": e.message, "detail": e.detail}, status_code=500)
+
     return JSONResponse(content=informacion_extraida)
 
+
+# Actividad de varios usuarios a la vez (paneles de presencia de los bots): los tokens
+# se resuelven con una sola lectura del almacenamiento y las consultas a Spotify van
+# en paralelo, como mucho FRIENDS_ACTIVITY_CONCURRENCY usuarios a la vez
+@router.post('/friends_activity')
+async def get_friends_activity_batch(
+    request: Request,
+    user_ids: list[str] = Body(...),
+    storage: StorageBackend = Depends(get_storage),
+    presence: PresenceTracker = Depends(get_presence)
+):
+    user_ids = list(dict.fromkeys(user_ids))
+    sessions, errors = await load_sessions(request.app.state, storage, user_ids)
+    semaphore = asyncio.Semaphore(FRIENDS_ACTIVITY_CONCURRENCY)
+    results = {}
+
+    async def fetch(user_id: str, session: SpotifySession):
+        async with semaphore:
+            try:
+                results[user_id] = await _friend_activity(session, presence)
+            except ActivityError as e:
+                errors[user_id] = e.message if e.detail is None else f"{e.message}: {e.detail}"
+            except Exception as e:
+                errors[user_id] = str(e) or type(e).__name__
+
+    await asyncio.gather(*(fetch(user_id, session) for user_id, session in sessions.items()))
+
+    return JSONResponse(content={
+        "results": {user_id: results[user_id] for user_id in user_ids if user_id in results},
+        "errors": {user_id: errors[user_id] for user_id in user_ids if user_id in errors}
+    })
+
 @router.get('/follow/{user_id}/{target_id}')
-async def follow_user(user_id: str, target_id: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id, "target_id": target_id}
-        params = {
-            "rute_back": "player/follow",
-            "refresh_token": refresh_token_obteined,
-            "id": user_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.put(f"{API_BASE_URL}me/following?type=user&ids={target_id}", headers=headers)
+async def follow_user(target_id: str, session: SpotifySession = Depends(get_spotify_session)):
+    response = await session.put("me/following", params={"type": "user", "ids": target_id})
 
     if response.status_code == 204:
         return JSONResponse(content={"message": "Usuario seguido correctamente"}, status_code=200)
     else:
         return JSONResponse(content={"error": "Error al seguir al usuario", "detail": response.text}, status_code=500)
-    
+
 @router.get('/unfollow/{user_id}/{target_id}')
-async def unfollow_user(user_id: str, target_id: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id, "target_id": target_id}
-        params = {
-            "rute_back": "player/unfollow",
-            "refresh_token": refresh_token_obteined,
-            "id": user_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(f"{API_BASE_URL}me/following?type=user&ids={target_id}", headers=headers)
+async def unfollow_user(target_id: str, session: SpotifySession = Depends(get_spotify_session)):
+    response = await session.delete("me/following", params={"type": "user", "ids": target_id})
 
     if response.status_code == 204:
         return JSONResponse(content={"message": "Usuario dejado de seguir correctamente"}, status_code=200)
     else:
         return JSONResponse(content={"error": "Error al dejar de seguir al usuario", "detail": response.text}, status_code=500)
-    
+
+
+# Server-Sent Events con los cambios de canción de los usuarios indicados (ids separados
+# por comas), para que los bots no tengan que sondear /friends_activity
+@router.get('/presence_stream')
+async def presence_stream(
+    ids: str = Query(...),
+    storage: StorageBackend = Depends(get_storage),
+    presence: PresenceTracker = Depends(get_presence)
+):
+    user_ids = list(dict.fromkeys(user_id.strip() for user_id in ids.split(",") if user_id.strip()))
+    for user_id in user_ids:
+        if not await storage._check_user_is_login(user_id):
+            return JSONResponse(content=f"El usuario {user_id} no está logueado en la aplicación", status_code=404)
+
+    return StreamingResponse(
+        presence.stream(user_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,59 +1,67 @@
 # app/routers/playlists.py
 
-from fastapi import APIRouter, Request
-from fastapi.responses import RedirectResponse, JSONResponse
-import requests
-from managers.BaseManager import BaseManager
-from models.User import User
-from core.config import API_BASE_URL
+import json
+from fastapi import APIRouter, Depends, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+from managers.StorageBackend import StorageBackend
+from core.dependencies import get_storage, get_spotify_session
+from core.session import SpotifySession
+from core.playlists import add_tracks_in_batches, iter_user_playlists, project_playlist
+from core.duplicates import remove_duplicates
 
 router = APIRouter(prefix="/playlists", tags=["playlists"])
 
 
+# Todas las playlists del usuario como NDJSON (una por línea), página a página.
+# `fields` (p.ej. "id,name,track_count") limita los campos que se envían de cada una.
 @router.get("/playlists/{user_id}")
-def get_playlists_by_user(user_id: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id}
-        return RedirectResponse(
-            url=f"/refresh_token?rute_back=playlists/playlists&refresh_token={refresh_token_obteined}&id={user_id}&original_params={original_params}"
-        )
-
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(API_BASE_URL + 'me/playlists', headers=headers)
-    if response.status_code != 200:
-        return JSONResponse(content={"error": response.text}, status_code=500)
-
-    return JSONResponse(content=response.json())
+async def get_playlists_by_user(fields: str = None, session: SpotifySession = Depends(get_spotify_session)):
+    projection = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    playlists = iter_user_playlists(session)
+
+    # La primera página se pide antes de empezar a responder para poder devolver un 500
+    try:
+        first = await anext(playlists)
+    except StopAsyncIteration:
+        first = None
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+    def to_line(playlist: dict) -> str:
+        return json.dumps(project_playlist(playlist, projection) if projection else playlist) + "\n"
+
+    async def ndjson():
+        if first is None:
+            return
+        yield to_line(first)
+        try:
+            async for playlist in playlists:
+                yield to_line(playlist)
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 
 @router.get("/check_collaborative_playlist/{user_id}")
-def check_collaborative_playlist(user_id: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id}
-        return RedirectResponse(
-            url=f"/refresh_token?rute_back=playlists/check_collaborative_playlist&refresh_token={refresh_token_obteined}&id={user_id}&original_params={original_params}"
-        )
-
-    if not base_manager._user_has_coop_playlists(user_id):
+async def check_collaborative_playlist(user_id: str, storage: StorageBackend = Depends(get_storage)):
+    coops_data = await storage._obtain_coop_playlists(user_id)
+    if not isinstance(coops_data, list) or len(coops_data) == 0:
         return JSONResponse(content={"error": "El usuario no tiene playlists colaborativas"}, status_code=500)
 
-    coops_data = base_manager._obtain_coop_playlists(user_id)
     return JSONResponse(content={"message": "El usuario tiene playlists colaborativas", "playlists": coops_data})
 
 
 @router.get("/create_playlist/{user_id}/{playlist_name}/{playlist_description}/{is_public}/{is_collaborative}")
-def create_playlist(user_id: str, playlist_name: str, playlist_description: str, is_public: str, is_collaborative: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
+async def create_playlist(
+    user_id: str,
+    playlist_name: str,
+    playlist_description: str,
+    is_public: str,
+    is_collaborative: str,
+    session: SpotifySession = Depends(get_spotify_session),
+    storage: StorageBackend = Depends(get_storage)
+):
     if is_collaborative == 'True':
         is_collaborative = True
         is_public = False
@@ -61,24 +69,10 @@ def create_playlist(user_id: str, playlist_name: str, playlist_description: str,
         is_collaborative = False
         is_public = True
 
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {
-            "user_id": user_id,
-            "playlist_name": playlist_name,
-            "playlist_description": playlist_description,
-            "is_public": str(is_public),
-            "is_collaborative": str(is_collaborative)
-        }
-        return RedirectResponse(
-            url=f"/refresh_token?rute_back=playlists/create_playlist&refresh_token={refresh_token_obteined}&id={user_id}&original_params={original_params}"
-        )
-
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(API_BASE_URL + 'me', headers=headers)
-    if response.status_code != 200:
-        return JSONResponse(content={"error": response.text}, status_code=500)
-    spotify_user_id = response.json()['id']
+    profile = await session.get_profile()
+    spotify_user_id = profile.get('id')
+    if spotify_user_id is None:
+        return JSONResponse(content={"error": "No se pudo obtener el perfil de Spotify"}, status_code=500)
 
     data = {
         'name': playlist_name,
@@ -87,37 +81,59 @@ def create_playlist(user_id: str, playlist_name: str, playlist_description: str,
         'collaborative': is_collaborative
     }
 
-    response = requests.post(API_BASE_URL + f'users/{spotify_user_id}/playlists', headers=headers, json=data)
+    response = await session.post(f'users/{spotify_user_id}/playlists', json=data)
     if response.status_code != 201:
         return JSONResponse(content={"error": response.text}, status_code=500)
 
     playlist = response.json()
-    base_manager._add_coop_playlists(user_id, [playlist['id']])
+    await storage._add_coop_playlists(user_id, [playlist['id']])
 
     return JSONResponse(content=playlist)
 
 
 @router.get("/add_song_to_playlist/{user_id}/{playlist_id}/{track_uri}")
-def add_songs_to_playlist(user_id: str, playlist_id: str, track_uri: str):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {
-            "user_id": user_id,
-            "playlist_id": playlist_id,
-            "track_uri": track_uri
-        }
-        return RedirectResponse(
-            url=f"/refresh_token?rute_back=playlists/add_song_to_playlist&refresh_token={refresh_token_obteined}&id={user_id}&original_params={original_params}"
-        )
-
-    headers = {"Authorization": f"Bearer {token}"}
+async def add_songs_to_playlist(playlist_id: str, track_uri: str, session: SpotifySession = Depends(get_spotify_session)):
     data = {"uris": [track_uri], "position": 0}
-    response = requests.post(API_BASE_URL + f'playlists/{playlist_id}/tracks', headers=headers, json=data)
+    response = await session.post(f'playlists/{playlist_id}/tracks', json=data)
 
     if response.status_code != 201:
         return JSONResponse(content={"error": response.text}, status_code=500)
 
     return JSONResponse(content={"message": "Canciones añadidas a la playlist correctamente"})
+
+
+# Añade de una vez una lista de URIs (un álbum, un setlist...) en lotes de 100
+@router.post("/add_songs_to_playlist/{user_id}/{playlist_id}")
+async def add_songs_to_playlist_bulk(
+    playlist_id: str,
+    uris: list[str] = Body(...),
+    position: int = None,
+    session: SpotifySession = Depends(get_spotify_session)
+):
+    if not uris:
+        return JSONResponse(content={"error": "No se ha enviado ninguna canción"}, status_code=400)
+
+    result = await add_tracks_in_batches(session, playlist_id, uris, position)
+    if result["added"] == 0:
+        return JSONResponse(content={"error": "No se ha podido añadir ninguna canción a la playlist", **result}, status_code=500)
+
+    return JSONResponse(content={"message": "Canciones añadidas a la playlist correctamente", **result})
+
+
+# Limpiar canciones duplicadas de una playlist (mismo ISRC o mismo título+artista+
+# duración que una anterior). Responde NDJSON con cada duplicado y un resumen final;
+# con dry_run=false se borran por URI en lotes de 100 y los duplicados exactos se
+# vuelven a añadir una vez en la posición de la copia que se conserva.
+@router.post("/remove_duplicates/{user_id}/{playlist_id}")
+async def remove_playlist_duplicates(playlist_id: str, dry_run: bool = True, session: SpotifySession = Depends(get_spotify_session)):
+    # el snapshot_id se lee antes que las canciones: los borrados van contra esa versión
+    response = await session.get(f"playlists/{playlist_id}", params={"fields": "snapshot_id"})
+    if response.status_code != 200:
+        return JSONResponse(content={"error": response.text}, status_code=500)
+    snapshot_id = response.json()["snapshot_id"]
+
+    async def ndjson():
+        async for event in remove_duplicates(session, playlist_id, snapshot_id, dry_run):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -1,11 +1,14 @@
-from collections import Counter
-from fastapi import APIRouter, Query
-from fastapi.responses import RedirectResponse, JSONResponse
-import requests
-import urllib.parse
-from managers.BaseManager import BaseManager
-from core.config import API_BASE_URL
-import datetime
+import asyncio
+from fastapi import APIRouter, Query, Depends, Request, Body
+from fastapi.responses import JSONResponse
+from managers.StorageBackend import StorageBackend
+from core.dependencies import get_storage, get_spotify_session, get_stats_engine, get_history_ingester, get_recommender, load_sessions
+from core.session import SpotifySession
+from core.config import COMPATIBILITY_CONCURRENCY
+from core.compatibility import compatibility_pairs
+from managers.StatsEngine import StatsEngine, StatsUnavailable, TIME_RANGES
+from managers.ListeningHistory import HistoryIngester, HistoryUnavailable, HISTORY_TYPES
+from managers.Recommender import Recommender, RECOMMENDATION_TYPES
 
 
 
@@ -13,48 +16,128 @@ router = APIRouter(prefix="/stats", tags=["stast"])
 
 
 @router.get('/tops_genders/{user_id}', description="Get top genders of a user")
-async def get_top_genders(user_id: str):
-    base_manager = BaseManager()
-    
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        original_params = {"user_id": user_id}
-        params = {
-            "rute_back": "stats/top_genders",
-            "refresh_token": refresh_token_obteined,
-            "id": user_id,
-            "original_params": str(original_params)
-        }
-        return RedirectResponse(f"/refresh_token?{urllib.parse.urlencode(params)}")
-    
-    token = base_manager._obtain_user_token(user_id)
-
-    request_params = {"time_range": "long_term", "limit": 50}
-    
-    headers = {"Authorization": f"Bearer {token}"}
-
-
-    url = f"{API_BASE_URL}me/top/artists"
-
-    response = requests.get(url, headers=headers, params=request_params)
-    
-    if response.status_code != 200:
-        return JSONResponse({"error": "Failed to fetch top genders"}, status_code=response.status_code)
-    
-    information = response.json()
-
-    genres_count = Counter()
-
-    for item in information['items']:
-        for genres in item['genres']:
-            genres_count[genres] = genres_count.get(genres, 0) + 1
-
-    top_genres = genres_count.most_common(10)
+async def get_top_genders(
+    time_range: str = "long_term",
+    limit: int = 10,
+    session: SpotifySession = Depends(get_spotify_session),
+    stats: StatsEngine = Depends(get_stats_engine)
+):
+    if time_range not in TIME_RANGES:
+        return JSONResponse({"error": f"time_range tiene que ser uno de {', '.join(TIME_RANGES)}"}, status_code=400)
+
+    try:
+        snapshot = await stats.get(session)
+    except StatsUnavailable as e:
+        return JSONResponse({"error": "Failed to fetch top genders", "detail": str(e)}, status_code=500)
+
+    top_genres = [[genre["genre"], genre["count"]] for genre in snapshot["ranges"][time_range]["genres"][:limit]]
 
     return JSONResponse (content=top_genres)
 
-    
-            
-    
 
-    
\ No newline at end of file
+@router.get('/snapshot/{user_id}', description="Get the stored stats snapshot of a user")
+async def get_stats_snapshot(
+    refresh: bool = False,
+    session: SpotifySession = Depends(get_spotify_session),
+    stats: StatsEngine = Depends(get_stats_engine)
+):
+    try:
+        snapshot = await stats.get(session, max_age=0 if refresh else None)
+    except StatsUnavailable as e:
+        return JSONResponse({"error": "Failed to build the stats snapshot", "detail": str(e)}, status_code=500)
+
+    return JSONResponse(content=snapshot)
+
+
+# Top artists, tracks o géneros de una ventana cualquiera del historial de escucha
+# (start y end en segundos desde epoch; sin ellos, desde el principio y hasta ahora).
+# La primera consulta apunta al usuario en la ingesta de recently-played.
+@router.get('/history/top/{user_id}/{type}', description="Get top items of a user over a custom window")
+async def get_history_top(
+    type: str,
+    start: float = None,
+    end: float = None,
+    limit: int = Query(25, ge=1, le=100),
+    session: SpotifySession = Depends(get_spotify_session),
+    ingester: HistoryIngester = Depends(get_history_ingester)
+):
+    if type not in HISTORY_TYPES:
+        return JSONResponse({"error": f"type tiene que ser uno de {', '.join(HISTORY_TYPES)}"}, status_code=400)
+
+    try:
+        await ingester.enroll(session)
+    except HistoryUnavailable as e:
+        return JSONResponse({"error": "Failed to fetch the listening history", "detail": str(e)}, status_code=500)
+
+    return JSONResponse(content=ingester.history.top(session.user_id, type, start, end, limit))
+
+
+# Artistas o géneros recomendados a partir de los gustos de la comunidad: los más
+# parecidos (por los usuarios que los comparten) a los del top del usuario
+@router.get('/recommendations/{user_id}/{type}', description="Get artists or genres recommended from the community")
+async def get_recommendations(
+    type: str,
+    limit: int = Query(20, ge=1, le=50),
+    session: SpotifySession = Depends(get_spotify_session),
+    stats: StatsEngine = Depends(get_stats_engine),
+    recommender: Recommender = Depends(get_recommender)
+):
+    if type not in RECOMMENDATION_TYPES:
+        return JSONResponse({"error": f"type tiene que ser uno de {', '.join(RECOMMENDATION_TYPES)}"}, status_code=400)
+
+    try:
+        snapshot = await stats.get(session)
+    except StatsUnavailable as e:
+        return JSONResponse({"error": "Failed to fetch the user stats", "detail": str(e)}, status_code=500)
+
+    if session.user_id not in recommender.artists:
+        # snapshot de antes de cargar el índice (p.ej. servido desde la cache)
+        recommender.update(session.user_id, snapshot)
+
+    return JSONResponse(content=await recommender.recommend(session.user_id, type, limit))
+
+
+# Compatibilidad musical entre los miembros de un servidor: se carga una vez el
+# snapshot de estadísticas de cada usuario (normalmente ya está en la cache), sus
+# pesos de artistas y géneros son los del Recommender y se comparan todos los pares
+# a la vez. Devuelve los pares más compatibles primero.
+@router.post('/compatibility', description="Rank the pairs of users with the most similar taste")
+async def get_compatibility(
+    request: Request,
+    user_ids: list[str] = Body(...),
+    limit: int = Query(50, ge=1, le=1000),
+    storage: StorageBackend = Depends(get_storage),
+    stats: StatsEngine = Depends(get_stats_engine),
+    recommender: Recommender = Depends(get_recommender)
+):
+    user_ids = list(dict.fromkeys(user_ids))
+    sessions, errors = await load_sessions(request.app.state, storage, user_ids)
+    semaphore = asyncio.Semaphore(COMPATIBILITY_CONCURRENCY)
+    snapshots = {}
+
+    async def fetch(user_id: str, session: SpotifySession):
+        async with semaphore:
+            try:
+                snapshots[user_id] = await stats.get(session)
+            except Exception as e:
+                errors[user_id] = str(e) or type(e).__name__
+
+    await asyncio.gather(*(fetch(user_id, session) for user_id, session in sessions.items()))
+
+    # en el orden pedido, para que el resultado no dependa de qué snapshot llegó antes
+    compared = [user_id for user_id in user_ids if user_id in snapshots]
+    for user_id in compared:
+        if user_id not in recommender.artists:
+            # snapshot de antes de cargar el índice (p.ej. servido desde la cache)
+            recommender.update(user_id, snapshots[user_id])
+
+    # las matrices y los nombres se copian aquí, en el event loop: el Recommender se
+    # sigue actualizando mientras el hilo calcula los pares
+    artists = recommender.artists.matrix(compared)
+    genres = recommender.genres.matrix(compared)
+    artist_names = list(recommender.artists.names)
+
+    return JSONResponse(content={
+        "pairs": await asyncio.to_thread(compatibility_pairs, artists, genres, artist_names, compared, limit),
+        "errors": {user_id: errors[user_id] for user_id in user_ids if user_id in errors}
+    })
@@ -1,10 +1,11 @@
+import asyncio
+import json
 import secrets
-from fastapi import APIRouter, Request
-from fastapi.responses import RedirectResponse, JSONResponse
-import requests
-from managers.BaseManager import BaseManager
-from models.User import User
-from core.config import API_BASE_URL
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from core.dependencies import get_spotify_session
+from core.session import SpotifySession
+from core.duplicates import remove_duplicates
 
 router = APIRouter(prefix="/tracks", tags=["tracks"])
 
@@ -18,96 +19,76 @@ Args:
     user_id (str): The ID of the user for whom the operation is performed.
 Returns:
     Response: 
-        - If the user's token is expired, redirects to the token refresh endpoint.
         - If the user is not a premium user, returns a 501 error with a message.
-        - If no track is currently playing, returns a 500 error with a message.
-        - If successful, returns a JSON response with a success message and the URIs of the added tracks.
-        - If an error occurs while fetching artist songs or adding tracks to the queue, returns a 500 error with a message.
-Raises:
-    Exception: If there is an error while fetching artist songs or adding tracks to the queue.
+        - If no track is currently playing, returns a JSON response with an error message.
+        - If successful, returns a JSON response with a message, the URIs of the added tracks and
+          a per-artist `results` list (`queued` or `error` with the reason).
+        - If no track could be added to the queue, returns a 500 error with the per-artist results.
 Notes:
-    - The function checks if the user's token is expired and refreshes it if necessary.
+    - An expired token is refreshed inside the SpotifySession, which also retries a call once
+      if Spotify answers 401.
     - The function only works for premium Spotify users.
-    - The function uses the Spotify Web API to fetch user and track information.
+    - The top tracks of all the artists are fetched concurrently; the queue POSTs are sent one
+      after another in artist order (to keep the queue order) as soon as each lookup finishes.
 """
 @router.get('/add_artist_songs_to_queue/{user_id}')
-def add_artist_songs_to_queue(user_id):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        orginial_params = {"user_id": user_id}
-        return RedirectResponse(
-            url=f"/refresh_token?rute_back=tracks/add_artist_songs_to_queue&refresh_token={refresh_token_obteined}&id={user_id}&original_params={orginial_params}"
-        )
-    
+async def add_artist_songs_to_queue(session: SpotifySession = Depends(get_spotify_session)):
     #Antes de comenzar a añadir canciones a la cola, debemos saber si el usuario es premiun o no
-    headers = {
-        'Authorization': f'Bearer {token}'
-    }
-    response = requests.get(API_BASE_URL + 'me', headers=headers)
-    is_premiun = response.json()
-    if is_premiun['product'] == 'free':
-        return "El usuario no es premium, por lo que no puede añadir canciones a la cola", 501
-
-    # Primero antes de nada debemos obtener la canción que está escuchando el usuario
-    headers = {
-        'Authorization': f'Bearer {token}'
-    }
-
-    # Obtenemos la canción que está escuchando el usuario y guaradamos los id de los artistas
-    response = requests.get(API_BASE_URL + 'me/player', headers=headers)
-    song = response.json()
-    if song['is_playing'] == False:
+    # (el perfil y la canción en reproducción se piden a la vez)
+    profile, response = await asyncio.gather(session.get_profile(), session.get('me/player'))
+    if profile.get('product') == 'free':
+        return JSONResponse(content="El usuario no es premium, por lo que no puede añadir canciones a la cola", status_code=501)
+
+    # Guardamos los id de los artistas de la canción que está escuchando el usuario
+    song = response.json() if response.status_code == 200 else {}
+    if not song.get('is_playing'):
         return JSONResponse(content={"error": "No hay canción en reproducción"})
     if 'item' in song:
         artists_list_id = [artist['id'] for artist in song['item']['artists']]
     else:
        return JSONResponse(content={"error": "No hay canción en reproducción"})
-    
-    # Obtenemos las canciones de los artistas
-    tracks_uris = []
-
-    headers = {
-        'Authorization': f'Bearer {token}',
-    }
-    try:
-        for artist_id in artists_list_id:
-            response = requests.get(API_BASE_URL + f'artists/{artist_id}/top-tracks', headers=headers)
-            tracks = response.json()
-            #necesito saber cuantas canciones tiene el artista para elegir una al azar
-            num_tracks = len(tracks['tracks'])
-            if num_tracks > 1:
-                track_index = secrets.randbelow(num_tracks)
-                tracks_uris.append(tracks['tracks'][track_index]['uri'])
-            else:
-                #Añadimos solo el primer album de cada artista
-                tracks_uris.append(tracks['tracks'][0]['uri'])
-    except Exception as e:
-        return JSONResponse(content={"error": f"Error al obtener las canciones de los artistas: {e}"}, status_code=500)
-    
-    # Solo nos queda añadir las canciones a la cola
-    headers = {
-        'Authorization': f'Bearer {token}',
-    }
 
-    
-    try:
-        for track_uri in tracks_uris:
-            params = { 'uri': track_uri }
-            response = requests.post(API_BASE_URL + 'me/player/queue', headers=headers, params=params)
+    # Las canciones de todos los artistas se piden a la vez; cada una se añade a la cola
+    # en cuanto llega su artista, en orden, mientras siguen en vuelo las demás
+    lookups = [asyncio.create_task(_pick_artist_track(session, artist_id)) for artist_id in artists_list_id]
+    results = []
+    for artist_id, lookup in zip(artists_list_id, lookups):
+        result = {"artist_id": artist_id}
+        try:
+            result["track_uri"] = await lookup
+            response = await session.post('me/player/queue', params={'uri': result["track_uri"]})
+            if response.status_code not in (200, 204):
+                raise Exception(response.text)
+            result["status"] = "queued"
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+        results.append(result)
+
+    tracks_uris = [result["track_uri"] for result in results if result["status"] == "queued"]
+    if not tracks_uris:
+        return JSONResponse(content={"error": "No se ha podido añadir ninguna canción a la cola", "results": results}, status_code=500)
+    message = "Canciones añadidas a la cola correctamente" if len(tracks_uris) == len(results) else "Algunas canciones no se han podido añadir a la cola"
+    return JSONResponse(content={"message": message, "tracks_uris": tracks_uris, "results": results})
+
+
+async def _pick_artist_track(session: SpotifySession, artist_id: str) -> str:
+    response = await session.get(f'artists/{artist_id}/top-tracks')
+    if response.status_code != 200:
+        raise Exception(f"Error al obtener las canciones del artista: {response.text}")
+    tracks = response.json()['tracks']
+    if not tracks:
+        raise Exception("El artista no tiene canciones")
+    #necesito saber cuantas canciones tiene el artista para elegir una al azar
+    return tracks[secrets.randbelow(len(tracks))]['uri']
 
-        return JSONResponse(content={"message": "Canciones añadidas a la cola correctamente", "tracks_uris": tracks_uris})
-    except Exception as e:
-        return "Error al añadir las canciones a la cola", 500
-    
 
 # Añadir la canción que estas escuchando a una playlist
 """
 Adds the currently playing song of a user to a specified playlist.
 This function interacts with the Spotify API to retrieve the song that the user is currently listening to
-and adds it to the specified playlist. If the user's token is expired, it redirects to a token refresh endpoint.
+and adds it to the specified playlist. If the user's token is expired, the SpotifySession refreshes it
+before the call (and retries once on a 401).
 Args:
     user_id (str): The ID of the user whose currently playing song is to be added.
     playlist_id (str): The ID of the playlist to which the song will be added.
@@ -116,7 +97,7 @@ Returns:
 Raises:
     Exception: If there is an error while adding the song to the playlist.
 Notes:
-    - The function checks if the user's token is expired and refreshes it if necessary.
+    - An expired token is refreshed inside the SpotifySession before the call.
     - If no track is currently playing, it returns an error message with a 500 status code.
     - The function uses the Spotify API endpoints `me/player` to get the currently playing track
       and `playlists/{playlist_id}/tracks` to add the track to the playlist.
@@ -124,24 +105,9 @@ Notes:
 
 
 @router.get('/add_current_song_to_playlist/<user_id>/<playlist_id>/')
-def add_song_to_playlist(user_id, playlist_id):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        orginial_params = {"user_id": user_id, "playlist_id": playlist_id}
-
-        return RedirectResponse(
-            url=f"/refresh_token?rute_back=tracks/add_song_to_playlist&refresh_token={refresh_token_obteined}&id={user_id}&original_params={orginial_params}"
-        )
-    
+async def add_song_to_playlist(playlist_id, session: SpotifySession = Depends(get_spotify_session)):
     # Primero antes de nada debemos obtener la canción que está escuchando el usuario
-    headers = {
-        'Authorization': f'Bearer {token}'
-    }
-
-    response = requests.get(API_BASE_URL + 'me/player', headers=headers)
+    response = await session.get('me/player')
     song = response.json()
     if 'item' in song:
         uri_actual_track = song['item']['uri']
@@ -154,8 +120,7 @@ def add_song_to_playlist(user_id, playlist_id):
     # Ahora con la uri obtenida de la canción que está escuchando el usuario, la añadimos a la playlist
     
     headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {token}'
+        "Content-Type": "application/json"
     }
 
     req_body = {
@@ -164,7 +129,7 @@ def add_song_to_playlist(user_id, playlist_id):
     }
 
     try:
-        response = requests.post(API_BASE_URL + f'playlists/{playlist_id}/tracks', headers=headers, json=req_body)
+        response = await session.post(f'playlists/{playlist_id}/tracks', headers=headers, json=req_body)
         if response.status_code != 201:
             return JSONResponse(content={"error": response.text}, status_code=500)
         
@@ -183,53 +148,33 @@ def add_song_to_playlist(user_id, playlist_id):
 """
 Search for a song on Spotify based on the song name, artist name, and user ID.
 This function interacts with the Spotify API to search for a specific song. It first retrieves
-the user's access token and checks if it has expired. If the token is expired, the user is redirected
-to refresh their token. Once a valid token is obtained, the function sends a request to the Spotify
-API to search for the song and returns the song's URI, name, and ID.
+the user's session; if the access token has expired, the SpotifySession refreshes it before the call
+(and retries once if Spotify answers 401). The function then sends a request to the Spotify API to
+search for the song and returns the song's URI, name, and ID.
 Args:
     song_name (str): The name of the song to search for.
     artist_name (str): The name of the artist of the song.
     user_id (str): The ID of the user making the request.
 Returns:
     Response: A JSON response containing the song's URI, name, and ID if the search is successful.
-              If the token is expired, redirects the user to refresh their token.
               If an error occurs during the search, returns an error message with a 500 status code.
 Raises:
     Exception: If an unexpected error occurs during the search process.
 Notes:
-    - The function uses the `BaseManager` class to handle token retrieval and validation.
+    - The function uses the `SpotifySession` dependency to handle token retrieval and validation.
     - The Spotify API endpoint used is `search`, and the query parameters include the song name
       and artist name.
-    - The function assumes the presence of a valid `API_BASE_URL` constant and the `requests` library.
+    - Requests go through the session, which prefixes `API_BASE_URL` and adds the bearer token.
 """
 @router.get('/search_song/<song_name>/<artist_name>/<user_id>/')
-def search_song(song_name, artist_name,user_id):
-    base_manager = BaseManager()
-    token = base_manager._obtain_user_token(user_id)
-
-    if base_manager._check_token_expired(user_id):
-        refresh_token_obteined = base_manager._obtain_user_refresh_token(user_id)
-        orginial_params = {
-            "user_id": user_id,
-            "song_name": song_name,
-            "artist_name": artist_name
-        }
-        
-        return RedirectResponse(
-            url=f"/refresh_token?rute_back=tracks/search_song&refresh_token={refresh_token_obteined}&id={user_id}&original_params={orginial_params}"
-        )
-    
-    headers = {
-        'Authorization': f'Bearer {token}'
-    }
-
+async def search_song(song_name, artist_name, session: SpotifySession = Depends(get_spotify_session)):
     params = {
         'q': f'track:{song_name} artist:{artist_name}',
         'type': 'track'
     }
 
     try:
-        response = requests.get(API_BASE_URL + 'search', headers=headers, params=params)
+        response = await session.get('search', params=params)
         if response.status_code != 200:
            return JSONResponse(content={"error": response.text}, status_code=500)
         song = response.json()
@@ -241,6 +186,16 @@ def search_song(song_name, artist_name,user_id):
         })
     except Exception as e:
         return JSONResponse(content={"error": f"Error al buscar la canción: {e}"}, status_code=500)
-    
 
 
+# Limpiar canciones duplicadas de la biblioteca (canciones guardadas): se recorre
+# página a página y se marca como duplicada cada canción con el mismo ISRC o el mismo
+# título+artista+duración que otra guardada más recientemente. Responde NDJSON con
+# cada duplicado y un resumen final; con dry_run=false se borran en lotes de 50.
+@router.post('/remove_duplicates/{user_id}')
+async def remove_saved_duplicates(dry_run: bool = True, session: SpotifySession = Depends(get_spotify_session)):
+    async def ndjson():
+        async for event in remove_duplicates(session, dry_run=dry_run):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
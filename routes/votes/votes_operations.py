@@ -0,0 +1,43 @@
+# app/routers/votes_operations.py
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse
+from core.dependencies import get_spotify_session, get_votes
+from core.session import SpotifySession
+from managers.VoteAggregator import VoteAggregator
+
+router = APIRouter(prefix="/votes", tags=["votes"])
+
+
+# Abre (o cambia el umbral de) la votación de una playlist del usuario: las canciones
+# que lleguen a `threshold` votos se añaden solas a la playlist. 403 si la playlist no
+# es suya en Spotify o si la votación la abrió otro usuario
+@router.post("/open/{user_id}/{playlist_id}")
+async def open_voting(
+    playlist_id: str,
+    threshold: int = Query(3, ge=1),
+    session: SpotifySession = Depends(get_spotify_session),
+    votes: VoteAggregator = Depends(get_votes)
+):
+    await votes.open(session, playlist_id, threshold)
+    return JSONResponse(content={"message": "Votación abierta", "playlist_id": playlist_id, "threshold": threshold})
+
+
+# Voto de un usuario a una canción (id o URI); el voto se comprueba en el momento y se
+# guarda, junto con el contador, en el siguiente volcado
+@router.post("/vote/{user_id}/{playlist_id}/{track}")
+async def vote_track(
+    playlist_id: str,
+    track: str,
+    session: SpotifySession = Depends(get_spotify_session),
+    votes: VoteAggregator = Depends(get_votes)
+):
+    counted = await votes.vote(playlist_id, session.user_id, track)
+    if not counted:
+        return JSONResponse(content={"message": "El usuario ya había votado esta canción"}, status_code=409)
+    return JSONResponse(content={"message": "Voto registrado"})
+
+
+@router.get("/{playlist_id}")
+async def get_votes_totals(playlist_id: str, votes: VoteAggregator = Depends(get_votes)):
+    return JSONResponse(content=await votes.totals(playlist_id))
@@ -0,0 +1,65 @@
+import os
+import sys
+from cryptography.fernet import Fernet
+
+# las pruebas se pueden lanzar desde cualquier directorio: la raíz del repo va al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MASTER_KEY", Fernet.generate_key().decode())
+
+import datetime
+import httpx
+import pytest
+
+
+EMULATOR_PROJECT = "demo-better-discord-spotify"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def firestore_emulator():
+    # firebase_admin contra el emulador de Firestore (FIRESTORE_EMULATOR_HOST=localhost:8080),
+    # vacío al empezar cada prueba; sin el emulador la prueba se salta
+    host = os.getenv("FIRESTORE_EMULATOR_HOST")
+    if not host:
+        pytest.skip("FIRESTORE_EMULATOR_HOST no está definido")
+
+    import firebase_admin
+    from firebase_admin import credentials
+    from google.auth.credentials import AnonymousCredentials
+
+    class EmulatorCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(EmulatorCredential(), {"projectId": EMULATOR_PROJECT})
+    httpx.delete(f"http://{host}/emulator/v1/projects/{EMULATOR_PROJECT}/databases/(default)/documents")
+    return EMULATOR_PROJECT
+
+
+@pytest.fixture
+def app_client(monkeypatch, tmp_path):
+    # la app con SQLite en tmp_path y la API de Spotify sustituida por
+    # client.spotify(request) -> httpx.Response; el usuario "user" ya está logueado
+    import main
+    from fastapi.testclient import TestClient
+    from models.User import User
+
+    monkeypatch.setattr(main, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(main, "SQLITE_PATH", str(tmp_path / "storage.db"))
+    monkeypatch.setattr(main, "HISTORY_PATH", str(tmp_path / "history"))
+
+    with TestClient(main.app) as client:
+        state = client.app.state
+        client.spotify = lambda request: httpx.Response(404)
+        state.http = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: client.spotify(request)))
+        state.token_refresher.http = state.http
+        now = datetime.datetime.now(datetime.timezone.utc)
+        encripter = state.storage.encripter
+        user = User("user", now, now + datetime.timedelta(hours=1), encripter._encript("token"), encripter._encript("refresh"), "key")
+        client.portal.call(state.storage._add_user, user)
+        yield client
@@ -0,0 +1,33 @@
+# /refresh_token: rute_back solo puede redirigir a rutas de la propia app.
+
+import httpx
+import pytest
+from core.config import TOKEN_URL
+
+
+@pytest.fixture
+def client(app_client):
+    def spotify(request):
+        if str(request.url) == TOKEN_URL:
+            return httpx.Response(200, json={"access_token": "new", "expires_in": 3600})
+        return httpx.Response(200, json={"id": "user", "country": "ES"})
+    app_client.spotify = spotify
+    return app_client
+
+
+@pytest.mark.parametrize("rute_back", ["\\evil.com", "/\\evil.com", "//evil.com", "/%2F/evil.com", "https://evil.com", "no/existe"])
+def test_rejects_redirects_outside_the_app(client, rute_back):
+    response = client.get("/refresh_token", params={"id": "user", "rute_back": rute_back}, follow_redirects=False)
+    assert response.status_code == 400
+
+
+def test_redirects_to_app_routes(client):
+    response = client.get("/refresh_token", params={"id": "user", "rute_back": "playlists/playlists/user?x=1"}, follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == "/playlists/playlists/user?x=1"
+
+
+def test_without_rute_back_returns_expiry(client):
+    response = client.get("/refresh_token", params={"id": "user"})
+    assert response.status_code == 200
+    assert response.json()["id"] == "user"
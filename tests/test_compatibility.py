@@ -0,0 +1,39 @@
+# compatibility_pairs trabaja solo con las matrices copiadas del Recommender, así que
+# las actualizaciones posteriores del índice no cambian el resultado.
+
+from core.compatibility import compatibility_pairs
+from managers.Recommender import SimilarityIndex
+
+
+def _index() -> tuple:
+    artists = SimilarityIndex()
+    genres = SimilarityIndex(dense=True)
+    artists.set_user("a", {"x": 3.0, "y": 1.0}, {"x": "X", "y": "Y"})
+    artists.set_user("b", {"x": 2.0, "y": 2.0}, {"x": "X", "y": "Y"})
+    artists.set_user("c", {"z": 1.0}, {"z": "Z"})
+    for user_id in "abc":
+        genres.set_user(user_id, {"rock": 1.0})
+    return artists, genres
+
+
+def test_pairs_use_only_the_copied_matrices():
+    artists, genres = _index()
+    user_ids = ["a", "b", "c"]
+    artist_matrix = artists.matrix(user_ids)
+    genre_matrix = genres.matrix(user_ids)
+    names = list(artists.names)
+
+    # el event loop sigue actualizando el índice mientras el hilo calcula
+    artists.set_user("a", {"z": 5.0, "w": 1.0}, {"z": "Z", "w": "W"})
+    artists.set_user("d", {"x": 1.0}, {"x": "X"})
+
+    pairs = compatibility_pairs(artist_matrix, genre_matrix, names, user_ids, limit=2)
+    assert [pair["users"] for pair in pairs] == [["a", "b"], ["a", "c"]]
+    assert pairs[0]["shared_artists"] == ["X", "Y"]
+    assert pairs[0]["artists_jaccard"] == 1.0
+    assert pairs[1]["shared_artists"] == []
+
+
+def test_less_than_two_users():
+    artists, genres = _index()
+    assert compatibility_pairs(artists.matrix(["a"]), genres.matrix(["a"]), list(artists.names), ["a"]) == []
@@ -0,0 +1,101 @@
+# Limpieza de duplicados contra una playlist falsa que se comporta como la API actual
+# de Spotify: DELETE playlists/{id}/tracks solo mira la URI y borra todas sus apariciones.
+
+import httpx
+import pytest
+from core.duplicates import remove_duplicates
+
+pytestmark = pytest.mark.anyio
+
+
+def _track(uri: str, name: str, isrc: str = None, artist: str = "Artist", duration_ms: int = 200000) -> dict:
+    return {
+        "id": uri.rsplit(":", 1)[-1],
+        "uri": uri,
+        "name": name,
+        "duration_ms": duration_ms,
+        "is_local": False,
+        "external_ids": {"isrc": isrc} if isrc else {},
+        "artists": [{"name": artist}]
+    }
+
+
+class FakePlaylistSession:
+    def __init__(self, tracks: list):
+        self.tracks = list(tracks)
+        self.catalog = {track["uri"]: track for track in tracks}
+        self.snapshots = 0
+        self.deletes = []
+
+    def _snapshot(self) -> str:
+        self.snapshots += 1
+        return f"snapshot-{self.snapshots}"
+
+    async def get(self, endpoint: str, params: dict = None, **kwargs):
+        offset, limit = params["offset"], params["limit"]
+        items = [{"track": track} for track in self.tracks[offset:offset + limit]]
+        next_page = "next" if offset + limit < len(self.tracks) else None
+        return httpx.Response(200, json={"items": items, "offset": offset, "next": next_page})
+
+    async def delete(self, endpoint: str, json: dict = None, **kwargs):
+        self.deletes.append(json)
+        uris = {track["uri"] for track in json["tracks"]}
+        self.tracks = [track for track in self.tracks if track["uri"] not in uris]
+        return httpx.Response(200, json={"snapshot_id": self._snapshot()})
+
+    async def post(self, endpoint: str, json: dict = None, **kwargs):
+        position = json.get("position", len(self.tracks))
+        self.tracks[position:position] = [self.catalog[uri] for uri in json["uris"]]
+        return httpx.Response(201, json={"snapshot_id": self._snapshot()})
+
+
+async def _run(session, dry_run: bool = False) -> list:
+    return [event async for event in remove_duplicates(session, "playlist", "snapshot-0", dry_run)]
+
+
+async def test_exact_duplicates_keep_one_copy_in_place():
+    a, b, c, d = (_track(f"spotify:track:{name}", name) for name in "abcd")
+    session = FakePlaylistSession([a, b, a, c, b, a, d])
+
+    events = await _run(session)
+
+    assert [track["uri"] for track in session.tracks] == [a["uri"], b["uri"], c["uri"], d["uri"]]
+    summary = events[-1]["summary"]
+    assert (summary["duplicates"], summary["removed"]) == (3, 3)
+    assert [restore["position"] for restore in summary["restored"]] == [0]
+    assert summary["restored"][0]["uris"] == [a["uri"], b["uri"]]
+
+
+async def test_duplicates_with_another_uri_are_removed_without_restoring():
+    # misma canción en otro álbum (mismo ISRC, otra URI)
+    original = _track("spotify:track:single", "Song", isrc="ES0000000001")
+    other_album = _track("spotify:track:album", "Song", isrc="ES0000000001")
+    other = _track("spotify:track:other", "Other")
+    session = FakePlaylistSession([original, other, other_album, other_album])
+
+    events = await _run(session)
+
+    assert [track["uri"] for track in session.tracks] == [original["uri"], other["uri"]]
+    assert session.deletes == [{"tracks": [{"uri": other_album["uri"]}], "snapshot_id": "snapshot-0"}]
+    assert events[-1]["summary"]["restored"] == []
+
+
+async def test_restored_position_skips_removed_duplicates_before_it():
+    a, b, c = (_track(f"spotify:track:{name}", name) for name in "abc")
+    remaster = _track("spotify:track:a-remaster", "a - Remastered 2011")
+    session = FakePlaylistSession([remaster, a, c, b, c, a])
+
+    await _run(session)
+
+    assert [track["uri"] for track in session.tracks] == [remaster["uri"], c["uri"], b["uri"]]
+
+
+async def test_dry_run_does_not_touch_the_playlist():
+    a = _track("spotify:track:a", "a")
+    session = FakePlaylistSession([a, a])
+
+    events = await _run(session, dry_run=True)
+
+    assert session.deletes == []
+    assert [event["duplicate"]["position"] for event in events[:-1]] == [1]
+    assert events[-1]["summary"]["dry_run"]
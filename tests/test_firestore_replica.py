@@ -0,0 +1,66 @@
+# FirestoreReplica: de la colección "users" solo se guardan los IDs, nunca los tokens;
+# las credenciales temporales caducadas no valen y el evictor las quita.
+
+import datetime
+from types import SimpleNamespace
+from managers.FirestoreReplica import FirestoreReplica
+
+
+def _change(type_name: str, id: str, data: dict):
+    document = SimpleNamespace(id=id, to_dict=lambda: data)
+    return SimpleNamespace(type=SimpleNamespace(name=type_name), document=document)
+
+
+def test_users_snapshot_keeps_only_ids():
+    replica = FirestoreReplica(db=None)
+    user = {"Id": "u1", "spotify_token": "secret", "refresh_token": "secret"}
+
+    replica._on_users_snapshot([], [_change("ADDED", "u1", user), _change("ADDED", "u2", {})], None)
+    assert replica._users == {"u1", "u2"}
+    assert replica.has_user("u1")
+
+    replica._on_users_snapshot([], [_change("MODIFIED", "u1", user), _change("REMOVED", "u2", {})], None)
+    assert replica._users == {"u1"}
+    assert not replica.has_user("u2")
+    assert replica.stats()["users"] == 1
+
+
+def _credentials(id: str, key: str, expires_in: float) -> dict:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {"ID": id, "Key": key, "expires_at": now + datetime.timedelta(seconds=expires_in)}
+
+
+def test_check_credentials():
+    replica = FirestoreReplica(db=None)
+    replica._on_temp_snapshot([], [
+        _change("ADDED", "d1", _credentials("u1", "key", 60)),
+        _change("ADDED", "d2", _credentials("u1", "old", -1)),
+        _change("ADDED", "d3", {"ID": "u2", "Key": "key", "expires_at": None})
+    ], None)
+
+    assert replica.check_credentials("u1", "key")
+    assert not replica.check_credentials("u1", "wrong")
+    # caducadas (aunque el evictor aún no las haya quitado) o sin caducidad
+    assert not replica.check_credentials("u1", "old")
+    assert not replica.check_credentials("u2", "key")
+    assert not replica.check_credentials("u3", "key")
+
+    replica._on_temp_snapshot([], [_change("REMOVED", "d1", _credentials("u1", "key", 60))], None)
+    assert not replica.check_credentials("u1", "key")
+
+
+def test_evict_expired_temp_credentials():
+    replica = FirestoreReplica(db=None)
+    replica._on_temp_snapshot([], [
+        _change("ADDED", "d1", _credentials("u1", "key", 60)),
+        _change("ADDED", "d2", _credentials("u1", "old", -1)),
+        _change("ADDED", "d3", _credentials("u2", "key", -1)),
+        _change("ADDED", "d4", {"ID": "u3", "Key": "key", "expires_at": None})
+    ], None)
+    assert replica.stats()["temp_credentials"] == 4
+
+    replica._evict_expired()
+
+    assert {id: list(credentials) for id, credentials in replica._temp_credentials.items()} == {"u1": ["d1"]}
+    assert replica.stats()["temp_credentials"] == 1
+    assert replica.check_credentials("u1", "key")
@@ -0,0 +1,37 @@
+# /stats/history: los errores de Spotify al ingerir dan 500, pero el rate limit sigue
+# llegando a su manejador (503 con Retry-After).
+
+import httpx
+
+
+def test_history_route_returns_500_on_spotify_errors(app_client):
+    app_client.spotify = lambda request: httpx.Response(500, json={"error": "boom"})
+
+    response = app_client.get("/stats/history/top/user/tracks")
+
+    assert response.status_code == 500
+    assert "recently-played" in response.json()["detail"]
+
+
+def test_history_route_returns_503_when_rate_limited(app_client):
+    app_client.spotify = lambda request: httpx.Response(429, headers={"Retry-After": "60"})
+
+    response = app_client.get("/stats/history/top/user/tracks")
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 60
+
+
+def test_history_route_returns_the_top(app_client):
+    item = {"played_at": "2026-01-01T10:00:00Z", "track": {"id": "t1", "name": "T1", "artists": [{"id": "a1", "name": "A1"}]}}
+
+    def spotify(request):
+        if request.url.path == "/v1/me/player/recently-played":
+            return httpx.Response(200, json={"items": [item]})
+        return httpx.Response(200, json={"artists": [{"id": "a1", "genres": ["rock"]}]})
+
+    app_client.spotify = spotify
+    response = app_client.get("/stats/history/top/user/genres")
+
+    assert response.status_code == 200
+    assert response.json() == {"plays": 1, "items": [{"genre": "rock", "plays": 1}]}
@@ -0,0 +1,57 @@
+# POST /player/friends_activity: actividad de varios usuarios a la vez, con errores por
+# usuario para los que no están logueados o no están escuchando nada.
+
+import datetime
+import httpx
+from models.User import User
+
+
+def _login(client, user_id: str):
+    state = client.app.state
+    now = datetime.datetime.now(datetime.timezone.utc)
+    encripter = state.storage.encripter
+    user = User(user_id, now, now + datetime.timedelta(hours=1), encripter._encript(f"token-{user_id}"), encripter._encript("refresh"), "key")
+    client.portal.call(state.storage._add_user, user)
+
+
+def _spotify(request: httpx.Request) -> httpx.Response:
+    token = request.headers["Authorization"].removeprefix("Bearer ")
+    path = request.url.path.removeprefix("/v1/")
+    if path == "me/player":
+        if token == "token-idle":
+            # anuncio o sesión privada: hay reproductor pero no canción
+            return httpx.Response(200, json={"device": {"type": "Computer", "volume_percent": 50}, "item": None, "currently_playing_type": "ad"})
+        if token == "token-stopped":
+            return httpx.Response(204)
+        return httpx.Response(200, json={
+            "device": {"type": "Smartphone", "volume_percent": 80},
+            "item": {"name": "Song"},
+            "currently_playing_type": "track"
+        })
+    if path == "me/player/recently-played":
+        return httpx.Response(200, json={"items": [{"track": {"name": "Before"}}]})
+    return httpx.Response(404)
+
+
+def test_batch_mixes_results_and_per_user_errors(app_client):
+    for user_id in ("idle", "stopped"):
+        _login(app_client, user_id)
+    app_client.spotify = _spotify
+
+    response = app_client.post("/player/friends_activity", json=["user", "ghost", "idle", "user", "stopped"])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["results"] == {
+        "user": {
+            "device_type": "Smartphone",
+            "volume_percent": 80,
+            "currently_playing": "Song",
+            "currently_playing_type": "track",
+            "last_played": ["Before"]
+        }
+    }
+    assert list(body["errors"]) == ["ghost", "idle", "stopped"]
+    assert body["errors"]["ghost"] == "El usuario ghost no está logueado en la aplicación"
+    assert body["errors"]["idle"] == "No hay reproducción"
+    assert body["errors"]["stopped"] == "Error al obtener la canción actual del usuario"
@@ -0,0 +1,143 @@
+# core/playlists.py: inserción en lotes de 100 y recorrido de endpoints paginados, y
+# el NDJSON de /playlists/playlists/{user_id}.
+
+import asyncio
+import json
+import httpx
+import pytest
+from core.playlists import add_tracks_in_batches, iter_pages
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSession:
+    # POST playlists/{id}/tracks (falla en los lotes de failing_batches) y un endpoint
+    # paginado de `total` elementos que tarda `delay` en responder cada página
+    def __init__(self, failing_batches=(), total: int = 0, delay: float = 0.0):
+        self.failing_batches = failing_batches
+        self.total = total
+        self.delay = delay
+        self.posts = []
+        self.offsets = []
+        self.finished = []
+
+    async def post(self, endpoint, json=None, **kwargs):
+        self.posts.append(json)
+        if len(self.posts) - 1 in self.failing_batches:
+            return httpx.Response(500, text="batch failed")
+        return httpx.Response(201, json={"snapshot_id": f"snapshot{len(self.posts)}"})
+
+    async def get(self, endpoint, params=None, **kwargs):
+        offset, limit = params["offset"], params["limit"]
+        self.offsets.append(offset)
+        await asyncio.sleep(self.delay)
+        self.finished.append(offset)
+        items = list(range(offset, min(offset + limit, self.total)))
+        more = offset + limit < self.total
+        return httpx.Response(200, json={"items": items, "offset": offset, "next": "next" if more else None})
+
+
+def _uris(count: int) -> list:
+    return [f"spotify:track:{index}" for index in range(count)]
+
+
+async def test_position_advances_after_each_batch():
+    session = FakeSession()
+
+    result = await add_tracks_in_batches(session, "playlist", _uris(250), position=10)
+
+    assert [len(post["uris"]) for post in session.posts] == [100, 100, 50]
+    assert [post["position"] for post in session.posts] == [10, 110, 210]
+    assert session.posts[1]["uris"][0] == "spotify:track:100"
+    assert (result["added"], result["snapshot_id"]) == (250, "snapshot3")
+
+
+async def test_failed_middle_batch_is_reported_and_the_rest_continue():
+    session = FakeSession(failing_batches=(1,))
+
+    result = await add_tracks_in_batches(session, "playlist", _uris(250) + _uris(5), position=0)
+
+    assert result["duplicates"] == 5
+    assert result["added"] == 150
+    assert [batch["status"] for batch in result["batches"]] == ["added", "error", "added"]
+    assert result["batches"][1]["error"] == "batch failed"
+    # el lote siguiente va detrás de lo que sí se añadió
+    assert [post["position"] for post in session.posts] == [0, 100, 100]
+    assert result["snapshot_id"] == "snapshot3"
+
+
+async def test_iter_pages_prefetches_the_next_page():
+    session = FakeSession(total=120, delay=0.02)
+    pages = iter_pages(session, "me/playlists", 50)
+
+    assert await anext(pages) == 0
+    await asyncio.sleep(0)
+    # mientras se entregan los elementos de la primera página ya se pide la segunda
+    assert session.offsets == [0, 50]
+    assert [item async for item in pages] == list(range(1, 120))
+    assert session.offsets == [0, 50, 100]
+
+
+async def test_closing_iter_pages_cancels_the_prefetch():
+    session = FakeSession(total=120, delay=0.02)
+    pages = iter_pages(session, "me/playlists", 50)
+
+    assert await anext(pages) == 0
+    await asyncio.sleep(0)
+    await pages.aclose()
+    await asyncio.sleep(0.05)
+
+    assert session.offsets == [0, 50]
+    assert session.finished == [0]
+
+
+def _playlists_spotify(pages: list):
+    def spotify(request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/v1/me/playlists":
+            return httpx.Response(404)
+        offset = int(request.url.params["offset"])
+        index = offset // 50
+        items = pages[index]
+        more = index + 1 < len(pages)
+        return httpx.Response(200, json={"items": items, "offset": offset, "next": "next" if more else None})
+    return spotify
+
+
+def _lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def _playlist(index: int) -> dict:
+    return {"id": f"p{index}", "name": f"Playlist {index}", "tracks": {"total": index}}
+
+
+def test_playlists_stream_as_ndjson_without_unavailable_ones(app_client):
+    first = [_playlist(index) for index in range(49)] + [None]
+    second = [None, _playlist(50)]
+    app_client.spotify = _playlists_spotify([first, second])
+
+    response = app_client.get("/playlists/playlists/user", params={"fields": "id,track_count"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = _lines(response)
+    assert len(lines) == 50
+    assert lines[0] == {"id": "p0", "track_count": 0}
+    assert lines[-1] == {"id": "p50", "track_count": 50}
+
+
+def test_playlists_stream_without_projection(app_client):
+    app_client.spotify = _playlists_spotify([[None, _playlist(1)]])
+
+    response = app_client.get("/playlists/playlists/user")
+
+    assert _lines(response) == [_playlist(1)]
+
+
+def test_playlists_first_page_error_is_a_500(app_client):
+    app_client.spotify = lambda request: httpx.Response(500, text="down")
+
+    response = app_client.get("/playlists/playlists/user")
+
+    assert response.status_code == 500
+    assert response.json() == {"error": "down"}
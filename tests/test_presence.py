@@ -0,0 +1,77 @@
+# PresenceTracker: leer la reproducción no apunta al usuario al sondeo en segundo
+# plano; solo se sondea a los usuarios con suscriptores SSE.
+
+import asyncio
+import httpx
+import pytest
+from managers.PresenceTracker import PresenceTracker
+from managers.SpotifyScheduler import INTERACTIVE, BACKGROUND
+
+pytestmark = pytest.mark.anyio
+
+
+class FakePlayerSession:
+    def __init__(self, user_id: str, calls: list):
+        self.user_id = user_id
+        self.calls = calls
+
+    async def get(self, endpoint, priority=INTERACTIVE, **kwargs):
+        self.calls.append((self.user_id, priority))
+        item = {"id": "track", "name": "Track", "uri": "spotify:track:track", "artists": [], "duration_ms": 600000}
+        return httpx.Response(200, json={"is_playing": True, "progress_ms": 0, "item": item})
+
+
+async def _tracker(calls: list, active_window: float = 60.0) -> PresenceTracker:
+    async def session_factory(user_id):
+        return FakePlayerSession(user_id, calls)
+    tracker = PresenceTracker(session_factory, playing_interval=0.1, idle_interval=0.1, active_window=active_window)
+    tracker.start()
+    return tracker
+
+
+async def test_reads_do_not_start_background_polling():
+    calls = []
+    tracker = await _tracker(calls)
+    try:
+        await asyncio.gather(*(tracker.now_playing(FakePlayerSession(f"user{i}", calls)) for i in range(100)))
+        await asyncio.sleep(0.5)
+    finally:
+        await tracker.stop()
+
+    assert len(calls) == 100
+    assert {priority for _, priority in calls} == {INTERACTIVE}
+    assert tracker.stats()["tracked_users"] == 0
+
+
+async def test_repeated_reads_are_served_from_the_last_one():
+    calls = []
+    tracker = await _tracker(calls)
+    tracker.playing_interval = 10
+    try:
+        for _ in range(5):
+            await tracker.now_playing(FakePlayerSession("user", calls))
+    finally:
+        await tracker.stop()
+
+    assert len(calls) == 1
+    assert tracker.hits == 4
+
+
+async def test_subscribers_are_polled_until_they_leave():
+    calls = []
+    tracker = await _tracker(calls, active_window=0.1)
+    try:
+        queue = tracker.subscribe(["user"])
+        await asyncio.sleep(0.45)
+        polled = len(calls)
+        tracker.unsubscribe(["user"], queue)
+        await asyncio.sleep(0.5)
+    finally:
+        await tracker.stop()
+
+    assert polled >= 3
+    assert {priority for _, priority in calls} == {BACKGROUND}
+    assert (await queue.get())["track_id"] == "track"
+    # tras irse el último suscriptor solo se sondea durante active_window
+    assert len(calls) <= polled + 2
+    assert tracker.stats()["tracked_users"] == 0
@@ -0,0 +1,71 @@
+# Perfil de Spotify (product, id, country): se guarda al hacer login y en cada refresco
+# del token, y las rutas lo leen del usuario guardado sin pedir GET me.
+
+import httpx
+import pytest
+from core.auth import encripter
+from core.config import TOKEN_URL
+
+
+class FakeSpotify:
+    def __init__(self, profile: dict):
+        self.profile = profile
+        self.me_calls = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) == TOKEN_URL:
+            return httpx.Response(200, json={"access_token": "new-token", "refresh_token": "new-refresh", "expires_in": 3600})
+        path = request.url.path.removeprefix("/v1/")
+        if path == "me":
+            self.me_calls += 1
+            return httpx.Response(200, json=self.profile)
+        if path == "me/player":
+            return httpx.Response(204)
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def spotify(app_client):
+    spotify = FakeSpotify({"id": "spotify-user", "product": "premium", "country": "ES"})
+    app_client.spotify = spotify
+    return spotify
+
+
+def _stored_profile(client, user_id: str) -> tuple:
+    user = client.portal.call(client.app.state.storage._get_user, user_id)
+    return user.get("product"), user.get("spotify_user_id"), user.get("country")
+
+
+def _login(client, user_id: str):
+    state = encripter._encript(f"{user_id}:key").decode()
+    return client.get("/callback", params={"code": "code", "state": state}, follow_redirects=False)
+
+
+def test_login_stores_the_profile(app_client, spotify):
+    response = _login(app_client, "new-user")
+
+    assert response.status_code == 307
+    assert _stored_profile(app_client, "new-user") == ("premium", "spotify-user", "ES")
+    assert spotify.me_calls == 1
+
+
+def test_refresh_stores_the_profile(app_client, spotify):
+    spotify.profile = {"id": "spotify-user", "product": "free", "country": "MX"}
+
+    response = app_client.get("/refresh_token", params={"id": "user"})
+
+    assert response.status_code == 200
+    assert _stored_profile(app_client, "user") == ("free", "spotify-user", "MX")
+
+
+def test_routes_read_the_stored_profile(app_client, spotify):
+    _login(app_client, "new-user")
+    spotify.me_calls = 0
+
+    # el perfil (product) decide la respuesta sin pedir GET me
+    queue = app_client.get("/tracks/add_artist_songs_to_queue/new-user")
+    spotify.profile = {"id": "spotify-user", "product": "free"}
+    again = app_client.get("/tracks/add_artist_songs_to_queue/new-user")
+
+    assert queue.json() == again.json() == {"error": "No hay canción en reproducción"}
+    assert spotify.me_calls == 0
@@ -0,0 +1,77 @@
+# ResponseCache: las respuestas compartidas van por país y los fallos de la carga de
+# un usuario no llegan a las peticiones de otros que esperaban la misma clave.
+
+import asyncio
+import httpx
+import pytest
+from cache_app import TieredCache
+from managers.ResponseCache import ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+def _cache() -> ResponseCache:
+    return ResponseCache(TieredCache(l1_size=128))
+
+
+def _send(body: dict, calls: list, delay: float = 0.0, status: int = 200):
+    async def send(headers):
+        calls.append(body)
+        await asyncio.sleep(delay)
+        return httpx.Response(status, json=body)
+    return send
+
+
+async def test_search_is_shared_only_within_a_market():
+    cache = _cache()
+    params = {"q": "song", "type": "track"}
+    spain = cache.key_for("search", params, "first", "ES")
+    calls = []
+
+    await cache.fetch(spain, _send({"market": "ES"}, calls))
+    second = await cache.fetch(cache.key_for("search", params, "second", "ES"), _send({"market": "ES"}, calls))
+    mexico = await cache.fetch(cache.key_for("search", params, "third", "MX"), _send({"market": "MX"}, calls))
+
+    assert len(calls) == 2
+    assert second.json() == {"market": "ES"}
+    assert mexico.json() == {"market": "MX"}
+
+
+async def test_explicit_market_and_unknown_country():
+    cache = _cache()
+    explicit = cache.key_for("artists/x/top-tracks", {"market": "ES"}, "first", "MX")
+    assert explicit[1] == "responses:market:ES"
+    # sin país conocido no se comparte con nadie
+    assert cache.key_for("search", {"q": "song"}, "first")[1] == "responses:first"
+
+
+async def test_failed_load_is_not_shared_with_other_users():
+    cache = _cache()
+    params = {"q": "song"}
+
+    async def failing(headers):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("token del primer usuario revocado")
+
+    calls = []
+    first = asyncio.create_task(cache.fetch(cache.key_for("search", params, "first", "ES"), failing))
+    await asyncio.sleep(0.01)
+    second = await cache.fetch(cache.key_for("search", params, "second", "ES"), _send({"ok": True}, calls))
+
+    assert second.json() == {"ok": True}
+    with pytest.raises(RuntimeError):
+        await first
+
+
+async def test_error_response_is_not_shared_with_other_users():
+    cache = _cache()
+    params = {"q": "song"}
+    first_calls, second_calls = [], []
+
+    first = asyncio.create_task(cache.fetch(cache.key_for("search", params, "first", "ES"), _send({"error": 401}, first_calls, 0.05, 401)))
+    await asyncio.sleep(0.01)
+    second = await cache.fetch(cache.key_for("search", params, "second", "ES"), _send({"ok": True}, second_calls))
+
+    assert (await first).status_code == 401
+    assert second.status_code == 200
+    assert len(second_calls) == 1
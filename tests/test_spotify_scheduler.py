@@ -0,0 +1,131 @@
+# SpotifyScheduler.send contra una API falsa que responde 429: Retry-After, límite de
+# reintentos, prioridad BACKGROUND y el 503 que devuelve la app cuando se rinde.
+
+import asyncio
+import time
+import httpx
+import pytest
+from managers import SpotifyScheduler as scheduler_module
+from managers.SpotifyScheduler import SpotifyScheduler, SpotifyRateLimited, INTERACTIVE, BACKGROUND
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    # sin jitter las esperas son exactamente las que manda Spotify
+    monkeypatch.setattr(scheduler_module.random, "uniform", lambda low, high: low)
+
+
+def _scheduler(**kwargs) -> SpotifyScheduler:
+    options = {"app_rate": 100, "app_burst": 100, "user_rate": 100, "user_burst": 100, "max_retries": 3, "max_retry_wait": 10.0}
+    options.update(kwargs)
+    return SpotifyScheduler(**options)
+
+
+class FakeSpotify:
+    # devuelve las respuestas en orden y repite la última
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def __call__(self):
+        self.calls.append(time.monotonic())
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+def _rate_limited(retry_after: str = None) -> httpx.Response:
+    return httpx.Response(429, headers={"Retry-After": retry_after} if retry_after is not None else {})
+
+
+async def test_honours_retry_after():
+    scheduler = _scheduler()
+    spotify = FakeSpotify(_rate_limited("0.3"), httpx.Response(200))
+
+    response = await scheduler.send(spotify, "user")
+
+    assert response.status_code == 200
+    assert len(spotify.calls) == 2
+    assert spotify.calls[1] - spotify.calls[0] >= 0.3
+    assert (scheduler.rate_limited, scheduler.retries, scheduler.gave_up) == (1, 1, 0)
+
+
+async def test_retry_after_blocks_other_users():
+    # el rate limit es de la app: un 429 hace esperar también a los demás usuarios
+    scheduler = _scheduler()
+    limited = FakeSpotify(_rate_limited("0.3"), httpx.Response(200))
+    first = asyncio.create_task(scheduler.send(limited, "user"))
+    await asyncio.sleep(0.05)
+
+    other = FakeSpotify(httpx.Response(200))
+    await scheduler.send(other, "other")
+    await first
+
+    assert other.calls[0] - limited.calls[0] >= 0.3
+
+
+async def test_raises_after_max_retries():
+    scheduler = _scheduler(max_retries=2)
+    spotify = FakeSpotify(_rate_limited("0.01"))
+
+    with pytest.raises(SpotifyRateLimited) as raised:
+        await scheduler.send(spotify, "user")
+
+    assert len(spotify.calls) == 3
+    assert raised.value.retry_after == 1
+    assert scheduler.gave_up == 1
+
+
+async def test_raises_without_waiting_when_retry_after_is_too_long():
+    scheduler = _scheduler(max_retry_wait=10.0)
+    spotify = FakeSpotify(_rate_limited("60"))
+
+    start = time.monotonic()
+    with pytest.raises(SpotifyRateLimited) as raised:
+        await scheduler.send(spotify, "user")
+
+    assert time.monotonic() - start < 1
+    assert len(spotify.calls) == 1
+    assert raised.value.retry_after == 60
+
+
+async def test_server_errors_are_returned_after_max_retries():
+    scheduler = _scheduler(max_retries=1)
+    spotify = FakeSpotify(httpx.Response(503))
+
+    response = await scheduler.send(spotify, "user")
+
+    assert response.status_code == 503
+    assert len(spotify.calls) == 2
+    assert scheduler.rate_limited == 0
+
+
+async def test_background_gives_up_after_one_retry():
+    scheduler = _scheduler(max_retries=3)
+    spotify = FakeSpotify(_rate_limited("0.01"))
+
+    with pytest.raises(SpotifyRateLimited):
+        await scheduler.send(spotify, "user", BACKGROUND)
+
+    assert len(spotify.calls) == 2
+
+
+async def test_background_does_not_use_interactive_reserve():
+    # cubo de la app con 4 fichas y reserva del 25%: BACKGROUND solo puede gastar 3
+    scheduler = _scheduler(app_rate=0.001, app_burst=4, background_reserve=0.25)
+    for _ in range(3):
+        await asyncio.wait_for(scheduler.acquire("user", BACKGROUND), 0.1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(scheduler.acquire("user", BACKGROUND), 0.1)
+    await asyncio.wait_for(scheduler.acquire("user", INTERACTIVE), 0.1)
+
+
+def test_app_returns_503_when_spotify_keeps_rate_limiting(app_client):
+    app_client.spotify = lambda request: httpx.Response(429, headers={"Retry-After": "60"})
+
+    response = app_client.get("/player/follow/user/friend")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "60"
+    assert response.json()["retry_after"] == 60
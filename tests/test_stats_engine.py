@@ -0,0 +1,100 @@
+# StatsEngine: prioridad de las llamadas a me/top y cargas concurrentes con max_age distintos.
+
+import asyncio
+import time
+import httpx
+import pytest
+from cache_app import TieredCache
+from managers.StatsEngine import StatsEngine, StatsUnavailable, SNAPSHOT_SCHEMA
+from managers.SpotifyScheduler import BACKGROUND, INTERACTIVE
+
+pytestmark = pytest.mark.anyio
+
+
+class MemoryStorage:
+    def __init__(self, snapshot: dict = None):
+        self.snapshot = snapshot
+
+    async def _get_stats_snapshot(self, id):
+        return self.snapshot
+
+    async def _save_stats_snapshot(self, id, snapshot):
+        self.snapshot = snapshot
+
+
+class FakeTopSession:
+    def __init__(self, user_id: str = "user", delay: float = 0.0, status: int = 200):
+        self.user_id = user_id
+        self.delay = delay
+        self.status = status
+        self.priorities = []
+
+    async def get(self, endpoint, params=None, priority=INTERACTIVE):
+        self.priorities.append(priority)
+        await asyncio.sleep(self.delay)
+        artist = {"id": "artist", "name": "Artist", "genres": ["rock"]}
+        track = {"id": "track", "name": "Track", "artists": [artist]}
+        item = artist if endpoint.endswith("artists") else track
+        return httpx.Response(self.status, json={"items": [item], "next": None})
+
+
+def _engine(storage, session=None) -> StatsEngine:
+    async def session_factory(user_id):
+        return session
+    return StatsEngine(storage, TieredCache(l1_size=128), session_factory)
+
+
+async def test_on_demand_build_is_interactive():
+    session = FakeTopSession()
+    engine = _engine(MemoryStorage())
+
+    snapshot = await engine.get(session)
+
+    assert snapshot["ranges"]["long_term"]["genres"] == [{"genre": "rock", "count": 1}]
+    assert set(session.priorities) == {INTERACTIVE}
+
+
+async def test_background_refresh_is_background():
+    session = FakeTopSession()
+    engine = _engine(MemoryStorage(), session)
+
+    await engine._refresh("user")
+
+    assert session.priorities and set(session.priorities) == {BACKGROUND}
+
+
+async def test_forced_refresh_does_not_reuse_an_older_load():
+    old = {"version": 1, "schema": SNAPSHOT_SCHEMA, "created_at": time.time() - 60, "ranges": {}}
+    storage = MemoryStorage(old)
+    engine = _engine(storage)
+    slow_storage_read = storage._get_stats_snapshot
+
+    async def delayed(id):
+        await asyncio.sleep(0.05)
+        return await slow_storage_read(id)
+    storage._get_stats_snapshot = delayed
+
+    # una lectura normal (le vale el snapshot de hace un minuto) y, mientras, refresh=true
+    normal = asyncio.create_task(engine.get(FakeTopSession()))
+    await asyncio.sleep(0.01)
+    forced = await engine.get(FakeTopSession(), max_age=0)
+
+    assert (await normal)["version"] == 1
+    assert forced["version"] == 2
+    assert (await engine.get(FakeTopSession()))["version"] == 2
+
+
+async def test_spotify_errors_raise_stats_unavailable():
+    engine = _engine(MemoryStorage())
+    with pytest.raises(StatsUnavailable):
+        await engine.get(FakeTopSession(status=500))
+
+
+@pytest.mark.parametrize("path", ["/player/top/user/artists", "/stats/tops_genders/user", "/stats/snapshot/user"])
+def test_stats_routes_return_503_when_rate_limited(app_client, path):
+    app_client.spotify = lambda request: httpx.Response(429, headers={"Retry-After": "60"})
+
+    response = app_client.get(path)
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 60
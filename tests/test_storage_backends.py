@@ -0,0 +1,234 @@
+# Suite de conformidad de los backends de almacenamiento: las mismas pruebas contra
+# SQLiteManager y AsyncBaseManager. Firestore se prueba con el emulador
+# (FIRESTORE_EMULATOR_HOST=localhost:8080); sin él esas pruebas se saltan.
+
+import datetime
+import uuid
+import pytest
+from models.User import User
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["sqlite", "firestore"])
+def storage(request, tmp_path):
+    if request.param == "sqlite":
+        from managers.SQLiteManager import SQLiteManager
+        storage = SQLiteManager(str(tmp_path / "storage.db"))
+    else:
+        request.getfixturevalue("firestore_emulator")
+        from managers.AsyncBaseManager import AsyncBaseManager
+        storage = AsyncBaseManager()
+    yield storage
+    storage.close()
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _user(storage, id, token="token", refresh_token="refresh", expires_in=3600, **profile) -> User:
+    now = _now()
+    return User(
+        id,
+        now,
+        now + datetime.timedelta(seconds=expires_in),
+        storage.encripter._encript(token),
+        storage.encripter._encript(refresh_token) if refresh_token is not None else None,
+        "key",
+        **profile
+    )
+
+
+def _id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+
+# --- usuarios ---
+
+async def test_add_and_get_user(storage):
+    user_id = _id("user")
+    await storage._add_user(_user(storage, user_id, product="premium", spotify_user_id="sp", country="ES"))
+
+    user = await storage._get_user(user_id)
+    assert user["Id"] == user_id
+    assert user["key"] == "key"
+    assert storage.encripter._decript(user["spotify_token"]) == "token"
+    assert storage._user_profile(user) == {"id": "sp", "product": "premium", "country": "ES"}
+    assert await storage._check_user_is_login(user_id)
+
+
+async def test_missing_user(storage):
+    user_id = _id("missing")
+    assert await storage._get_user(user_id) is None
+    assert not await storage._check_user_is_login(user_id)
+    assert await storage._obtain_user_token(user_id) == "No users found"
+    assert not await storage._check_token_expired(user_id)
+
+
+async def test_get_users_in_one_read(storage):
+    first, second, missing = _id("user"), _id("user"), _id("missing")
+    await storage._add_user(_user(storage, first, token="first"))
+    await storage._add_user(_user(storage, second, token="second"))
+
+    users = await storage._get_users([first, second, missing])
+    assert set(users) == {first, second, missing}
+    assert users[missing] is None
+    assert storage.encripter._decript(users[second]["spotify_token"]) == "second"
+    assert await storage._get_users([]) == {}
+
+
+async def test_login_again_keeps_profile_and_coop_playlists(storage):
+    user_id = _id("user")
+    await storage._add_user(_user(storage, user_id, country="ES"))
+    await storage._add_coop_playlists(user_id, ["playlist"])
+    await storage._add_user(_user(storage, user_id, token="new"))
+
+    user = await storage._get_user(user_id)
+    assert storage.encripter._decript(user["spotify_token"]) == "new"
+    assert user["country"] == "ES"
+    assert await storage._obtain_coop_playlists(user_id) == ["playlist"]
+
+
+# --- credenciales temporales de login ---
+
+async def test_temp_credentials(storage):
+    user_id = _id("user")
+    await storage._add_temp_credentials(user_id, "valid", _now() + datetime.timedelta(minutes=5))
+    await storage._add_temp_credentials(user_id, "expired", _now() - datetime.timedelta(minutes=5))
+
+    assert await storage._check_credentials_exists(user_id, "valid")
+    assert not await storage._check_credentials_exists(user_id, "expired")
+    assert not await storage._check_credentials_exists(user_id, "other")
+    assert not await storage._check_credentials_exists(_id("user"), "valid")
+
+
+# --- playlists colaborativas ---
+
+async def test_coop_playlists(storage):
+    user_id = _id("user")
+    await storage._add_user(_user(storage, user_id))
+    assert not await storage._user_has_coop_playlists(user_id)
+    assert await storage._obtain_coop_playlists(user_id) == []
+
+    await storage._add_coop_playlists(user_id, ["first", "second"])
+    await storage._add_coop_playlists(user_id, ["second", "third"])
+    assert await storage._user_has_coop_playlists(user_id)
+    assert await storage._obtain_coop_playlists(user_id) == ["first", "second", "third"]
+
+
+async def test_coop_playlists_of_missing_user(storage):
+    user_id = _id("missing")
+    await storage._add_coop_playlists(user_id, ["playlist"])
+    assert await storage._get_user(user_id) is None
+    assert not await storage._user_has_coop_playlists(user_id)
+
+
+# --- caducidad y refresco de tokens ---
+
+async def test_token_expiry(storage):
+    fresh, expired = _id("fresh"), _id("expired")
+    await storage._add_user(_user(storage, fresh))
+    await storage._add_user(_user(storage, expired, expires_in=-60))
+
+    assert not await storage._check_token_expired(fresh)
+    assert await storage._check_token_expired(expired)
+
+
+async def test_refresh_replaces_token_and_keeps_refresh_token(storage):
+    user_id = _id("user")
+    await storage._add_user(_user(storage, user_id, expires_in=-60, country="ES"))
+    assert await storage._obtain_user_token(user_id) == "token"
+
+    # Spotify no siempre manda un refresh_token nuevo: se conserva el anterior
+    await storage._update_user_for_refresh(_user(storage, user_id, token="refreshed", refresh_token=None, product="premium"))
+
+    assert not await storage._check_token_expired(user_id)
+    assert await storage._obtain_user_token(user_id) == "refreshed"
+    assert await storage._obtain_user_refresh_token(user_id) == "refresh"
+    user = await storage._get_user(user_id)
+    assert (user["product"], user["country"]) == ("premium", "ES")
+
+
+async def test_refresh_with_new_refresh_token(storage):
+    user_id = _id("user")
+    await storage._add_user(_user(storage, user_id))
+    await storage._update_user_for_refresh(_user(storage, user_id, token="refreshed", refresh_token="rotated"))
+    assert await storage._obtain_user_refresh_token(user_id) == "rotated"
+
+
+# --- snapshots de estadísticas ---
+
+def _snapshot(version: int) -> dict:
+    return {"version": version, "created_at": 1000.0 + version, "ranges": {"short_term": {"artists": [], "genres": []}}}
+
+
+async def test_stats_snapshots(storage):
+    user_id = _id("user")
+    assert await storage._get_stats_snapshot(user_id) is None
+
+    await storage._save_stats_snapshot(user_id, _snapshot(2))
+    assert (await storage._get_stats_snapshot(user_id))["version"] == 2
+
+    # no se pisa un snapshot más nuevo
+    await storage._save_stats_snapshot(user_id, _snapshot(1))
+    assert (await storage._get_stats_snapshot(user_id))["version"] == 2
+    await storage._save_stats_snapshot(user_id, _snapshot(3))
+    assert (await storage._get_stats_snapshot(user_id))["version"] == 3
+
+
+async def test_iter_stats_snapshots(storage):
+    user_ids = {_id("user") for _ in range(3)}
+    for user_id in user_ids:
+        await storage._save_stats_snapshot(user_id, _snapshot(1))
+
+    seen = {user_id: snapshot async for user_id, snapshot in storage._iter_stats_snapshots()}
+    assert user_ids <= set(seen)
+    assert all(seen[user_id]["version"] == 1 for user_id in user_ids)
+
+
+# --- votaciones ---
+
+async def test_vote_playlist(storage):
+    playlist_id = _id("playlist")
+    assert await storage._get_vote_playlist(playlist_id) is None
+
+    await storage._save_vote_playlist(playlist_id, "owner", 3)
+    assert await storage._get_vote_playlist(playlist_id) == {"owner": "owner", "threshold": 3, "promoted": []}
+
+    await storage._save_vote_playlist(playlist_id, "owner", 5)
+    assert await storage._add_promoted_tracks(playlist_id, ["track", "other"]) == ["track", "other"]
+    assert await storage._add_promoted_tracks(playlist_id, ["track", "third"]) == ["third"]
+    await storage._remove_promoted_tracks(playlist_id, ["other"])
+    playlist = await storage._get_vote_playlist(playlist_id)
+    assert (playlist["threshold"], sorted(playlist["promoted"])) == (5, ["third", "track"])
+
+
+async def test_vote_counts_add_up_across_shards(storage):
+    first, second = _id("playlist"), _id("playlist")
+    await storage._save_vote_playlist(first, "owner", 3)
+    await storage._save_vote_playlist(second, "owner", 3)
+    assert await storage._get_vote_counts(first) == {}
+
+    saved = await storage._add_votes({first: [("u1", "a"), ("u2", "a"), ("u1", "b")], second: [("u1", "a")]}, 0)
+    assert saved == {first: {"a": 2, "b": 1}, second: {"a": 1}}
+    await storage._add_votes({first: [("u3", "a")]}, 1)
+
+    assert await storage._get_vote_counts(first) == {"a": 3, "b": 1}
+    assert await storage._get_vote_counts(second) == {"a": 1}
+
+
+async def test_saved_voters_are_not_counted_twice(storage):
+    playlist_id = _id("playlist")
+    await storage._save_vote_playlist(playlist_id, "owner", 3)
+    assert not await storage._has_voted(playlist_id, "user", "track")
+
+    await storage._add_votes({playlist_id: [("user", "track")]}, 0)
+    # un volcado repetido (o de otro worker) con el mismo votante no suma
+    saved = await storage._add_votes({playlist_id: [("user", "track"), ("user", "other")]}, 1)
+
+    assert saved == {playlist_id: {"other": 1}}
+    assert await storage._get_vote_counts(playlist_id) == {"track": 1, "other": 1}
+    assert await storage._has_voted(playlist_id, "user", "track")
+    assert not await storage._has_voted(playlist_id, "other", "track")
+    assert not await storage._has_voted(_id("playlist"), "user", "track")
@@ -0,0 +1,151 @@
+# TieredCache: una sola carga por clave aunque fallen a la vez muchas peticiones, el
+# lock del L2 entre workers, la invalidación por namespace y los valores que pasan por
+# el L2 (msgpack + Fernet). El L2 es un Redis falso en memoria con la API que usa la cache.
+
+import asyncio
+import datetime
+import fnmatch
+import time
+import pytest
+from cryptography.fernet import Fernet
+from cache_app import TieredCache
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedis:
+    # get/set (px, nx)/delete/scan_iter de redis.asyncio; las claves caducan con px
+    def __init__(self):
+        self.data = {}
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and time.time() >= entry[1]:
+            del self.data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry is not None else None
+
+    async def set(self, key, value, px=None, nx=False):
+        if nx and self._live(key) is not None:
+            return None
+        self.data[key] = (value, time.time() + px / 1000 if px else None)
+        return True
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def scan_iter(self, match="*", count=None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def aclose(self):
+        pass
+
+
+def _cache(l2=None, **kwargs) -> TieredCache:
+    return TieredCache(l1_size=128, l2=l2, secret=Fernet.generate_key().decode(), **kwargs)
+
+
+async def test_concurrent_misses_load_once():
+    cache = _cache()
+    loads = []
+
+    async def loader(current):
+        loads.append(current)
+        await asyncio.sleep(0.05)
+        return {"value": 1}
+
+    values = await asyncio.gather(*(cache.get_or_set("ns", "key", loader, 60) for _ in range(20)))
+
+    assert values == [{"value": 1}] * 20
+    assert loads == [None]
+    assert cache.loads == 1
+    assert cache.loads_coalesced == 19
+    assert await cache.get("ns", "key") == {"value": 1}
+
+
+async def test_workers_share_one_load_through_the_l2_lock():
+    redis = FakeRedis()
+    first, second = _cache(redis), _cache(redis)
+    second.cipher = first.cipher
+    loads = []
+
+    async def loader(current):
+        loads.append("load")
+        await asyncio.sleep(0.2)
+        return "value"
+
+    values = await asyncio.gather(
+        first.get_or_set("ns", "key", loader, 60),
+        second.get_or_set("ns", "key", loader, 60)
+    )
+
+    assert values == ["value", "value"]
+    assert loads == ["load"]
+    assert first.loads + second.loads == 1
+    # el lock se libera al terminar la carga
+    assert not [key for key in redis.data if key.endswith(":lock")]
+
+
+async def test_expired_l2_lock_lets_another_worker_load():
+    redis = FakeRedis()
+    cache = _cache(redis, lock_ttl=0.2)
+    # otro worker se quedó con el lock y no llegó a guardar el valor
+    await redis.set(cache._l2_key("ns", "key") + ":lock", b"1", px=200)
+
+    async def loader(current):
+        return "value"
+
+    started = time.monotonic()
+    assert await cache.get_or_set("ns", "key", loader, 60) == "value"
+    assert time.monotonic() - started >= 0.2
+    assert cache.loads == 1
+
+
+async def test_invalidate_namespace():
+    redis = FakeRedis()
+    cache = _cache(redis)
+    await cache.set("ns", "a", 1, 60)
+    await cache.set("ns", "b", 2, 60)
+    await cache.set("other", "a", 3, 60)
+
+    await cache.invalidate_namespace("ns")
+
+    assert await cache.get("ns", "a") is None
+    assert await cache.get("ns", "b") is None
+    assert await cache.get("other", "a") == 3
+    assert sorted(redis.data) == [cache._l2_key("other", "a")]
+
+
+async def test_values_round_trip_through_the_l2():
+    redis = FakeRedis()
+    writer, reader = _cache(redis), _cache(redis)
+    reader.cipher = writer.cipher
+    value = {
+        "token": "secret-token",
+        "expires_at": datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc),
+        "items": [1, 2.5, None, ["a", "b"]]
+    }
+
+    await writer.set("ns", "key", value, 60)
+    payload = redis.data[writer._l2_key("ns", "key")][0]
+
+    # en el L2 va cifrado; el otro worker lo lee del L2 (no de su L1) tal cual
+    assert b"secret-token" not in payload
+    assert await reader.get("ns", "key") == value
+    assert reader.l2_hits == 1
+
+
+async def test_unreadable_l2_value_is_dropped():
+    redis = FakeRedis()
+    writer, reader = _cache(redis), _cache(redis)
+    await writer.set("ns", "key", "value", 60)
+
+    # otra clave de cifrado: el valor no se puede descifrar y se borra
+    assert await reader.get("ns", "key") is None
+    assert redis.data == {}
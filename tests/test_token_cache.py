@@ -0,0 +1,59 @@
+# TokenCache: aciertos, fallos, caducidad con margen y su propio L1 dentro de la
+# TieredCache compartida.
+
+import datetime
+import time
+import pytest
+from cache_app import TieredCache
+from managers.TokenCache import NAMESPACE, TokenCache
+
+pytestmark = pytest.mark.anyio
+
+
+def _expires_in(seconds: float) -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=seconds)
+
+
+async def test_hit_and_miss():
+    tokens = TokenCache()
+    expires_at = _expires_in(3600)
+
+    assert await tokens.aget("user") is None
+    await tokens.aset("user", "token", expires_at, {"product": "premium"})
+
+    assert await tokens.aget("user") == ("token", expires_at, {"product": "premium"})
+    await tokens.ainvalidate("user")
+    assert await tokens.aget("user") is None
+    assert (tokens.hits, tokens.misses) == (1, 2)
+
+
+async def test_tokens_expire_before_spotify_expires_them():
+    tokens = TokenCache(skew=30)
+
+    # a menos de `skew` segundos de caducar ya no se guarda
+    await tokens.aset("user", "token", _expires_in(20))
+    assert await tokens.aget("user") is None
+
+    await tokens.aset("user", "token", _expires_in(30.2))
+    assert await tokens.aget("user") is not None
+    time.sleep(0.3)
+    assert await tokens.aget("user") is None
+
+
+async def test_tokens_keep_their_own_l1_in_a_shared_cache():
+    cache = TieredCache(l1_size=10)
+    tokens = TokenCache(max_size=3, cache=cache)
+    for user_id in ("a", "b", "c"):
+        await tokens.aset(user_id, f"token-{user_id}", _expires_in(3600))
+
+    # las respuestas y snapshots llenan el L1 común sin echar a los tokens
+    for index in range(50):
+        await cache.set("responses", str(index), index, 60)
+    assert all([await tokens.aget(user_id) for user_id in ("a", "b", "c")])
+
+    # y los tokens no pasan de su propio límite
+    await tokens.aset("d", "token-d", _expires_in(3600))
+    assert await tokens.aget("a") is None
+    assert tokens.stats()["size"] == 3
+    assert len(cache.l1) == 10
+    assert cache.stats()["l1_reserved"] == {NAMESPACE: {"size": 3, "max_size": 3}}
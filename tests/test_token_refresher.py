@@ -0,0 +1,115 @@
+# TokenRefresher: un solo POST a TOKEN_URL por usuario aunque lo pidan varias
+# peticiones a la vez, refrescos en segundo plano por orden de caducidad y parada limpia.
+
+import asyncio
+import datetime
+import urllib.parse
+import httpx
+import pytest
+from core.config import TOKEN_URL
+from core.session import UserNotLogged
+from managers.TokenRefresher import TokenRefresher
+from models.User import User
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSpotify:
+    # TOKEN_URL y GET me; cada POST espera a self.release antes de responder
+    def __init__(self):
+        self.refreshed = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) != TOKEN_URL:
+            return httpx.Response(200, json={"id": "sp", "product": "premium", "country": "ES"})
+        self.refreshed.append(urllib.parse.parse_qs(request.content.decode())["refresh_token"][0])
+        await self.release.wait()
+        return httpx.Response(200, json={"access_token": "new-token", "expires_in": 3600})
+
+
+@pytest.fixture
+def storage(tmp_path):
+    from managers.SQLiteManager import SQLiteManager
+    storage = SQLiteManager(str(tmp_path / "storage.db"))
+    yield storage
+    storage.close()
+
+
+async def _login(storage, user_id: str, expires_in: int = 3600):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expires_at = now + datetime.timedelta(seconds=expires_in)
+    encripter = storage.encripter
+    await storage._add_user(User(user_id, now, expires_at, encripter._encript("token"), encripter._encript(f"refresh-{user_id}"), "key"))
+    return expires_at
+
+
+def _refresher(storage, spotify: FakeSpotify, **kwargs) -> TokenRefresher:
+    return TokenRefresher(storage, httpx.AsyncClient(transport=httpx.MockTransport(spotify)), **kwargs)
+
+
+async def test_concurrent_refreshes_share_one_post(storage):
+    await _login(storage, "user")
+    spotify = FakeSpotify()
+    spotify.release.clear()
+    refresher = _refresher(storage, spotify)
+
+    calls = [asyncio.create_task(refresher.refresh("user")) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    spotify.release.set()
+    results = await asyncio.gather(*calls)
+
+    assert spotify.refreshed == ["refresh-user"]
+    assert [token for token, _ in results] == ["new-token", "new-token"]
+    assert refresher.refreshes_performed == 1
+    assert refresher.refreshes_coalesced == 1
+    assert storage.encripter._decript((await storage._get_user("user"))["spotify_token"]) == "new-token"
+
+
+async def test_unknown_user_is_not_refreshed(storage):
+    spotify = FakeSpotify()
+    refresher = _refresher(storage, spotify)
+
+    with pytest.raises(UserNotLogged):
+        await refresher.refresh("missing")
+
+    assert spotify.refreshed == []
+
+
+async def test_background_refreshes_follow_expiry_order(storage):
+    spotify = FakeSpotify()
+    refresher = _refresher(storage, spotify, lead_time=300, max_concurrent=1)
+    # todos dentro del margen de refresco, con caducidades distintas
+    for user_id, expires_in in (("late", 200), ("early", 20), ("middle", 100)):
+        refresher.touch(user_id, await _login(storage, user_id, expires_in))
+
+    refresher.start()
+    try:
+        for _ in range(100):
+            if refresher.background_refreshes == 3:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await refresher.stop()
+
+    assert spotify.refreshed == ["refresh-early", "refresh-middle", "refresh-late"]
+
+
+async def test_stop_cancels_background_refreshes(storage):
+    spotify = FakeSpotify()
+    spotify.release.clear()
+    refresher = _refresher(storage, spotify)
+    refresher.touch("user", await _login(storage, "user", 10))
+
+    refresher.start()
+    for _ in range(100):
+        if spotify.refreshed:
+            break
+        await asyncio.sleep(0.01)
+    await refresher.stop()
+
+    assert spotify.refreshed == ["refresh-user"]
+    assert not refresher._background_tasks
+    assert not refresher._in_flight
+    assert refresher.background_refreshes == 0
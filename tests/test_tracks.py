@@ -0,0 +1,68 @@
+# /tracks/add_artist_songs_to_queue: resultado por artista cuando fallan algunos.
+
+import httpx
+
+
+def _spotify(product: str = "premium", failing_lookups=(), failing_queue=()):
+    queued = []
+
+    def spotify(request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/v1/")
+        if path == "me":
+            return httpx.Response(200, json={"id": "user", "product": product})
+        if path == "me/player":
+            return httpx.Response(200, json={
+                "is_playing": True,
+                "item": {"artists": [{"id": artist_id} for artist_id in ("a1", "a2", "a3")]}
+            })
+        if path.startswith("artists/"):
+            artist_id = path.split("/")[1]
+            if artist_id in failing_lookups:
+                return httpx.Response(500, text="artist lookup failed")
+            return httpx.Response(200, json={"tracks": [{"uri": f"spotify:track:{artist_id}"}]})
+        if path == "me/player/queue":
+            uri = request.url.params["uri"]
+            if uri in failing_queue:
+                return httpx.Response(500, text="queue failed")
+            queued.append(uri)
+            return httpx.Response(204)
+        return httpx.Response(404)
+
+    spotify.queued = queued
+    return spotify
+
+
+def test_partial_failures_are_reported_per_artist(app_client):
+    app_client.spotify = _spotify(failing_lookups=("a2",), failing_queue=("spotify:track:a3",))
+
+    response = app_client.get("/tracks/add_artist_songs_to_queue/user")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["message"] == "Algunas canciones no se han podido añadir a la cola"
+    assert body["tracks_uris"] == ["spotify:track:a1"]
+    assert [(result["artist_id"], result["status"]) for result in body["results"]] == [
+        ("a1", "queued"), ("a2", "error"), ("a3", "error")
+    ]
+    assert "artist lookup failed" in body["results"][1]["error"]
+    assert "queue failed" in body["results"][2]["error"]
+    assert app_client.spotify.queued == ["spotify:track:a1"]
+
+
+def test_nothing_queued_is_an_error(app_client):
+    app_client.spotify = _spotify(failing_lookups=("a1", "a2", "a3"))
+
+    response = app_client.get("/tracks/add_artist_songs_to_queue/user")
+
+    assert response.status_code == 500
+    assert [result["status"] for result in response.json()["results"]] == ["error"] * 3
+
+
+def test_free_users_cannot_queue(app_client):
+    app_client.spotify = _spotify(product="free")
+
+    response = app_client.get("/tracks/add_artist_songs_to_queue/user")
+
+    assert response.status_code == 501
+    assert response.json() == "El usuario no es premium, por lo que no puede añadir canciones a la cola"
+    assert app_client.spotify.queued == []
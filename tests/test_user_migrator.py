@@ -0,0 +1,69 @@
+# UserMigrator: fusión de los documentos duplicados de un usuario y migración que se
+# puede repetir. La migración se prueba contra el emulador de Firestore.
+
+import datetime
+from types import SimpleNamespace
+import pytest
+from managers.UserMigrator import UserMigrator
+
+
+def _at(hour: int) -> datetime.datetime:
+    return datetime.datetime(2025, 1, 1, hour, tzinfo=datetime.timezone.utc)
+
+
+def _doc(**data):
+    return SimpleNamespace(to_dict=lambda: data)
+
+
+def test_merge_keeps_latest_login_and_all_coop_playlists():
+    merged = UserMigrator._merge([
+        _doc(Id="user", authenticated_at=_at(12), spotify_token="new", key="new-key", coop_playlists=["b", "c"]),
+        _doc(Id="user", authenticated_at=_at(10), spotify_token="old", key="old-key", refresh_token="old-refresh", coop_playlists=["a", "b"]),
+        # documento sin authenticated_at: cuenta como el más antiguo
+        _doc(Id="user", spotify_token="oldest", coop_playlists=["z"])
+    ])
+
+    assert merged["spotify_token"] == "new"
+    assert merged["key"] == "new-key"
+    assert merged["authenticated_at"] == _at(12)
+    # los campos que solo tiene un login anterior se conservan
+    assert merged["refresh_token"] == "old-refresh"
+    assert merged["coop_playlists"] == ["z", "a", "b", "c"]
+
+
+def test_merge_without_coop_playlists():
+    merged = UserMigrator._merge([_doc(Id="user", authenticated_at=_at(10), coop_playlists=[]), _doc(Id="user")])
+
+    assert "coop_playlists" not in merged
+
+
+@pytest.fixture
+def migrator(firestore_emulator):
+    from managers.BaseManager import BaseManager
+    base_manager = BaseManager()
+    yield UserMigrator(base_manager)
+    base_manager.close()
+
+
+def _users(db) -> dict:
+    return {doc.id: doc.to_dict() for doc in db.collection("users").stream()}
+
+
+def test_migrate_merges_duplicates_and_can_run_again(migrator):
+    users = migrator.db.collection("users")
+    users.add({"Id": "user", "authenticated_at": _at(10), "spotify_token": "old", "coop_playlists": ["a"]})
+    users.add({"Id": "user", "authenticated_at": _at(12), "spotify_token": "new", "coop_playlists": ["b"]})
+    users.document("other").set({"Id": "other", "authenticated_at": _at(9), "spotify_token": "other"})
+
+    assert migrator.migrate(dry_run=True) == {"users": 2, "migrated_users": 1, "deleted_documents": 2}
+    assert len(_users(migrator.db)) == 3
+
+    assert migrator.migrate() == {"users": 2, "migrated_users": 1, "deleted_documents": 2}
+    migrated = _users(migrator.db)
+    assert set(migrated) == {"user", "other"}
+    assert migrated["user"]["spotify_token"] == "new"
+    assert migrated["user"]["coop_playlists"] == ["a", "b"]
+
+    # una segunda pasada no cambia nada
+    assert migrator.migrate() == {"users": 2, "migrated_users": 0, "deleted_documents": 0}
+    assert _users(migrator.db) == migrated
@@ -0,0 +1,121 @@
+# VoteAggregator: volcado de votos, reintento de los que no se guardaron y paso de
+# las canciones ganadoras a la playlist, sobre SQLite.
+
+import httpx
+import pytest
+from managers.SQLiteManager import SQLiteManager
+from managers.VoteAggregator import VoteAggregator
+
+pytestmark = pytest.mark.anyio
+
+
+class FlakyStorage(SQLiteManager):
+    # _add_votes falla las primeras `failures` veces
+    failures = 0
+
+    async def _add_votes(self, votes: dict, shard: int) -> dict:
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("sin conexión")
+        return await super()._add_votes(votes, shard)
+
+
+class FakeOwnerSession:
+    def __init__(self, status: int = 201):
+        self.status = status
+        self.added = []
+
+    async def post(self, endpoint, json=None, **kwargs):
+        if self.status == 201:
+            self.added.extend(json["uris"])
+        return httpx.Response(self.status, json={"snapshot_id": "snapshot"})
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = FlakyStorage(str(tmp_path / "storage.db"))
+    yield storage
+    storage.close()
+
+
+async def _aggregator(storage, session: FakeOwnerSession = None, threshold: int = 3) -> VoteAggregator:
+    async def session_factory(user_id):
+        return session or FakeOwnerSession()
+    await storage._save_vote_playlist("playlist", "owner", threshold)
+    return VoteAggregator(storage, session_factory)
+
+
+async def test_flush_saves_voters_with_their_counts(storage):
+    votes = await _aggregator(storage)
+
+    assert await votes.vote("playlist", "u1", "spotify:track:a")
+    assert await votes.vote("playlist", "u2", "a")
+    assert not await votes.vote("playlist", "u1", "a")
+    assert (await votes.totals("playlist"))["votes"] == [{"track_id": "a", "votes": 2}]
+    assert await storage._get_vote_counts("playlist") == {}
+
+    await votes.flush()
+
+    assert await storage._get_vote_counts("playlist") == {"a": 2}
+    assert votes.stats()["pending_votes"] == 0
+    # tras un reinicio el voto sigue contando como hecho
+    restarted = VoteAggregator(storage, None)
+    assert not await restarted.vote("playlist", "u1", "a")
+    assert await restarted.vote("playlist", "u3", "a")
+
+
+async def test_failed_flush_requeues_votes(storage):
+    votes = await _aggregator(storage)
+    await votes.vote("playlist", "u1", "a")
+    storage.failures = 1
+
+    await votes.flush()
+
+    assert votes.flush_failures == 1
+    assert await storage._get_vote_counts("playlist") == {}
+    assert (await votes.totals("playlist"))["votes"] == [{"track_id": "a", "votes": 1}]
+    # mientras tanto el mismo voto no entra dos veces
+    assert not await votes.vote("playlist", "u1", "a")
+
+    await votes.vote("playlist", "u2", "a")
+    await votes.flush()
+
+    assert await storage._get_vote_counts("playlist") == {"a": 2}
+    assert votes.stats()["pending_votes"] == 0
+
+
+async def test_winners_are_added_once(storage):
+    session = FakeOwnerSession()
+    votes = await _aggregator(storage, session, threshold=2)
+    other_worker = VoteAggregator(storage, votes.session_factory)
+    for user_id in ("u1", "u2"):
+        await votes.vote("playlist", user_id, "a")
+    await votes.vote("playlist", "u1", "b")
+
+    await votes.flush()
+    # otro worker que vuelque votos de la misma playlist no vuelve a añadir "a"
+    await other_worker.vote("playlist", "u3", "a")
+    await other_worker.flush()
+
+    assert session.added == ["spotify:track:a"]
+    assert (await votes.totals("playlist"))["promoted"] == ["a"]
+    assert (await storage._get_vote_playlist("playlist"))["promoted"] == ["a"]
+    assert votes.tracks_promoted + other_worker.tracks_promoted == 1
+
+
+async def test_failed_promotion_is_retried(storage):
+    session = FakeOwnerSession(status=500)
+    votes = await _aggregator(storage, session, threshold=1)
+    await votes.vote("playlist", "u1", "a")
+
+    await votes.flush()
+
+    assert session.added == []
+    assert (await storage._get_vote_playlist("playlist"))["promoted"] == []
+
+    session.status = 201
+    await votes.vote("playlist", "u2", "b")
+    await votes.flush()
+
+    assert sorted(session.added) == ["spotify:track:a", "spotify:track:b"]
+    assert sorted((await storage._get_vote_playlist("playlist"))["promoted"]) == ["a", "b"]